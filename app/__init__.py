@@ -1,23 +1,36 @@
 from flask import Flask
 from flask_mongoengine import MongoEngine
 from flask_jwt_extended import JWTManager
+from flask_socketio import SocketIO
 from app.config import Config
 from app.utils.email import mail
+from app.utils.admission import admission
+from app.utils.google_auth import google_auth
+from app.utils.message_codec import message_codec
+from app.utils.metrics import metrics
+from app.utils.responses import OrjsonProvider
+from app.utils.password_hasher import password_hasher
+from app.utils.rate_limit import rate_limiter
+from app.utils.response_cache import response_cache
+from app.utils.user_cache import user_cache
 from app.utils.logger import setup_logger, get_logger
 from dotenv import load_dotenv
 import os
 from flask_cors import CORS
-from huggingface_hub import InferenceClient
 
 load_dotenv()
 
 db = MongoEngine()
 jwt = JWTManager()
+socketio = SocketIO()
 logger = get_logger(__name__)
 
+CORS_ORIGINS = ["http://localhost:3000", "https://usmanaftab.github.io", "https://ai.usmanaftab.com", "https://usmanaftab.com"]
+
 
 def create_app(config_class=Config):
     app = Flask(__name__)
+    app.json = OrjsonProvider(app)
     app.config.from_object(config_class)
 
     # Setup logging
@@ -27,15 +40,19 @@ def create_app(config_class=Config):
     db.init_app(app)
     jwt.init_app(app)
     mail.init_app(app)
+    google_auth.init_app(app)
+    admission.init_app(app)
+    metrics.init_app(app)
+    password_hasher.init_app(app)
+    rate_limiter.init_app(app)
+    response_cache.init_app(app)
+    user_cache.init_app(app)
+    message_codec.init_app(app)
 
     # Log startup information
     logger.info('Application starting up...')
     logger.debug(f'MongoDB URI: {os.getenv("MONGODB_URI", "Not set")}')
 
-    client = InferenceClient(token=app.config['HUGGING_FACE_API_TOKEN'])
-    app.huggingface_client = client
-    logger.info('Hugging Face client initialized')
-
     # Register blueprints
     logger.info('Registering blueprints 1')
     from app.routes.auth import auth
@@ -53,6 +70,27 @@ def create_app(config_class=Config):
     app.register_blueprint(chat, url_prefix='/api/chat')
     app.register_blueprint(feedback, url_prefix='/api/feedback')
 
+    # Chat over a persistent socket; websocket only, so no sticky sessions are needed
+    from app.routes.chat_socket import ChatNamespace, NAMESPACE
+    socketio.init_app(
+        app,
+        cors_allowed_origins=CORS_ORIGINS,
+        transports=['websocket'],
+        ping_interval=app.config['SOCKET_PING_INTERVAL'],
+        max_http_buffer_size=app.config['SOCKET_MAX_MESSAGE_SIZE']
+    )
+    socketio.on_namespace(ChatNamespace(NAMESPACE))
+
+    # gunicorn workers start the outbox sender in post_worker_init
+    if app.config['EMAIL_SENDER_ENABLED'] and not app.testing:
+        from app.utils.email_outbox import email_sender
+        app.before_request(email_sender.start_outside_gunicorn)
+
+    from app.cli import chats_cli, emails_cli, jobs_cli
+    app.cli.add_command(chats_cli)
+    app.cli.add_command(emails_cli)
+    app.cli.add_command(jobs_cli)
+
     # Add this to test the connection
     @app.route('/test-db')
     def test_db():
@@ -66,8 +104,9 @@ def create_app(config_class=Config):
 
     CORS(app, resources={
         r"/*": {
-            "origins": ["http://localhost:3000", "https://usmanaftab.github.io", "https://ai.usmanaftab.com", "https://usmanaftab.com"],
-            "allow_headers": ["Content-Type", "Authorization", "Access-Control-Allow-Credentials"],
+            "origins": CORS_ORIGINS,
+            "allow_headers": ["Content-Type", "Authorization", "Access-Control-Allow-Credentials",
+                              "Idempotency-Key", "X-Request-ID"],
             "supports_credentials": True
         }
     })
@@ -0,0 +1,145 @@
+import time
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from app.models.chat import Chat
+
+chats_cli = AppGroup('chats', help='Chat storage maintenance.')
+
+
+@chats_cli.command('prune-messages')
+def prune_messages():
+    """Delete chat_messages entries whose chat has expired."""
+    removed = Chat.prune_orphaned_messages()
+    click.echo(f'Removed {removed} orphaned messages')
+
+
+@chats_cli.command('backfill-counts')
+def backfill_counts():
+    """Set message_count on chats created before it was stored."""
+    click.echo(f'Fixed the message count of {Chat.backfill_message_counts()} chats')
+
+
+@chats_cli.command('check-indexes')
+def check_indexes():
+    """Fail if a hot chat query would scan a whole collection."""
+    from app.models.chat_message import ChatMessage
+    Chat.ensure_indexes()
+    ChatMessage.ensure_indexes()
+    failed = False
+    for name, stages in Chat.explain_hot_queries().items():
+        scans = 'COLLSCAN' in stages
+        failed = failed or scans
+        click.echo(f'{"FAIL" if scans else "ok":>4}  {name}: {" <- ".join(stages)}')
+    if failed:
+        raise click.ClickException('Some hot queries are not using an index')
+
+
+@chats_cli.command('archive-messages')
+@click.option('--batch-size', type=int, default=500, help='Chats loaded per query.')
+@click.option('--keep-recent', type=int, default=None,
+              help='Also compress all but this many latest messages, summarized or not.')
+def archive_messages(batch_size, keep_recent):
+    """Compress the summarized part of existing chats.
+
+    Chats from before summaries have nothing summarized; pass --keep-recent
+    to archive their older messages too. Run backfill-counts first, so those
+    chats have a message_count.
+    """
+    archived_count = {'$ifNull': ['$archived_count', 0]}
+    query = {'$expr': {'$gt': [{'$ifNull': ['$summarized_count', 0]}, archived_count]}}
+    if keep_recent is not None:
+        query = {'$or': [query, {'$expr': {'$gt': [
+            {'$ifNull': ['$message_count', 0]}, {'$add': [archived_count, keep_recent]}
+        ]}}]}
+    chats = messages = 0
+    last_id = None
+    while True:
+        page = Chat.objects(__raw__=query if last_id is None else {**query, '_id': {'$gt': last_id}}) \
+            .only('context_id', 'storage', 'summarized_count', 'archived_count', 'message_count') \
+            .order_by('id').limit(batch_size)
+        page = list(page)
+        if not page:
+            break
+        for chat in page:
+            archived = chat.archive_messages(keep_recent)
+            messages += archived
+            chats += 1 if archived else 0
+        last_id = page[-1].id
+    click.echo(f'Archived {messages} messages in {chats} chats')
+
+
+@chats_cli.command('train-dictionary')
+@click.option('--samples', type=int, default=2000, help='Messages to train on.')
+@click.option('--size', type=int, default=64 * 1024, help='Dictionary size in bytes.')
+def train_dictionary(samples, size):
+    """Train a zstd dictionary on recent chat messages for archiving."""
+    from app.models.chat_message import ChatMessage
+    from app.utils.message_codec import message_codec
+
+    texts = []
+    for doc in Chat._get_collection().find({}, {'messages': {'$slice': -20}}).sort('updated_at', -1):
+        texts += [message['content'] for message in doc.get('messages') or [] if isinstance(message.get('content'), str)]
+        if len(texts) >= samples:
+            break
+    if len(texts) < samples:
+        texts += [row['content'] for row in ChatMessage._get_collection()
+                  .find({'content': {'$type': 'string'}}, {'content': 1}).sort('_id', -1).limit(samples - len(texts))]
+    if len(texts) < 10:
+        raise click.ClickException(f'Need at least 10 messages to train on, found {len(texts)}')
+    dict_id = message_codec.train_dictionary(texts[:samples], size)
+    click.echo(f'Stored dictionary {dict_id}; new archives use it once workers restart')
+
+
+jobs_cli = AppGroup('jobs', help='Background chat jobs.')
+
+
+@jobs_cli.command('work')
+@click.option('--workers', type=int, default=None, help='Concurrent jobs (default JOB_WORKERS).')
+def work(workers):
+    """Run chat job workers in the foreground."""
+    from app.utils.job_queue import job_workers
+    job_workers.start(current_app._get_current_object(), workers)
+    try:
+        while True:
+            time.sleep(60)
+    except KeyboardInterrupt:
+        job_workers.stop(timeout=5)
+
+
+@jobs_cli.command('stats')
+def stats():
+    """Show queue depth and recent wait times."""
+    from app.models.chat_job import ChatJob
+    for name, value in ChatJob.stats().items():
+        click.echo(f'{name}: {value}')
+
+
+emails_cli = AppGroup('emails', help='Email outbox.')
+
+
+@emails_cli.command('send')
+def send_emails():
+    """Run the outbox sender in the foreground."""
+    from app.utils.email_outbox import email_sender
+    email_sender.start(current_app._get_current_object())
+    try:
+        while True:
+            time.sleep(60)
+    except KeyboardInterrupt:
+        email_sender.stop(timeout=5)
+
+
+@emails_cli.command('stats')
+def email_stats():
+    """Show outbox counts by status."""
+    from app.models.outbox_email import OutboxEmail
+    for name, value in OutboxEmail.stats().items():
+        click.echo(f'{name}: {value}')
+
+
+@emails_cli.command('retry-dead')
+def retry_dead():
+    """Queue dead-lettered emails for delivery again."""
+    from app.models.outbox_email import OutboxEmail
+    click.echo(f'Requeued {OutboxEmail.requeue_dead()} emails')
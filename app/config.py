@@ -1,3 +1,4 @@
+import json
 import os
 from datetime import timedelta
 
@@ -23,3 +24,73 @@ class Config:
     }
     ADMIN_EMAIL = os.getenv('ADMIN_EMAIL', 'your-email@example.com')
     HUGGING_FACE_API_TOKEN = os.getenv('HUGGING_FACE_API_TOKEN')
+    RATE_LIMIT_ALGORITHM = os.getenv('RATE_LIMIT_ALGORITHM', 'fixed_window')
+    RATE_LIMIT_BACKEND = os.getenv('RATE_LIMIT_BACKEND', 'mongo')
+    RATE_LIMIT_PERIOD = int(os.getenv('RATE_LIMIT_PERIOD', 86400))
+    RATE_LIMIT_PLANS = json.loads(os.getenv('RATE_LIMIT_PLANS', '{"free": 15}'))
+    RATE_LIMIT_DEFAULT_PLAN = os.getenv('RATE_LIMIT_DEFAULT_PLAN', 'free')
+    CHAT_MESSAGE_STORE = os.getenv('CHAT_MESSAGE_STORE', 'embedded')
+    CONTEXT_TOKENIZER = os.getenv('CONTEXT_TOKENIZER', 'gpt2')
+    CONTEXT_TOKEN_BUDGET = int(os.getenv('CONTEXT_TOKEN_BUDGET', 4000))
+    CONTEXT_RECENT_TOKENS = int(os.getenv('CONTEXT_RECENT_TOKENS', 2000))
+    CHAT_CHECKPOINTER = os.getenv('CHAT_CHECKPOINTER', 'False').lower() == 'true'
+    RESPONSE_CACHE_ENABLED = os.getenv('RESPONSE_CACHE_ENABLED', 'True').lower() == 'true'
+    RESPONSE_CACHE_SIZE = int(os.getenv('RESPONSE_CACHE_SIZE', 1000))
+    RESPONSE_CACHE_TTL = int(os.getenv('RESPONSE_CACHE_TTL', 3600))
+    RESPONSE_CACHE_SHARED = os.getenv('RESPONSE_CACHE_SHARED', '')
+    SEARCH_CACHE_SIZE = int(os.getenv('SEARCH_CACHE_SIZE', 2000))
+    SEARCH_CACHE_TTL = int(os.getenv('SEARCH_CACHE_TTL', 900))
+    SEARCH_CACHE_SHARED = os.getenv('SEARCH_CACHE_SHARED', '')
+    CHAT_DEADLINE_SECONDS = float(os.getenv('CHAT_DEADLINE_SECONDS', 60))
+    LLM_ATTEMPT_TIMEOUT = float(os.getenv('LLM_ATTEMPT_TIMEOUT', 30))
+    TOOL_ATTEMPT_TIMEOUT = float(os.getenv('TOOL_ATTEMPT_TIMEOUT', 10))
+    LLM_MAX_RETRIES = int(os.getenv('LLM_MAX_RETRIES', 2))
+    LLM_BACKOFF_BASE = float(os.getenv('LLM_BACKOFF_BASE', 0.5))
+    LLM_BACKOFF_MAX = float(os.getenv('LLM_BACKOFF_MAX', 4))
+    CIRCUIT_FAILURE_THRESHOLD = int(os.getenv('CIRCUIT_FAILURE_THRESHOLD', 5))
+    CIRCUIT_RESET_SECONDS = float(os.getenv('CIRCUIT_RESET_SECONDS', 30))
+    FALLBACK_MODEL_ID = os.getenv('FALLBACK_MODEL_ID', '')
+    JOB_WORKERS = int(os.getenv('JOB_WORKERS', 4))
+    JOB_POLL_INTERVAL = float(os.getenv('JOB_POLL_INTERVAL', 1))
+    JOB_MAX_ATTEMPTS = int(os.getenv('JOB_MAX_ATTEMPTS', 3))
+    JOB_RESULT_TTL = int(os.getenv('JOB_RESULT_TTL', 86400))
+    JOB_MAX_WAIT = float(os.getenv('JOB_MAX_WAIT', 30))
+    ADMISSION_MAX_CONCURRENT = int(os.getenv('ADMISSION_MAX_CONCURRENT', 32))
+    ADMISSION_MAX_QUEUE = int(os.getenv('ADMISSION_MAX_QUEUE', 64))
+    ADMISSION_QUEUE_TIMEOUT = float(os.getenv('ADMISSION_QUEUE_TIMEOUT', 5))
+    ADMISSION_GLOBAL_LIMIT = int(os.getenv('ADMISSION_GLOBAL_LIMIT', 0))
+    IDEMPOTENCY_TTL = int(os.getenv('IDEMPOTENCY_TTL', 86400))
+    IDEMPOTENCY_MAX_WAIT = float(os.getenv('IDEMPOTENCY_MAX_WAIT', 90))
+    USER_CACHE_SIZE = int(os.getenv('USER_CACHE_SIZE', 10000))
+    USER_CACHE_TTL = int(os.getenv('USER_CACHE_TTL', 60))
+    PASSWORD_HASH_ROUNDS = int(os.getenv('PASSWORD_HASH_ROUNDS', 29000))
+    PASSWORD_POOL_SIZE = int(os.getenv('PASSWORD_POOL_SIZE', 2))
+    PASSWORD_POOL_QUEUE = int(os.getenv('PASSWORD_POOL_QUEUE', 32))
+    PASSWORD_POOL_TIMEOUT = float(os.getenv('PASSWORD_POOL_TIMEOUT', 10))
+    GOOGLE_JWKS_URL = os.getenv('GOOGLE_JWKS_URL', 'https://www.googleapis.com/oauth2/v3/certs')
+    GOOGLE_USERINFO_URL = os.getenv('GOOGLE_USERINFO_URL', 'https://www.googleapis.com/oauth2/v3/userinfo')
+    GOOGLE_HTTP_TIMEOUT = float(os.getenv('GOOGLE_HTTP_TIMEOUT', 5))
+    GOOGLE_HTTP_POOL_SIZE = int(os.getenv('GOOGLE_HTTP_POOL_SIZE', 10))
+    EMAIL_SENDER_ENABLED = os.getenv('EMAIL_SENDER_ENABLED', 'True').lower() == 'true'
+    EMAIL_POLL_INTERVAL = float(os.getenv('EMAIL_POLL_INTERVAL', 5))
+    EMAIL_BATCH_SIZE = int(os.getenv('EMAIL_BATCH_SIZE', 20))
+    EMAIL_LEASE_SECONDS = float(os.getenv('EMAIL_LEASE_SECONDS', 120))
+    EMAIL_MAX_ATTEMPTS = int(os.getenv('EMAIL_MAX_ATTEMPTS', 6))
+    EMAIL_BACKOFF_BASE = float(os.getenv('EMAIL_BACKOFF_BASE', 30))
+    EMAIL_BACKOFF_MAX = float(os.getenv('EMAIL_BACKOFF_MAX', 3600))
+    EMAIL_SENT_TTL = int(os.getenv('EMAIL_SENT_TTL', 7 * 86400))
+    METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'True').lower() == 'true'
+    METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+    CHAT_PAGE_MAX = int(os.getenv('CHAT_PAGE_MAX', 100))
+    COMPRESS_ENABLED = os.getenv('COMPRESS_ENABLED', 'True').lower() == 'true'
+    COMPRESS_MIN_SIZE = int(os.getenv('COMPRESS_MIN_SIZE', 1024))
+    COMPRESS_GZIP_LEVEL = int(os.getenv('COMPRESS_GZIP_LEVEL', 6))
+    COMPRESS_ZSTD_LEVEL = int(os.getenv('COMPRESS_ZSTD_LEVEL', 3))
+    ARCHIVE_ENABLED = os.getenv('ARCHIVE_ENABLED', 'True').lower() == 'true'
+    ARCHIVE_MIN_BYTES = int(os.getenv('ARCHIVE_MIN_BYTES', 256))
+    ARCHIVE_ZSTD_LEVEL = int(os.getenv('ARCHIVE_ZSTD_LEVEL', 9))
+    SOCKET_MAX_TURNS = int(os.getenv('SOCKET_MAX_TURNS', 3))
+    SOCKET_MAX_IN_FLIGHT = int(os.getenv('SOCKET_MAX_IN_FLIGHT', 8))
+    SOCKET_ACK_TIMEOUT = float(os.getenv('SOCKET_ACK_TIMEOUT', 30))
+    SOCKET_PING_INTERVAL = int(os.getenv('SOCKET_PING_INTERVAL', 25))
+    SOCKET_MAX_MESSAGE_SIZE = int(os.getenv('SOCKET_MAX_MESSAGE_SIZE', 64 * 1024))
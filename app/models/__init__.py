@@ -1,2 +1,3 @@
 from .user import User
 from .chat import Chat
+from .chat_message import ChatMessage
@@ -0,0 +1,20 @@
+from datetime import datetime
+from app import db
+
+class AdmissionSlot(db.Document):
+    """One of a fixed number of cluster-wide slots for concurrent LLM calls.
+
+    A slot is free once its lease has expired, so slots held by a crashed
+    process come back on their own.
+    """
+    slot = db.IntField(required=True)
+    holder = db.StringField()
+    lease_expires = db.DateTimeField(default=datetime.utcnow)
+
+    meta = {
+        'collection': 'admission_slots',
+        'indexes': [
+            {'fields': ['slot'], 'unique': True},
+            {'fields': ['lease_expires']}
+        ]
+    }
@@ -0,0 +1,16 @@
+from datetime import datetime
+from app import db
+
+class CacheEntry(db.Document):
+    namespace = db.StringField(required=True)
+    key = db.StringField(required=True)
+    value = db.DynamicField()
+    expires_at = db.DateTimeField(default=datetime.utcnow)
+
+    meta = {
+        'collection': 'cache_entries',
+        'indexes': [
+            {'fields': ['namespace', 'key'], 'unique': True},
+            {'fields': ['expires_at'], 'expireAfterSeconds': 0}
+        ]
+    }
@@ -1,10 +1,36 @@
-from mongoengine import Document, StringField, ListField, DictField, DateTimeField
-from datetime import datetime
+from mongoengine import Document, StringField, ListField, DictField, DateTimeField, IntField
+from datetime import datetime, timedelta
+import base64
+import json
+from bson import ObjectId
+from pymongo.errors import BulkWriteError
+from app.models.chat_message import ChatMessage
+from app.utils.message_codec import message_codec
 
 class Chat(Document):
+    # Conversations expire this long after their last message
+    TTL = timedelta(days=2)
+
+    # 'embedded' keeps messages in the chat document, 'collection' stores
+    # them in chat_messages so a turn never rewrites the history
+    STORAGE_EMBEDDED = 'embedded'
+    STORAGE_COLLECTION = 'collection'
+    # Job turn ids kept per chat; a job is only ever re-run shortly after its lease lapses
+    RECORDED_TURNS = 20
+
     user_id = StringField(required=True)
     context_id = StringField(required=True)
     messages = ListField(DictField(), default=[])
+    message_count = IntField(default=0)
+    # Running summary of the first summarized_count messages
+    summary = StringField()
+    summarized_count = IntField(default=0)
+    # Messages before this index are archived (compressed). Turns keep it at
+    # summarized_count; only the archive-messages migration goes further
+    archived_count = IntField(default=0)
+    # Ids of the latest turns recorded by queued jobs, so a re-run job never records twice
+    recorded_turns = ListField(StringField(), default=[])
+    storage = StringField(default=STORAGE_EMBEDDED, choices=(STORAGE_EMBEDDED, STORAGE_COLLECTION))
     created_at = DateTimeField(default=datetime.utcnow)
     updated_at = DateTimeField(default=datetime.utcnow)
     ttl = DateTimeField(default=datetime.utcnow)
@@ -12,6 +38,377 @@ class Chat(Document):
     meta = {
         'collection': 'chats',
         'indexes': [
-            {'fields': ['ttl'], 'expireAfterSeconds': 0}
+            {'fields': ['ttl'], 'expireAfterSeconds': 0},
+            # Session lookup on every chat turn
+            {'fields': ['context_id', 'user_id']},
+            # A user's conversations, most recent first
+            {'fields': ['user_id', '-updated_at', '-_id']}
         ]
     }
+
+    @staticmethod
+    def encode_cursor(updated_at: datetime, pk) -> str:
+        raw = json.dumps([updated_at.isoformat(), str(pk)])
+        return base64.urlsafe_b64encode(raw.encode()).decode()
+
+    @staticmethod
+    def decode_cursor(cursor: str):
+        """Returns (updated_at, ObjectId); raises ValueError for a malformed cursor"""
+        try:
+            updated_at, pk = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+            return datetime.fromisoformat(updated_at), ObjectId(pk)
+        except Exception as e:
+            raise ValueError(f'Invalid cursor: {str(e)}')
+
+    @classmethod
+    def list_for_user(cls, user_id: str, limit: int, cursor: str = None):
+        """One page of a user's conversations, most recently updated first.
+
+        Returns (conversations, next_cursor). The message arrays are never
+        loaded; only the first message of each chat is fetched as a preview.
+        """
+        query = {'user_id': user_id}
+        if cursor:
+            updated_at, pk = cls.decode_cursor(cursor)
+            query['$or'] = [
+                {'updated_at': {'$lt': updated_at}},
+                {'updated_at': updated_at, '_id': {'$lt': pk}}
+            ]
+        docs = list(cls._get_collection().find(
+            query,
+            {
+                'context_id': 1, 'storage': 1, 'message_count': 1,
+                'created_at': 1, 'updated_at': 1, 'messages': {'$slice': 1}
+            },
+            sort=[('updated_at', -1), ('_id', -1)],
+            limit=limit + 1
+        ))
+        next_cursor = None
+        if len(docs) > limit:
+            docs = docs[:limit]
+            next_cursor = cls.encode_cursor(docs[-1]['updated_at'], docs[-1]['_id'])
+
+        # Chats in the collection layout keep their first message in chat_messages
+        stored = [doc['context_id'] for doc in docs if doc.get('storage') == cls.STORAGE_COLLECTION]
+        first_messages = {
+            message['context_id']: message
+            for message in ChatMessage._get_collection().find(
+                {'context_id': {'$in': stored}, 'seq': 0},
+                {'context_id': 1, 'content': 1, 'content_z': 1, 'codec': 1, 'dict_id': 1}
+            )
+        } if stored else {}
+
+        conversations = []
+        for doc in docs:
+            first = first_messages.get(doc['context_id']) or next(iter(doc.get('messages') or []), None)
+            first = message_codec.decode(first) if first else None
+            conversations.append({
+                'context_id': doc['context_id'],
+                'preview': (first or {}).get('content', '')[:100],
+                'message_count': doc.get('message_count') or 0,
+                'created_at': doc['created_at'].isoformat() if doc.get('created_at') else None,
+                'updated_at': doc['updated_at'].isoformat() if doc.get('updated_at') else None
+            })
+        return conversations, next_cursor
+
+    def message_window(self, limit: int, before: int = None):
+        """Up to limit messages with seq < before (default: the latest ones),
+        oldest first. Returns (messages, next_before, total); pass next_before
+        as before to page further back, it is None at the start of the chat.
+        """
+        if before is not None and before <= 0:
+            return [], None, self.message_count
+
+        if self.storage == self.STORAGE_COLLECTION:
+            query = ChatMessage.objects(context_id=self.context_id)
+            if before is not None:
+                query = query.filter(seq__lt=before)
+            rows = list(query.order_by('-seq').limit(limit)
+                        .only('seq', 'role', 'content', 'content_z', 'codec', 'dict_id').as_pymongo())
+            messages = [
+                {'seq': row['seq'], 'role': row['role'], 'content': row.get('content')}
+                for row in map(message_codec.decode, reversed(rows))
+            ]
+            total = self.message_count
+        else:
+            # Slice on the server so only the requested window is shipped
+            total_expr = {'$size': {'$ifNull': ['$messages', []]}}
+            end = total_expr if before is None else {'$min': [before, total_expr]}
+            start = {'$max': [0, {'$subtract': [end, limit]}]}
+            result = next(self._get_collection().aggregate([
+                {'$match': {'_id': self.pk}},
+                {'$project': {
+                    'total': total_expr,
+                    'start': start,
+                    'messages': {'$cond': [
+                        {'$gt': [{'$subtract': [end, start]}, 0]},
+                        {'$slice': ['$messages', start, {'$max': [1, {'$subtract': [end, start]}]}]},
+                        []
+                    ]}
+                }}
+            ]), None)
+            if result is None:
+                return [], None, 0
+            messages = [
+                {'seq': result['start'] + offset, 'role': message.get('role'), 'content': message.get('content')}
+                for offset, message in enumerate(map(message_codec.decode, result['messages']))
+            ]
+            total = result['total']
+
+        next_before = messages[0]['seq'] if messages and messages[0]['seq'] > 0 else None
+        return messages, next_before, total
+
+    # Fields a chat turn reads; see load_for_turn
+    MAX_SLICE = 2 ** 31 - 1
+    TURN_FIELDS = ('user_id', 'context_id', 'storage', 'summary', 'summarized_count', 'archived_count',
+                   'message_count')
+
+    @classmethod
+    def load_for_turn(cls, context_id: str, user_id: str):
+        """The chat with only what a turn needs: the summary and, when they are
+        embedded, the messages after it. Returns None for an unknown chat."""
+        chat = cls.objects(context_id=context_id, user_id=user_id).only(*cls.TURN_FIELDS).first()
+        if chat is not None and chat.storage != cls.STORAGE_COLLECTION:
+            start = chat.summarized_count or 0
+            doc = cls._get_collection().find_one(
+                {'_id': chat.pk}, {'_id': 1, 'messages': {'$slice': [start, cls.MAX_SLICE]}})
+            chat.messages = (doc or {}).get('messages') or []
+            chat._messages_start = start
+        return chat
+
+    # Index of self.messages[0] in the conversation, for chats from load_for_turn
+    _messages_start = 0
+
+    def load_messages(self, start: int = 0) -> list:
+        if self.storage == self.STORAGE_COLLECTION:
+            rows = ChatMessage.objects(context_id=self.context_id, seq__gte=start) \
+                .only('role', 'content', 'content_z', 'codec', 'dict_id').order_by('seq').as_pymongo()
+            return [
+                {'role': message['role'], 'content': message.get('content')}
+                for message in map(message_codec.decode, rows)
+            ]
+        if start < self._messages_start:
+            # Only the messages after the summary were loaded
+            self.reload('messages')
+            self._messages_start = 0
+        return [message_codec.decode(message) for message in self.messages[start - self._messages_start:]]
+
+    def archive_messages(self, keep_recent: int = None) -> int:
+        """Compress the messages that were folded into the summary.
+
+        They are no longer sent to the model, so they are only decoded when a
+        client reads that part of the history. With ``keep_recent`` all but
+        that many latest messages are compressed, summarized or not, which
+        covers chats from before summaries. Returns how many messages were
+        archived.
+        """
+        start, end = self.archived_count or 0, self.summarized_count or 0
+        if keep_recent is not None:
+            end = max(end, (self.message_count or 0) - keep_recent)
+        if end <= start:
+            return 0
+
+        if self.storage == self.STORAGE_COLLECTION:
+            rows = ChatMessage._get_collection().find(
+                {'context_id': self.context_id, 'seq': {'$gte': start, '$lt': end}, 'content_z': {'$exists': False}},
+                {'seq': 1, 'role': 1, 'content': 1}
+            )
+            for row in rows:
+                encoded = message_codec.encode({'role': row['role'], 'content': row.get('content')})
+                if message_codec.is_encoded(encoded):
+                    ChatMessage._get_collection().update_one(
+                        {'_id': row['_id'], 'content_z': {'$exists': False}},
+                        {
+                            '$set': {key: value for key, value in encoded.items() if key != 'role'},
+                            '$unset': {'content': ''}
+                        }
+                    )
+        else:
+            doc = self._get_collection().find_one({'_id': self.pk}, {'messages': {'$slice': [start, end - start]}})
+            messages = (doc or {}).get('messages') or []
+            updates = {
+                f'messages.{start + offset}': message_codec.encode(message)
+                for offset, message in enumerate(messages)
+                if not message_codec.is_encoded(message)
+            }
+            if updates:
+                # Positions are stable: appends only ever go to the end
+                result = self._get_collection().update_one(
+                    # Chats from before archiving have no archived_count at all
+                    {'_id': self.pk, 'archived_count': start if start else {'$in': [0, None]}},
+                    {'$set': {**updates, 'archived_count': end}}
+                )
+                if not result.modified_count:
+                    return 0
+
+        self._get_collection().update_one(
+            {'_id': self.pk, 'archived_count': {'$lt': end}},
+            {'$set': {'archived_count': end}}
+        )
+        self.archived_count = end
+        return end - start
+
+    def update_summary(self, summary: str, summarized_count: int) -> None:
+        # Only advance the summary; a concurrent turn may already have moved it on
+        self._get_collection().update_one(
+            {'_id': self.pk, 'summarized_count': {'$lt': summarized_count}},
+            {'$set': {'summary': summary, 'summarized_count': summarized_count}}
+        )
+        self.summary = summary
+        self.summarized_count = summarized_count
+
+    def append_messages(self, messages: list, turn_id: str = None) -> bool:
+        """Atomically append messages without rewriting the existing history.
+
+        With a ``turn_id`` the messages are only appended if that turn was not
+        recorded yet; returns False when it was.
+        """
+        now = datetime.utcnow()
+        if self.storage == self.STORAGE_COLLECTION:
+            if not self._append_rows(messages, turn_id, now):
+                return False
+        else:
+            query = {'_id': self.pk}
+            update = {
+                '$inc': {'message_count': len(messages)},
+                '$set': {'updated_at': now, 'ttl': now + self.TTL},
+                '$push': {'messages': {'$each': messages}}
+            }
+            if turn_id:
+                query['recorded_turns'] = {'$ne': turn_id}
+                update['$push']['recorded_turns'] = {'$each': [turn_id], '$slice': -self.RECORDED_TURNS}
+            if not self._get_collection().update_one(query, update).modified_count:
+                return False
+            self.messages.extend(messages)
+            self.message_count = (self.message_count or 0) + len(messages)
+
+        self.updated_at = now
+        self.ttl = now + self.TTL
+        return True
+
+    def _append_rows(self, messages: list, turn_id: str, now: datetime) -> bool:
+        """Collection layout: insert the rows, then move message_count past them.
+
+        The count is only raised once the rows exist, so a failed insert
+        never leaves a gap in the sequence that pagination would skip.
+        """
+        chats = self._get_collection()
+        if turn_id:
+            # Record the turn first, so a re-run job never inserts its messages twice
+            recorded = chats.update_one(
+                {'_id': self.pk, 'recorded_turns': {'$ne': turn_id}},
+                {'$push': {'recorded_turns': {'$each': [turn_id], '$slice': -self.RECORDED_TURNS}}}
+            )
+            if not recorded.modified_count:
+                return False
+        try:
+            end = self._insert_rows(messages, now)
+        except Exception:
+            if turn_id:
+                chats.update_one({'_id': self.pk}, {'$pull': {'recorded_turns': turn_id}})
+            raise
+
+        chats.update_one(
+            {'_id': self.pk},
+            {'$max': {'message_count': end}, '$set': {'updated_at': now, 'ttl': now + self.TTL}}
+        )
+        self.message_count = max(self.message_count or 0, end)
+        return True
+
+    def _insert_rows(self, messages: list, now: datetime, max_attempts: int = 5) -> int:
+        """Insert messages after the last stored one; returns the sequence number after them"""
+        collection = ChatMessage._get_collection()
+        for _ in range(max_attempts):
+            last = collection.find_one({'context_id': self.context_id}, {'seq': 1}, sort=[('seq', -1)])
+            first_seq = last['seq'] + 1 if last else 0
+            rows = [
+                {
+                    '_id': ObjectId(),
+                    'user_id': self.user_id,
+                    'context_id': self.context_id,
+                    'seq': first_seq + offset,
+                    'role': message['role'],
+                    'content': message['content'],
+                    'created_at': now
+                }
+                for offset, message in enumerate(messages)
+            ]
+            try:
+                collection.insert_many(rows, ordered=True)
+            except BulkWriteError as e:
+                if any(error.get('code') != 11000 for error in e.details.get('writeErrors', [])):
+                    raise
+                # A concurrent append took these positions; drop any rows we
+                # did write and go again after its messages
+                collection.delete_many({'_id': {'$in': [row['_id'] for row in rows]}})
+                continue
+            return first_seq + len(messages)
+        raise RuntimeError(f'Too many concurrent appends to chat {self.context_id}')
+
+    @classmethod
+    def delete_for_user(cls, user_id: str) -> None:
+        from app.utils.checkpointer import MongoCheckpointSaver
+        MongoCheckpointSaver.delete_threads(cls.objects(user_id=user_id).distinct('context_id'))
+        cls.objects(user_id=user_id).delete()
+        ChatMessage.objects(user_id=user_id).delete()
+
+    @classmethod
+    def explain_hot_queries(cls, user_id: str = 'explain', context_id: str = 'explain') -> dict:
+        """Winning plan stages of the queries run on every chat request"""
+        def stages(plan):
+            found = [plan.get('stage')]
+            for child in [plan.get('inputStage')] + plan.get('inputStages', []):
+                if child:
+                    found += stages(child)
+            return found
+
+        def explain(cursor):
+            planner = cursor.explain()['queryPlanner']
+            plan = planner['winningPlan']
+            # Newer servers nest the classic plan under queryPlan
+            return [stage for stage in stages(plan.get('queryPlan', plan)) if stage]
+
+        chats = cls._get_collection()
+        messages = ChatMessage._get_collection()
+        return {
+            'chat session lookup': explain(chats.find({'context_id': context_id, 'user_id': user_id}).limit(1)),
+            'conversation list': explain(
+                chats.find({'user_id': user_id}).sort([('updated_at', -1), ('_id', -1)]).limit(21)
+            ),
+            'message window': explain(
+                messages.find({'context_id': context_id, 'seq': {'$lt': 50}}).sort('seq', -1).limit(50)
+            ),
+            'chats by user': explain(chats.find({'user_id': user_id})),
+        }
+
+    @classmethod
+    def prune_orphaned_messages(cls, batch_size: int = 500) -> int:
+        """Delete stored messages whose chat has expired; returns how many were removed"""
+        context_ids = ChatMessage.objects.distinct('context_id')
+        removed = 0
+        for start in range(0, len(context_ids), batch_size):
+            batch = context_ids[start:start + batch_size]
+            live = set(cls.objects(context_id__in=batch).distinct('context_id'))
+            orphaned = [context_id for context_id in batch if context_id not in live]
+            if orphaned:
+                removed += ChatMessage.objects(context_id__in=orphaned).delete()
+        return removed
+
+    @classmethod
+    def backfill_message_counts(cls) -> int:
+        """Set message_count on embedded-layout chats where it is missing or
+        disagrees with the messages array; returns how many were fixed."""
+        fixed = 0
+        mismatched = cls._get_collection().aggregate([
+            {'$match': {'storage': {'$ne': cls.STORAGE_COLLECTION}}},
+            {'$project': {'message_count': 1, 'actual': {'$size': {'$ifNull': ['$messages', []]}}}},
+            {'$match': {'$expr': {'$ne': [{'$ifNull': ['$message_count', -1]}, '$actual']}}}
+        ])
+        for doc in mismatched:
+            # Only if no turn was appended since; a re-run picks those chats up
+            current = doc['message_count'] if 'message_count' in doc else {'$exists': False}
+            fixed += cls._get_collection().update_one(
+                {'_id': doc['_id'], 'message_count': current},
+                {'$set': {'message_count': doc['actual']}}
+            ).modified_count
+        return fixed
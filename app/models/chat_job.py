@@ -0,0 +1,129 @@
+from datetime import datetime, timedelta
+from pymongo import ReturnDocument
+from app import db
+
+class ChatJob(db.Document):
+    """A chat message queued for the background worker pool"""
+    STATUS_QUEUED = 'queued'
+    STATUS_RUNNING = 'running'
+    STATUS_SUCCEEDED = 'succeeded'
+    STATUS_FAILED = 'failed'
+
+    user_id = db.StringField(required=True)
+    context_id = db.StringField(required=True)
+    new_conversation = db.BooleanField(default=False)
+    message = db.StringField(required=True)
+    request_limit = db.IntField()
+    status = db.StringField(default=STATUS_QUEUED)
+    result = db.DynamicField()
+    error = db.StringField()
+    error_status = db.IntField()
+    attempts = db.IntField(default=0)
+    created_at = db.DateTimeField(default=datetime.utcnow)
+    started_at = db.DateTimeField()
+    finished_at = db.DateTimeField()
+    lease_expires = db.DateTimeField()
+    expires_at = db.DateTimeField()
+
+    meta = {
+        'collection': 'chat_jobs',
+        'indexes': [
+            {'fields': ['status', 'created_at']},
+            {'fields': ['status', 'lease_expires']},
+            {'fields': ['expires_at'], 'expireAfterSeconds': 0}
+        ]
+    }
+
+    @property
+    def finished(self) -> bool:
+        return self.status in (self.STATUS_SUCCEEDED, self.STATUS_FAILED)
+
+    @classmethod
+    def _runnable(cls, now: datetime) -> dict:
+        return {'$or': [
+            {'status': cls.STATUS_QUEUED},
+            {'status': cls.STATUS_RUNNING, 'lease_expires': {'$lt': now}}
+        ]}
+
+    @classmethod
+    def any_runnable(cls) -> bool:
+        """Whether claim() would find a job, without taking it"""
+        return cls._get_collection().find_one(cls._runnable(datetime.utcnow()), {'_id': 1}) is not None
+
+    @classmethod
+    def claim(cls, lease_seconds: float):
+        """Atomically take the oldest runnable job, including jobs whose worker
+        died mid-run (their lease expired). Returns None when the queue is empty."""
+        now = datetime.utcnow()
+        doc = cls._get_collection().find_one_and_update(
+            cls._runnable(now),
+            {
+                '$set': {
+                    'status': cls.STATUS_RUNNING,
+                    'started_at': now,
+                    'lease_expires': now + timedelta(seconds=lease_seconds)
+                },
+                '$inc': {'attempts': 1}
+            },
+            sort=[('created_at', 1)],
+            return_document=ReturnDocument.AFTER
+        )
+        return cls._from_son(doc) if doc else None
+
+    def _finish(self, status: str, result_ttl: float, **fields) -> bool:
+        """Returns False when this worker no longer holds the job"""
+        now = datetime.utcnow()
+        fields.update(status=status, finished_at=now, expires_at=now + timedelta(seconds=result_ttl))
+        # Only the worker holding the job may finish it: a reclaim after the
+        # lease lapsed bumps attempts
+        finished = self._get_collection().update_one(
+            {'_id': self.pk, 'status': self.STATUS_RUNNING, 'attempts': self.attempts},
+            {'$set': fields}
+        ).modified_count == 1
+        if finished:
+            for name, value in fields.items():
+                setattr(self, name, value)
+        return finished
+
+    def succeed(self, result, result_ttl: float) -> bool:
+        return self._finish(self.STATUS_SUCCEEDED, result_ttl, result=result)
+
+    def fail(self, error: str, error_status: int, result_ttl: float) -> bool:
+        return self._finish(self.STATUS_FAILED, result_ttl, error=error, error_status=error_status)
+
+    @classmethod
+    def stats(cls, window: timedelta = timedelta(minutes=5)) -> dict:
+        """Queue depth and how long recently started jobs waited"""
+        now = datetime.utcnow()
+        oldest = cls.objects(status=cls.STATUS_QUEUED).order_by('created_at').only('created_at').first()
+        waits = list(cls._get_collection().aggregate([
+            {'$match': {'started_at': {'$gte': now - window}}},
+            {'$group': {
+                '_id': None,
+                'mean': {'$avg': {'$subtract': ['$started_at', '$created_at']}},
+                'max': {'$max': {'$subtract': ['$started_at', '$created_at']}},
+                'count': {'$sum': 1}
+            }}
+        ]))
+        recent = waits[0] if waits else {'mean': 0, 'max': 0, 'count': 0}
+        return {
+            'queued': cls.objects(status=cls.STATUS_QUEUED).count(),
+            'running': cls.objects(status=cls.STATUS_RUNNING).count(),
+            'oldest_queued_seconds': (now - oldest.created_at).total_seconds() if oldest else 0,
+            'recent_started': recent['count'],
+            'mean_wait_seconds': (recent['mean'] or 0) / 1000,
+            'max_wait_seconds': (recent['max'] or 0) / 1000
+        }
+
+    def to_dict(self) -> dict:
+        job = {
+            'job_id': str(self.id),
+            'context_id': self.context_id,
+            'status': self.status,
+            'created_at': self.created_at.isoformat()
+        }
+        if self.status == self.STATUS_SUCCEEDED:
+            job['response'] = self.result
+        elif self.status == self.STATUS_FAILED:
+            job['error'] = self.error
+        return job
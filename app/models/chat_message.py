@@ -0,0 +1,23 @@
+from mongoengine import Document, StringField, IntField, DateTimeField, BinaryField
+from datetime import datetime
+
+class ChatMessage(Document):
+    """A single message of a chat using the ``collection`` storage layout"""
+    user_id = StringField(required=True)
+    context_id = StringField(required=True)
+    seq = IntField(required=True)
+    role = StringField(required=True)
+    content = StringField()
+    # Archived messages hold their content compressed; see app.utils.message_codec
+    content_z = BinaryField()
+    codec = StringField()
+    dict_id = IntField()
+    created_at = DateTimeField(default=datetime.utcnow)
+
+    meta = {
+        'collection': 'chat_messages',
+        'indexes': [
+            {'fields': ['context_id', 'seq'], 'unique': True},
+            {'fields': ['user_id']}
+        ]
+    }
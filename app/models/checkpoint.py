@@ -0,0 +1,89 @@
+from datetime import datetime
+from app import db
+
+# LangGraph checkpoints, split the way the SQL savers do: a checkpoint only
+# records channel versions, values live in blobs written once per version and
+# pending writes are stored per task.
+
+class CheckpointRecord(db.Document):
+    thread_id = db.StringField(required=True)
+    checkpoint_ns = db.StringField(default='')
+    checkpoint_id = db.StringField(required=True)
+    parent_checkpoint_id = db.StringField()
+    checkpoint = db.BinaryField()
+    checkpoint_type = db.StringField()
+    metadata = db.BinaryField()
+    metadata_type = db.StringField()
+    expires_at = db.DateTimeField(default=datetime.utcnow)
+
+    meta = {
+        'collection': 'checkpoints',
+        'indexes': [
+            {'fields': ['thread_id', 'checkpoint_ns', '-checkpoint_id'], 'unique': True},
+            {'fields': ['expires_at'], 'expireAfterSeconds': 0}
+        ]
+    }
+
+
+class CheckpointBlob(db.Document):
+    thread_id = db.StringField(required=True)
+    checkpoint_ns = db.StringField(default='')
+    channel = db.StringField(required=True)
+    version = db.StringField(required=True)
+    type = db.StringField()
+    blob = db.BinaryField()
+    # Number of messages, for the messages channel (type 'messages')
+    length = db.IntField()
+    expires_at = db.DateTimeField(default=datetime.utcnow)
+
+    meta = {
+        'collection': 'checkpoint_blobs',
+        'indexes': [
+            {'fields': ['thread_id', 'checkpoint_ns', 'channel', 'version'], 'unique': True},
+            {'fields': ['expires_at'], 'expireAfterSeconds': 0}
+        ]
+    }
+
+
+class CheckpointWrite(db.Document):
+    thread_id = db.StringField(required=True)
+    checkpoint_ns = db.StringField(default='')
+    checkpoint_id = db.StringField(required=True)
+    task_id = db.StringField(required=True)
+    task_path = db.StringField(default='')
+    idx = db.IntField(required=True)
+    channel = db.StringField()
+    type = db.StringField()
+    blob = db.BinaryField()
+    expires_at = db.DateTimeField(default=datetime.utcnow)
+
+    meta = {
+        'collection': 'checkpoint_writes',
+        'indexes': [
+            {'fields': ['thread_id', 'checkpoint_ns', 'checkpoint_id', 'task_id', 'idx'], 'unique': True},
+            {'fields': ['expires_at'], 'expireAfterSeconds': 0}
+        ]
+    }
+
+
+class CheckpointMessage(db.Document):
+    """One message of a thread's ``messages`` channel, by position.
+
+    The channel only grows by appending, so a step writes just its new
+    messages and the blob for the channel version records the length.
+    """
+    thread_id = db.StringField(required=True)
+    checkpoint_ns = db.StringField(default='')
+    position = db.IntField(required=True)
+    message_id = db.StringField()
+    type = db.StringField()
+    blob = db.BinaryField()
+    expires_at = db.DateTimeField(default=datetime.utcnow)
+
+    meta = {
+        'collection': 'checkpoint_messages',
+        'indexes': [
+            {'fields': ['thread_id', 'checkpoint_ns', 'position'], 'unique': True},
+            {'fields': ['expires_at'], 'expireAfterSeconds': 0}
+        ]
+    }
@@ -0,0 +1,22 @@
+from datetime import datetime
+from mongoengine import Document, IntField, BinaryField, DateTimeField
+
+class CompressionDictionary(Document):
+    """A zstd dictionary trained on chat messages.
+
+    Archived messages record the dict_id they were compressed with, so old
+    dictionaries must be kept for as long as such messages exist.
+    """
+    dict_id = IntField(required=True, unique=True)
+    data = BinaryField(required=True)
+    samples = IntField()
+    created_at = DateTimeField(default=datetime.utcnow)
+
+    meta = {
+        'collection': 'compression_dictionaries',
+        'indexes': ['-created_at']
+    }
+
+    @classmethod
+    def latest(cls):
+        return cls.objects.order_by('-created_at').first()
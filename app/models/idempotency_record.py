@@ -0,0 +1,95 @@
+from datetime import datetime, timedelta
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from app import db
+
+class IdempotencyRecord(db.Document):
+    """Outcome of a request sent with an Idempotency-Key header.
+
+    The record is created before the request runs (STATUS_IN_PROGRESS) and
+    holds the response once it completes, so retries can be replayed.
+    """
+    STATUS_IN_PROGRESS = 'in_progress'
+    STATUS_COMPLETED = 'completed'
+
+    user_id = db.StringField(required=True)
+    key = db.StringField(required=True)
+    fingerprint = db.StringField(required=True)
+    status = db.StringField(default=STATUS_IN_PROGRESS)
+    owner = db.StringField()
+    status_code = db.IntField()
+    body = db.StringField()
+    headers = db.DictField()
+    created_at = db.DateTimeField(default=datetime.utcnow)
+    lease_expires = db.DateTimeField()
+    expires_at = db.DateTimeField()
+
+    meta = {
+        'collection': 'idempotency_keys',
+        'indexes': [
+            {'fields': ['user_id', 'key'], 'unique': True},
+            {'fields': ['expires_at'], 'expireAfterSeconds': 0}
+        ]
+    }
+
+    @property
+    def completed(self) -> bool:
+        return self.status == self.STATUS_COMPLETED
+
+    @classmethod
+    def begin(cls, user_id: str, key: str, fingerprint: str, owner: str,
+              lease_seconds: float, ttl: float):
+        """Claim the key for this request.
+
+        Returns (record, True) if the caller should run the request, or the
+        existing record and False if another request already holds the key.
+        A request whose owner died (lease expired) is taken over.
+        """
+        now = datetime.utcnow()
+        record = cls(
+            user_id=user_id,
+            key=key,
+            fingerprint=fingerprint,
+            owner=owner,
+            lease_expires=now + timedelta(seconds=lease_seconds),
+            expires_at=now + timedelta(seconds=ttl)
+        )
+        try:
+            record.id = cls._get_collection().insert_one(record.to_mongo()).inserted_id
+            return record, True
+        except DuplicateKeyError:
+            pass
+
+        doc = cls._get_collection().find_one_and_update(
+            {
+                'user_id': user_id,
+                'key': key,
+                'fingerprint': fingerprint,
+                'status': cls.STATUS_IN_PROGRESS,
+                'lease_expires': {'$lt': now}
+            },
+            {'$set': {'owner': owner, 'lease_expires': now + timedelta(seconds=lease_seconds)}},
+            return_document=ReturnDocument.AFTER
+        )
+        if doc:
+            return cls._from_son(doc), True
+
+        return cls.objects(user_id=user_id, key=key).first(), False
+
+    def complete(self, status_code: int, body: str, headers: dict) -> None:
+        # A request that lost its lease must not overwrite the new owner's result
+        self._get_collection().update_one(
+            {'_id': self.pk, 'owner': self.owner, 'status': self.STATUS_IN_PROGRESS},
+            {'$set': {
+                'status': self.STATUS_COMPLETED,
+                'status_code': status_code,
+                'body': body,
+                'headers': headers
+            }}
+        )
+
+    def abandon(self) -> None:
+        """Drop the key so that a retry runs the request again"""
+        self._get_collection().delete_one(
+            {'_id': self.pk, 'owner': self.owner, 'status': self.STATUS_IN_PROGRESS}
+        )
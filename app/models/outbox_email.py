@@ -0,0 +1,98 @@
+from datetime import datetime, timedelta
+from pymongo import ReturnDocument
+from app import db
+
+class OutboxEmail(db.Document):
+    """An email waiting to be delivered by the background sender"""
+    STATUS_PENDING = 'pending'
+    STATUS_SENDING = 'sending'
+    STATUS_SENT = 'sent'
+    STATUS_DEAD = 'dead'
+
+    subject = db.StringField(required=True)
+    sender = db.StringField()
+    recipients = db.ListField(db.StringField(), required=True)
+    body = db.StringField()
+    status = db.StringField(default=STATUS_PENDING)
+    attempts = db.IntField(default=0)
+    last_error = db.StringField()
+    created_at = db.DateTimeField(default=datetime.utcnow)
+    next_attempt_at = db.DateTimeField(default=datetime.utcnow)
+    lease_expires = db.DateTimeField()
+    sent_at = db.DateTimeField()
+    expires_at = db.DateTimeField()
+
+    meta = {
+        'collection': 'email_outbox',
+        'indexes': [
+            {'fields': ['status', 'next_attempt_at']},
+            {'fields': ['status', 'lease_expires']},
+            {'fields': ['expires_at'], 'expireAfterSeconds': 0}
+        ]
+    }
+
+    @classmethod
+    def enqueue(cls, subject: str, sender: str, recipients: list, body: str):
+        email = cls(subject=subject, sender=sender, recipients=recipients, body=body)
+        email.save()
+        return email
+
+    @classmethod
+    def claim_batch(cls, limit: int, lease_seconds: float) -> list:
+        """Atomically take up to limit emails that are due, including ones
+        left in STATUS_SENDING by a sender that died"""
+        now = datetime.utcnow()
+        batch = []
+        for _ in range(limit):
+            doc = cls._get_collection().find_one_and_update(
+                {'$or': [
+                    {'status': cls.STATUS_PENDING, 'next_attempt_at': {'$lte': now}},
+                    {'status': cls.STATUS_SENDING, 'lease_expires': {'$lt': now}}
+                ]},
+                {
+                    '$set': {'status': cls.STATUS_SENDING, 'lease_expires': now + timedelta(seconds=lease_seconds)},
+                    '$inc': {'attempts': 1}
+                },
+                sort=[('next_attempt_at', 1)],
+                return_document=ReturnDocument.AFTER
+            )
+            if doc is None:
+                break
+            batch.append(cls._from_son(doc))
+        return batch
+
+    def _update(self, **fields):
+        self._get_collection().update_one(
+            {'_id': self.pk, 'status': self.STATUS_SENDING, 'attempts': self.attempts},
+            {'$set': fields}
+        )
+
+    def mark_sent(self, ttl: float) -> None:
+        now = datetime.utcnow()
+        self._update(status=self.STATUS_SENT, sent_at=now, expires_at=now + timedelta(seconds=ttl))
+
+    def retry_later(self, error: str, delay: float) -> None:
+        self._update(
+            status=self.STATUS_PENDING,
+            last_error=error,
+            next_attempt_at=datetime.utcnow() + timedelta(seconds=delay)
+        )
+
+    def dead_letter(self, error: str) -> None:
+        self._update(status=self.STATUS_DEAD, last_error=error)
+
+    @classmethod
+    def requeue_dead(cls) -> int:
+        """Give dead-lettered emails a fresh set of attempts"""
+        return cls.objects(status=cls.STATUS_DEAD).update(
+            set__status=cls.STATUS_PENDING,
+            set__attempts=0,
+            set__next_attempt_at=datetime.utcnow()
+        )
+
+    @classmethod
+    def stats(cls) -> dict:
+        counts = {status: 0 for status in (cls.STATUS_PENDING, cls.STATUS_SENDING, cls.STATUS_SENT, cls.STATUS_DEAD)}
+        for row in cls._get_collection().aggregate([{'$group': {'_id': '$status', 'count': {'$sum': 1}}}]):
+            counts[row['_id']] = row['count']
+        return counts
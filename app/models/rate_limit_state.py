@@ -0,0 +1,16 @@
+from datetime import datetime
+from app import db
+
+class RateLimitState(db.Document):
+    key = db.StringField(required=True)
+    state = db.DictField()
+    version = db.IntField(default=0)
+    expires_at = db.DateTimeField(default=datetime.utcnow)
+
+    meta = {
+        'collection': 'rate_limits',
+        'indexes': [
+            {'fields': ['key'], 'unique': True},
+            {'fields': ['expires_at'], 'expireAfterSeconds': 0}
+        ]
+    }
@@ -1,6 +1,6 @@
 from app import db
 from datetime import datetime
-from passlib.hash import pbkdf2_sha256
+from app.utils.password_hasher import password_hasher
 
 class User(db.Document):
     email = db.EmailField(required=True, unique=True)
@@ -13,12 +13,29 @@ class User(db.Document):
     reset_password_expires = db.DateTimeField()
     oauth_provider = db.StringField()
     oauth_id = db.StringField()
+    plan = db.StringField(default='free')
+    request_limit = db.IntField()
 
     def set_password(self, password):
-        self.password_hash = pbkdf2_sha256.hash(password)
+        self.password_hash = password_hasher.hash(password)
 
     def check_password(self, password):
-        return pbkdf2_sha256.verify(password, self.password_hash)
+        if not self.password_hash:
+            return False
+        matches, new_hash = password_hasher.verify(password, self.password_hash)
+        if new_hash:
+            # Hash cost changed since this password was set; upgrade it, unless
+            # the password was changed in the meantime
+            User.objects(id=self.id, password_hash=self.password_hash).update_one(set__password_hash=new_hash)
+            self.password_hash = new_hash
+        return matches
+
+    def token_claims(self):
+        # Carried in the JWT as a fallback; quota checks read the user record
+        claims = {'plan': self.plan}
+        if self.request_limit:
+            claims['request_limit'] = self.request_limit
+        return claims
 
     def to_dict(self):
         return {
@@ -2,11 +2,21 @@ from flask import Blueprint, request, jsonify
 from flask_jwt_extended import create_access_token
 from app.models.user import User
 from app.utils.email import send_reset_password_email
+from app.utils.google_auth import InvalidGoogleToken, google_auth
+from app.utils.logger import get_logger
+from app.utils.password_hasher import HasherBusy
 from app.utils.security import generate_reset_token
 from datetime import datetime, timedelta
 import requests
 
 auth = Blueprint('auth', __name__)
+
+logger = get_logger(__name__)
+
+@auth.errorhandler(HasherBusy)
+def hasher_busy(e):
+    return {'message': 'Too many sign-in attempts in progress, please retry shortly'}, 503, {'Retry-After': '1'}
+
 def validate_registration_data(data):
     required_fields = ['email', 'first_name', 'last_name', 'password']
     errors = {
@@ -117,7 +127,7 @@ def login():
     if not user or not user.check_password(data['password']):
         return {'message': 'Invalid email or password'}, 401
 
-    access_token = create_access_token(identity=str(user.id))
+    access_token = create_access_token(identity=str(user.id), additional_claims=user.token_claims())
     return {'access_token': access_token}, 200
 
 @auth.route('/forgot-password', methods=['POST'])
@@ -169,15 +179,14 @@ def google_oauth():
     token = data['token']
 
     # Verify Google token
-    google_response = requests.get(
-        'https://www.googleapis.com/oauth2/v3/userinfo',
-        headers={'Authorization': f'Bearer {token}'}
-    )
-
-    if google_response.status_code != 200:
+    try:
+        google_data = google_auth.identify(token)
+    except InvalidGoogleToken as e:
+        logger.warning(f'Rejected Google token: {str(e)}')
         return {'message': 'Invalid token'}, 401
-
-    google_data = google_response.json()
+    except requests.RequestException as e:
+        logger.error(f'Google token verification failed: {str(e)}')
+        return {'message': 'Google sign-in is unavailable, please retry shortly'}, 503
     user = User.objects(email=google_data['email']).first()
 
     if not user:
@@ -190,5 +199,5 @@ def google_oauth():
         )
         user.save()
 
-    access_token = create_access_token(identity=str(user.id))
+    access_token = create_access_token(identity=str(user.id), additional_claims=user.token_claims())
     return {'access_token': access_token}, 200
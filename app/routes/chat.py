@@ -1,21 +1,40 @@
-from datetime import datetime, timedelta
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, Response, stream_with_context
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from app.models.chat import Chat
+import json
+import time
 import requests
-import uuid
-from app.utils.request_limiter import check_request_quota
-from app.models.request_quota import RequestQuota
+from bson import ObjectId
+from bson.errors import InvalidId
+from app.models.chat import Chat
+from app.models.chat_job import ChatJob
+from app.utils.admission import admission_control
+from app.utils.idempotency import idempotent
+from app.utils.metrics import internal_required, stage_timer, timed_jwt_required
+from app.utils.request_limiter import check_request_quota, refund_request_quota
 from flask import current_app
-from app.utils.model_graph import graph
+from app.utils.chat_service import cached_response, get_chat_session, prepare_graph_input, run_chat_turn
+from app.utils.model_graph import MODEL_ID, stream_graph
+from app.utils.resilience import deadline_scope, status_for_error
+from app.utils.response_cache import response_cache
+from app.utils.responses import compress_response
+from app.utils.logger import get_logger
 
 chat = Blueprint('chat', __name__)
+chat.after_request(compress_response)
+
+logger = get_logger(__name__)
+
+
+def sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
 
 
 @chat.route('/send', methods=['POST'])
-@jwt_required()
+@timed_jwt_required
+@idempotent
+@admission_control
 @check_request_quota
-def send_chat():
+def send_chat(quota):
     try:
         user_id = get_jwt_identity()
         data = request.get_json()
@@ -23,63 +42,191 @@ def send_chat():
         if not data or 'message' not in data:
             return jsonify({'error': 'Message is required'}), 400
 
-        # Get remaining requests for response
-        remaining_requests = RequestQuota.get_remaining_requests(user_id)
-
         # Get or create chat context
-        context_id = data.get('context_id')
-        if context_id:
-            chat_session = Chat.objects(
-                context_id=context_id, user_id=user_id).first()
-            if not chat_session:
-                return jsonify({'error': 'Invalid context ID'}), 404
-        else:
-            context_id = str(uuid.uuid4())
-            chat_session = Chat(user_id=user_id, context_id=context_id)
-            chat_session.ttl = datetime.utcnow() + timedelta(days=2)
-            chat_session.save()
-
-        # Input text
-        chat_session.messages.append({
-            'role': 'user',
-            'content': data['message']
-        })
-
-        # response = current_app.huggingface_client.chat_completion(
-        #     chat_session.messages,
-        #     max_tokens=1000,
-        #     model="meta-llama/Llama-3.1-8B-Instruct",
-        #     stream=False
-        # )
-        # ai_response = response.choices[0].message.content
-
-        resp = graph.invoke({"messages": chat_session.messages})
-        ai_response = resp["messages"][-1].content
-
-        chat_session.messages.append({
-            'role': 'assistant',
-            'content': ai_response
-        })
-        chat_session.ttl = datetime.utcnow() + timedelta(days=2)
-        chat_session.save()
+        chat_session, context_id = get_chat_session(user_id, data.get('context_id'))
+        if not chat_session:
+            return jsonify({'error': 'Invalid context ID'}), 404
 
-        return jsonify({
-            'response': ai_response,
-            'context_id': context_id,
-            'success': True,
-            'quota': {
-                'remaining_requests': remaining_requests,
-                'max_requests': 15,
-                'reset_time': 'midnight UTC'
-            }
-        })
+        ai_response = run_chat_turn(chat_session, data)
+
+        with stage_timer('serialize'):
+            return jsonify({
+                'response': ai_response,
+                'context_id': context_id,
+                'success': True,
+                'quota': quota.to_dict()
+            })
     except Exception as e:
+        logger.error(f'Chat failed for user {user_id}: {str(e)}')
+        # No answer was delivered, so the request is not charged
+        quota = refund_request_quota(user_id, quota)
         return jsonify({
             'error': str(e),
             'success': False,
-            'quota': {
-                'remaining_requests': RequestQuota.get_remaining_requests(user_id) - 1,
-                'max_requests': 15,
-                'reset_time': 'midnight UTC'
-            }
-        }), 500
+            'quota': quota.to_dict()
+        }), status_for_error(e)
+
+
+@chat.route('/send/stream', methods=['POST'])
+@timed_jwt_required
+@admission_control
+@check_request_quota
+def send_chat_stream(quota):
+    user_id = get_jwt_identity()
+    data = request.get_json()
+
+    if not data or 'message' not in data:
+        return jsonify({'error': 'Message is required'}), 400
+
+    chat_session, context_id = get_chat_session(user_id, data.get('context_id'))
+    if not chat_session:
+        return jsonify({'error': 'Invalid context ID'}), 404
+
+    user_message = {
+        'role': 'user',
+        'content': data['message']
+    }
+    cacheable, ai_response = cached_response(data)
+
+    def generate():
+        answered = False
+        yield sse_event('context', {'context_id': context_id})
+        try:
+            if ai_response is not None:
+                response = ai_response
+                answered = True
+                yield sse_event('token', {'content': response})
+            else:
+                with deadline_scope(current_app.config['CHAT_DEADLINE_SECONDS']):
+                    graph_input, thread_id = prepare_graph_input(chat_session, user_message)
+                    for event, payload in stream_graph(graph_input, thread_id):
+                        if event == 'message':
+                            response = payload['content']
+                        else:
+                            answered = answered or event == 'token'
+                            yield sse_event(event, payload)
+                if cacheable and response:
+                    response_cache.set(data['message'], MODEL_ID, response)
+
+            with stage_timer('chat_save'):
+                chat_session.append_messages([user_message, {
+                    'role': 'assistant',
+                    'content': response
+                }])
+
+            yield sse_event('done', {
+                'response': response,
+                'context_id': context_id,
+                'success': True,
+                'quota': quota.to_dict()
+            })
+        except Exception as e:
+            logger.error(f'Streaming chat failed for user {user_id}: {str(e)}')
+            yield sse_event('error', {
+                'error': str(e),
+                'status': status_for_error(e),
+                'success': False,
+                # Only charge for turns that produced some answer
+                'quota': (quota if answered else refund_request_quota(user_id, quota)).to_dict()
+            })
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={
+            'Cache-Control': 'no-cache',
+            # Stop nginx from buffering the stream
+            'X-Accel-Buffering': 'no'
+        }
+    )
+
+
+@chat.route('/conversations', methods=['GET'])
+@jwt_required()
+def list_conversations():
+    user_id = get_jwt_identity()
+    limit = min(max(request.args.get('limit', 20, type=int), 1), current_app.config['CHAT_PAGE_MAX'])
+    try:
+        conversations, next_cursor = Chat.list_for_user(user_id, limit, request.args.get('cursor'))
+    except ValueError:
+        return jsonify({'error': 'Invalid cursor'}), 400
+
+    return jsonify({'conversations': conversations, 'next_cursor': next_cursor})
+
+
+@chat.route('/conversations/<context_id>/messages', methods=['GET'])
+@jwt_required()
+def get_conversation_messages(context_id):
+    user_id = get_jwt_identity()
+    chat_session = Chat.objects(context_id=context_id, user_id=user_id) \
+        .only('context_id', 'storage', 'message_count').first()
+    if not chat_session:
+        return jsonify({'error': 'Conversation not found'}), 404
+
+    limit = min(max(request.args.get('limit', 50, type=int), 1), current_app.config['CHAT_PAGE_MAX'])
+    messages, next_before, total = chat_session.message_window(limit, request.args.get('before', type=int))
+
+    return jsonify({
+        'context_id': context_id,
+        'messages': messages,
+        'message_count': total,
+        'next_before': next_before
+    })
+
+
+@chat.route('/jobs', methods=['POST'])
+@jwt_required()
+@idempotent
+@check_request_quota
+def submit_chat_job(quota):
+    user_id = get_jwt_identity()
+    data = request.get_json()
+
+    if not data or 'message' not in data:
+        return jsonify({'error': 'Message is required'}), 400
+
+    chat_session, context_id = get_chat_session(user_id, data.get('context_id'))
+    if not chat_session:
+        return jsonify({'error': 'Invalid context ID'}), 404
+
+    job = ChatJob(
+        user_id=user_id,
+        context_id=context_id,
+        new_conversation=not data.get('context_id'),
+        message=data['message'],
+        request_limit=quota.limit
+    )
+    job.save()
+
+    return jsonify({**job.to_dict(), 'quota': quota.to_dict()}), 202
+
+
+@chat.route('/jobs/<job_id>', methods=['GET'])
+@jwt_required()
+def get_chat_job(job_id):
+    user_id = get_jwt_identity()
+    try:
+        job_oid = ObjectId(job_id)
+    except (InvalidId, TypeError):
+        return jsonify({'error': 'Job not found'}), 404
+
+    job = ChatJob.objects(id=job_oid, user_id=user_id).first()
+    if not job:
+        return jsonify({'error': 'Job not found'}), 404
+
+    # Long poll: hold the request until the job finishes or the wait runs out
+    wait = min(request.args.get('wait', 0, type=float), current_app.config['JOB_MAX_WAIT'])
+    give_up_at = time.monotonic() + wait
+    interval = 0.25
+    while not job.finished and time.monotonic() < give_up_at:
+        time.sleep(min(interval, max(0, give_up_at - time.monotonic())))
+        interval = min(interval * 2, 2)
+        job.reload()
+
+    return jsonify(job.to_dict())
+
+
+@chat.route('/jobs/stats', methods=['GET'])
+@internal_required
+def chat_job_stats():
+    return jsonify(ChatJob.stats())
@@ -0,0 +1,306 @@
+"""Socket.IO chat channel.
+
+One connection carries any number of conversations. The access token is
+checked once, on connect, and the user's identity, request limit and last
+quota state are kept for the life of the connection. Each ``send`` runs as
+a background task, tagged with the client's ``context_id`` and
+``request_id`` so that replies can be matched up, and loads the
+conversation afresh, so turns taken over HTTP are always seen.
+
+Frames are emitted with an acknowledgement. Once SOCKET_MAX_IN_FLIGHT
+frames are unacknowledged, tokens are coalesced into the next frame
+instead of queued, so a slow client costs memory for one answer rather
+than one frame per token.
+"""
+import math
+import threading
+import time
+import uuid
+from flask import current_app, request
+from flask_jwt_extended import decode_token
+from flask_socketio import Namespace
+from app import socketio
+from app.utils.admission import admission, AdmissionRejected
+from app.utils.chat_service import cached_response, get_chat_session, prepare_graph_input
+from app.utils.logger import correlation_scope, get_logger
+from app.utils.metrics import stage_timer
+from app.utils.model_graph import MODEL_ID, stream_graph
+from app.utils.rate_limit import rate_limiter, ContentionError
+from app.utils.request_limiter import refund_request_quota, request_limit_for
+from app.utils.resilience import deadline_scope, status_for_error
+from app.utils.response_cache import response_cache
+
+logger = get_logger(__name__)
+
+NAMESPACE = '/chat'
+
+
+class ConnectionClosed(Exception):
+    pass
+
+
+class Connection:
+    """State of one authenticated socket"""
+
+    def __init__(self, sid, user_id, claims, expires_at, config):
+        self.sid = sid
+        self.user_id = user_id
+        self.claims = claims
+        self.expires_at = expires_at
+        self.quota = None
+        self.connected = True
+        self.max_turns = config['SOCKET_MAX_TURNS']
+        self.max_in_flight = config['SOCKET_MAX_IN_FLIGHT']
+        self.ack_timeout = config['SOCKET_ACK_TIMEOUT']
+        # context_id -> request_id of the turn running in it
+        self.turns = {}
+        self._lock = threading.Lock()
+        self._cond = threading.Condition()
+        self._in_flight = 0
+
+    def start_turn(self, context_id, request_id):
+        """Reserve a turn slot; returns an error message if none is free"""
+        with self._lock:
+            if len(self.turns) >= self.max_turns:
+                return f'At most {self.max_turns} messages can be answered at once'
+            if context_id in self.turns:
+                return 'A message is already being answered in this conversation'
+            self.turns[context_id or request_id] = request_id
+        return None
+
+    def end_turn(self, key):
+        with self._lock:
+            self.turns.pop(key, None)
+
+    def writable(self) -> bool:
+        return self._in_flight < self.max_in_flight
+
+    def send(self, event, payload):
+        """Emit a frame, waiting while SOCKET_MAX_IN_FLIGHT frames are unacknowledged"""
+        with self._cond:
+            ready = self._cond.wait_for(
+                lambda: self.writable() or not self.connected, self.ack_timeout)
+            if not self.connected:
+                raise ConnectionClosed()
+            if not ready:
+                # The client stopped reading; free the turn and its admission slot
+                logger.warning(f'Socket {self.sid} of user {self.user_id} is not acknowledging, disconnecting')
+                self.close()
+                socketio.server.disconnect(self.sid, namespace=NAMESPACE)
+                raise ConnectionClosed()
+            self._in_flight += 1
+        socketio.emit(event, payload, to=self.sid, namespace=NAMESPACE, callback=self._ack)
+
+    def _ack(self, *args):
+        with self._cond:
+            self._in_flight -= 1
+            self._cond.notify_all()
+
+    def close(self):
+        with self._cond:
+            self.connected = False
+            self._cond.notify_all()
+
+
+connections = {}
+
+
+class ChatNamespace(Namespace):
+    """Events: ``send`` from the client; ``context``, ``token``, ``tool_call``,
+    ``tool_result``, ``done`` and ``error`` back to it"""
+
+    def on_connect(self, auth=None):
+        # Only from the auth payload; a query string ends up in access logs
+        token = (auth or {}).get('token')
+        if not token:
+            raise ConnectionRefusedError('Authentication required')
+        try:
+            with stage_timer('jwt'):
+                claims = decode_token(token)
+        except Exception as e:
+            logger.info(f'Rejected socket connection: {str(e)}')
+            raise ConnectionRefusedError('Invalid token')
+        if claims.get('type') != 'access':
+            raise ConnectionRefusedError('Invalid token')
+
+        connections[request.sid] = Connection(
+            request.sid, claims['sub'], claims, claims['exp'], current_app.config)
+        logger.info(f'Socket {request.sid} connected for user {claims["sub"]}')
+
+    def on_disconnect(self):
+        conn = connections.pop(request.sid, None)
+        if conn:
+            conn.close()
+            logger.info(f'Socket {request.sid} of user {conn.user_id} disconnected')
+
+    def on_send(self, data):
+        conn = connections.get(request.sid)
+        if conn is None:
+            return
+        data = dict(data) if isinstance(data, dict) else {}
+        data['request_id'] = data.get('request_id') or uuid.uuid4().hex
+        context_id = data.get('context_id')
+        request_id = data['request_id']
+
+        def reject(error, status, **extra):
+            # Sent like every other frame, so the client's ack is expected
+            try:
+                conn.send('error', {
+                    'error': error,
+                    'status': status,
+                    'success': False,
+                    'context_id': context_id,
+                    'request_id': request_id,
+                    **extra
+                })
+            except ConnectionClosed:
+                pass
+
+        if time.time() >= conn.expires_at:
+            reject('Token has expired', 401)
+            self.disconnect(conn.sid)
+            return
+        if not data.get('message'):
+            return reject('Message is required', 400)
+
+        error = conn.start_turn(context_id, request_id)
+        if error:
+            return reject(error, 429)
+
+        key = context_id or request_id
+        app = current_app._get_current_object()
+        socketio.start_background_task(self._run_turn, app, conn, key, data)
+
+    def _admit(self, conn):
+        """Take an admission slot and charge the quota; returns (release, quota)"""
+        limit = request_limit_for(conn.user_id, conn.claims)
+        # Skip the quota store while the cached state already says no
+        if conn.quota and not conn.quota.allowed and conn.quota.limit == limit and time.time() < conn.quota.reset_at:
+            return None, conn.quota
+
+        release = admission.acquire()
+        try:
+            with stage_timer('quota'):
+                conn.quota = rate_limiter.consume(conn.user_id, limit)
+        except BaseException:
+            release()
+            raise
+        if not conn.quota.allowed:
+            release()
+            return None, conn.quota
+        return release, conn.quota
+
+    def _run_turn(self, app, conn, key, data):
+        context_id = data.get('context_id')
+        request_id = data.get('request_id')
+        tags = {'context_id': context_id, 'request_id': request_id}
+
+        def error_event(message, status, **extra):
+            return {'error': message, 'status': status, 'success': False, **tags, **extra}
+
+        with app.app_context(), correlation_scope(f'ws-{request_id}'):
+            try:
+                try:
+                    release, quota = self._admit(conn)
+                except AdmissionRejected as e:
+                    conn.send('error', error_event(str(e), 503, retry_after=e.retry_after))
+                    return
+                except ContentionError:
+                    logger.warning(f'Failed to increment request count for user {conn.user_id}')
+                    conn.send('error', error_event('Failed to process request', 500))
+                    return
+                if release is None:
+                    logger.warning(f'User {conn.user_id} has exceeded their request quota')
+                    conn.send('error', error_event(
+                        'Request quota exceeded', 429,
+                        retry_after=max(1, math.ceil(quota.reset_at - time.time())),
+                        **quota.to_dict()))
+                    return
+
+                try:
+                    self._answer(conn, data, tags, quota)
+                finally:
+                    release()
+            except ConnectionClosed:
+                pass
+            except Exception as e:
+                logger.error(f'Socket turn failed for user {conn.user_id}: {str(e)}')
+            finally:
+                conn.end_turn(key)
+
+    def _answer(self, conn, data, tags, quota):
+        answered = False
+        try:
+            chat_session, context_id = get_chat_session(conn.user_id, data.get('context_id'))
+            if not chat_session:
+                conn.send('error', {
+                    'error': 'Invalid context ID', 'status': 404, 'success': False, **tags,
+                    'quota': refund_request_quota(conn.user_id, quota).to_dict()
+                })
+                return
+            tags = {**tags, 'context_id': context_id}
+            conn.send('context', tags)
+
+            user_message = {
+                'role': 'user',
+                'content': data['message']
+            }
+            cacheable, ai_response = cached_response(data)
+            if ai_response is not None:
+                response = ai_response
+                answered = True
+                conn.send('token', {**tags, 'content': response})
+            else:
+                pending = []
+                with deadline_scope(current_app.config['CHAT_DEADLINE_SECONDS']):
+                    graph_input, thread_id = prepare_graph_input(chat_session, user_message)
+                    for event, payload in stream_graph(graph_input, thread_id):
+                        if not conn.connected:
+                            raise ConnectionClosed()
+                        if event == 'message':
+                            response = payload['content']
+                            continue
+                        if event == 'token':
+                            answered = True
+                            pending.append(payload['content'])
+                            # Coalesce while the client is behind
+                            if not conn.writable():
+                                continue
+                        if pending:
+                            conn.send('token', {**tags, 'content': ''.join(pending)})
+                            pending.clear()
+                        if event != 'token':
+                            conn.send(event, {**tags, **payload})
+                if pending:
+                    conn.send('token', {**tags, 'content': ''.join(pending)})
+                if cacheable and response:
+                    response_cache.set(data['message'], MODEL_ID, response)
+
+            with stage_timer('chat_save'):
+                chat_session.append_messages([user_message, {
+                    'role': 'assistant',
+                    'content': response
+                }])
+
+            conn.send('done', {
+                **tags,
+                'response': response,
+                'success': True,
+                'quota': quota.to_dict()
+            })
+        except ConnectionClosed:
+            if not answered:
+                refund_request_quota(conn.user_id, quota)
+            raise
+        except Exception as e:
+            logger.error(f'Socket chat failed for user {conn.user_id}: {str(e)}')
+            # Only charge for turns that produced some answer
+            if not answered:
+                conn.quota = quota = refund_request_quota(conn.user_id, quota)
+            conn.send('error', {
+                'error': str(e),
+                'status': status_for_error(e),
+                'success': False,
+                **tags,
+                'quota': quota.to_dict()
+            })
@@ -1,12 +1,16 @@
 from flask import Blueprint, jsonify, request
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from app.models.user import User
-from app.models.request_quota import RequestQuota
+from app.utils.rate_limit import rate_limiter
+from app.utils.request_limiter import current_request_limit
+from app.utils.user_cache import user_cache
+from app.utils.responses import compress_response
 from app.models.chat import Chat
 from app.utils.logger import get_logger
 
 # Create users Blueprint
 users = Blueprint('users', __name__)
+users.after_request(compress_response)
 
 logger = get_logger(__name__)
 
@@ -16,53 +20,42 @@ def get_profile():
     # Get the user ID from the JWT token
     current_user_id = get_jwt_identity()
 
-    # Find the user in database
-    user = User.objects.get(id=current_user_id)
+    # Find the user, usually without a database round trip
+    user = user_cache.get(current_user_id, ('email', 'first_name', 'last_name', 'oauth_provider'))
 
     if not user:
         return {'message': 'User not found'}, 404
 
     # Return user profile data
-    return {
-        'email': user.email,
-        'first_name': user.first_name,
-        'last_name': user.last_name,
-        'oauth_provider': user.oauth_provider if hasattr(user, 'oauth_provider') else None
-    }, 200
+    return user, 200
 
 @users.route('/quota', methods=['GET'])
 @jwt_required()
 def get_quota():
     current_user = get_jwt_identity()
-    remaining = RequestQuota.get_remaining_requests(current_user)
+    quota = rate_limiter.peek(current_user, current_request_limit())
 
-    logger.info(f"User {current_user} has {remaining} requests remaining")
+    logger.info(f"User {current_user} has {quota.remaining} requests remaining")
 
-    return jsonify({
-        "remaining_requests": remaining,
-        "max_requests": 15,
-        "reset_time": "midnight UTC"
-    })
+    return jsonify(quota.to_dict())
 
 @users.route('/delete', methods=['DELETE'])
 @jwt_required()
 def delete_user():
     current_user_id = get_jwt_identity()
 
-    # Find the user in database
-    user = User.objects.get(id=current_user_id)
-
-    if not user:
+    if not user_cache.get(current_user_id):
         return {'message': 'User not found'}, 404
 
     # Delete user's chat history
-    Chat.objects(user_id=current_user_id).delete()
+    Chat.delete_for_user(current_user_id)
 
     # Delete user's request quota
-    RequestQuota.objects(user_id=current_user_id).delete()
+    rate_limiter.reset(current_user_id)
 
     # Delete user
-    user.delete()
+    User.objects(id=current_user_id).delete()
+    user_cache.invalidate(current_user_id)
 
     logger.info(f"User {current_user_id} and associated data deleted successfully")
 
@@ -0,0 +1,218 @@
+from datetime import datetime, timedelta
+from functools import wraps
+import math
+import threading
+import time
+import uuid
+from flask import jsonify, make_response
+from pymongo.errors import DuplicateKeyError
+from app.utils.logger import get_logger
+from app.utils.metrics import stage_timer
+
+logger = get_logger(__name__)
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, retry_after: int):
+        super().__init__('Server is busy')
+        self.retry_after = retry_after
+
+
+class GlobalSlots:
+    """Cluster-wide cap on concurrent LLM calls using leased slots in Mongo"""
+
+    def __init__(self, limit: int, lease_seconds: float):
+        self.limit = limit
+        self.lease_seconds = lease_seconds
+        self._ready = False
+
+    @staticmethod
+    def _collection():
+        from app.models.admission_slot import AdmissionSlot
+        return AdmissionSlot._get_collection()
+
+    def _ensure_slots(self):
+        if self._ready:
+            return
+        collection = self._collection()
+        for slot in range(self.limit):
+            try:
+                collection.update_one(
+                    {'slot': slot},
+                    {'$setOnInsert': {'holder': None, 'lease_expires': datetime.utcnow()}},
+                    upsert=True
+                )
+            except DuplicateKeyError:
+                pass
+        self._ready = True
+
+    def try_acquire(self):
+        """Take a free slot; returns a token for release, or None if all are held"""
+        self._ensure_slots()
+        now = datetime.utcnow()
+        holder = uuid.uuid4().hex
+        slot = self._collection().find_one_and_update(
+            {'slot': {'$lt': self.limit}, 'lease_expires': {'$lte': now}},
+            {'$set': {'holder': holder, 'lease_expires': now + timedelta(seconds=self.lease_seconds)}},
+            projection={'slot': 1}
+        )
+        return (slot['slot'], holder) if slot else None
+
+    def release(self, token):
+        slot, holder = token
+        self._collection().update_one(
+            {'slot': slot, 'holder': holder},
+            {'$set': {'holder': None, 'lease_expires': datetime.utcnow()}}
+        )
+
+
+class AdmissionController:
+    """Limits concurrent LLM calls per process and, optionally, across nodes.
+
+    Up to ADMISSION_MAX_CONCURRENT requests run at once in a process and up to
+    ADMISSION_MAX_QUEUE more wait for a slot for at most
+    ADMISSION_QUEUE_TIMEOUT seconds. Anything beyond that is rejected
+    immediately, with a Retry-After estimated from recent slot hold times.
+    """
+
+    def __init__(self, app=None):
+        self._cond = threading.Condition()
+        self._active = 0
+        self._waiting = 0
+        self._hold_ewma = 1.0
+        self.global_slots = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.max_concurrent = app.config['ADMISSION_MAX_CONCURRENT']
+        self.max_queue = app.config['ADMISSION_MAX_QUEUE']
+        self.queue_timeout = app.config['ADMISSION_QUEUE_TIMEOUT']
+        if app.config['ADMISSION_GLOBAL_LIMIT'] > 0:
+            self.global_slots = GlobalSlots(
+                app.config['ADMISSION_GLOBAL_LIMIT'],
+                app.config['CHAT_DEADLINE_SECONDS'] + 30
+            )
+        app.extensions['admission'] = self
+
+    def retry_after(self) -> int:
+        with self._cond:
+            backlog = self._waiting + 1
+        return max(1, math.ceil(self._hold_ewma * backlog / self.max_concurrent))
+
+    def _acquire_local(self, timeout):
+        with self._cond:
+            if self._active < self.max_concurrent:
+                self._active += 1
+                return True
+            if self._waiting >= self.max_queue or not timeout:
+                return False
+            self._waiting += 1
+            try:
+                give_up_at = time.monotonic() + timeout
+                while self._active >= self.max_concurrent:
+                    remaining = give_up_at - time.monotonic()
+                    if remaining <= 0:
+                        return False
+                    self._cond.wait(remaining)
+                self._active += 1
+                return True
+            finally:
+                self._waiting -= 1
+
+    def _release_local(self):
+        with self._cond:
+            self._active -= 1
+            self._cond.notify()
+
+    def _acquire_global(self, timeout):
+        give_up_at = time.monotonic() + (timeout or 0)
+        delay = 0.05
+        while True:
+            token = self.global_slots.try_acquire()
+            if token or time.monotonic() + delay > give_up_at:
+                return token
+            time.sleep(delay)
+            delay = min(delay * 2, 0.5)
+
+    def acquire(self, timeout=None):
+        """Wait up to ``timeout`` (default ADMISSION_QUEUE_TIMEOUT) for a slot.
+
+        Returns a release callable, or raises AdmissionRejected.
+        """
+        timeout = self.queue_timeout if timeout is None else timeout
+        start = time.monotonic()
+        if not self._acquire_local(timeout):
+            raise AdmissionRejected(self.retry_after())
+
+        token = None
+        if self.global_slots is not None:
+            try:
+                token = self._acquire_global(timeout - (time.monotonic() - start))
+            except Exception:
+                self._release_local()
+                raise
+            if token is None:
+                self._release_local()
+                raise AdmissionRejected(self.retry_after())
+
+        acquired_at = time.monotonic()
+        released = threading.Event()
+
+        def release():
+            if released.is_set():
+                return
+            released.set()
+            held = time.monotonic() - acquired_at
+            self._hold_ewma = 0.8 * self._hold_ewma + 0.2 * held
+            if token is not None:
+                try:
+                    self.global_slots.release(token)
+                except Exception as e:
+                    # The lease expires on its own
+                    logger.warning(f'Failed to release admission slot: {str(e)}')
+            self._release_local()
+
+        return release
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {'active': self._active, 'waiting': self._waiting, 'max_concurrent': self.max_concurrent}
+
+
+admission = AdmissionController()
+
+
+def admission_control(f):
+    """Shed load before any work is done or quota is charged.
+
+    Place it outside check_request_quota. The slot is held until the response
+    is finished, including the whole body of streamed responses.
+    """
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        try:
+            with stage_timer('admission'):
+                release = admission.acquire()
+        except AdmissionRejected as e:
+            logger.warning('Rejecting chat request: server is at capacity')
+            response = make_response(jsonify({
+                'error': 'Server is busy, please retry shortly',
+                'success': False
+            }), 503)
+            response.headers['Retry-After'] = str(e.retry_after)
+            return response
+
+        try:
+            response = make_response(f(*args, **kwargs))
+        except Exception:
+            release()
+            raise
+
+        if response.is_streamed:
+            response.call_on_close(release)
+        else:
+            release()
+        return response
+
+    return decorated_function
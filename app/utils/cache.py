@@ -0,0 +1,198 @@
+"""Small caching building blocks shared by the response and search caches"""
+from collections import OrderedDict
+from datetime import datetime, timedelta
+import json
+import threading
+import time
+
+
+class TTLCache:
+    """Thread-safe in-process cache with LRU eviction and per-entry expiry.
+
+    None is used as the miss value, so None itself cannot be cached.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[1] <= time.monotonic():
+                if entry is not None:
+                    del self._data[key]
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, key, value, ttl=None):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + (ttl or self.ttl))
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self) -> dict:
+        return {'size': len(self._data), 'hits': self.hits, 'misses': self.misses}
+
+
+class MongoCacheTier:
+    """Shared cache tier in the cache_entries collection, expired by a TTL index"""
+
+    def __init__(self, namespace: str, ttl: float):
+        self.namespace = namespace
+        self.ttl = ttl
+
+    @staticmethod
+    def _collection():
+        from app.models.cache_entry import CacheEntry
+        return CacheEntry._get_collection()
+
+    def get(self, key):
+        doc = self._collection().find_one(
+            {'namespace': self.namespace, 'key': key, 'expires_at': {'$gt': datetime.utcnow()}},
+            {'value': 1}
+        )
+        return doc['value'] if doc else None
+
+    def set(self, key, value, ttl=None):
+        self._collection().update_one(
+            {'namespace': self.namespace, 'key': key},
+            {'$set': {
+                'value': value,
+                'expires_at': datetime.utcnow() + timedelta(seconds=ttl or self.ttl)
+            }},
+            upsert=True
+        )
+
+    def delete(self, key):
+        self._collection().delete_one({'namespace': self.namespace, 'key': key})
+
+
+class RedisCacheTier:
+    """Shared cache tier on a Redis-style client (the in-memory stand-in by default)"""
+
+    def __init__(self, namespace: str, ttl: float, client=None):
+        from app.utils.rate_limit.backends import InMemoryRedis
+        self.namespace = namespace
+        self.ttl = ttl
+        self.client = client or InMemoryRedis()
+
+    def _key(self, key):
+        return f'{self.namespace}:{key}'
+
+    def get(self, key):
+        raw = self.client.get(self._key(key))
+        return json.loads(raw) if raw else None
+
+    def set(self, key, value, ttl=None):
+        self.client.set(self._key(key), json.dumps(value), ex=int(ttl or self.ttl))
+
+    def delete(self, key):
+        self.client.delete(self._key(key))
+
+
+SHARED_TIERS = {
+    'mongo': MongoCacheTier,
+    'redis': RedisCacheTier,
+}
+
+
+class TieredCache:
+    """In-process LRU/TTL cache in front of an optional shared tier"""
+
+    def __init__(self, local: TTLCache, shared=None):
+        self.local = local
+        self.shared = shared
+        self.shared_hits = 0
+
+    def get(self, key):
+        value = self.local.get(key)
+        if value is not None or self.shared is None:
+            return value
+        value = self.shared.get(key)
+        if value is not None:
+            self.shared_hits += 1
+            self.local.set(key, value)
+        return value
+
+    def set(self, key, value):
+        self.local.set(key, value)
+        if self.shared is not None:
+            self.shared.set(key, value)
+
+    def delete(self, key):
+        self.local.delete(key)
+        if self.shared is not None:
+            self.shared.delete(key)
+
+    def stats(self) -> dict:
+        local = self.local.stats()
+        return {
+            'size': local['size'],
+            'hits': local['hits'] + self.shared_hits,
+            'local_hits': local['hits'],
+            'shared_hits': self.shared_hits,
+            'misses': local['misses'] - self.shared_hits,
+        }
+
+
+def build_cache(maxsize: int, ttl: float, shared: str = '', namespace: str = 'cache') -> TieredCache:
+    """Build a cache from config values; ``shared`` is '', 'mongo' or 'redis'"""
+    shared_tier = SHARED_TIERS[shared](namespace, ttl) if shared else None
+    return TieredCache(TTLCache(maxsize, ttl), shared_tier)
+
+
+class SingleFlight:
+    """Collapse concurrent calls for the same key into one execution.
+
+    The first caller runs the function; callers arriving while it is in
+    flight wait and receive the same result or exception.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, fn, timeout=None):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = {'event': threading.Event(), 'result': None, 'error': None}
+
+        if not leader:
+            if not call['event'].wait(timeout):
+                raise TimeoutError('Timed out waiting for an identical in-flight call')
+            if call['error'] is not None:
+                raise call['error']
+            return call['result']
+
+        try:
+            call['result'] = fn()
+            return call['result']
+        except Exception as e:
+            call['error'] = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call['event'].set()
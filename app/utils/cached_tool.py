@@ -0,0 +1,70 @@
+import json
+import re
+from typing import Any
+from langchain_core.tools import BaseTool
+from app.utils.cache import SingleFlight
+from app.utils.resilience import ProviderError, call_with_retries, remaining_time
+from app.utils.logger import get_logger
+from app.utils.metrics import timed_stage
+
+logger = get_logger(__name__)
+
+
+def normalize_query(query: str) -> str:
+    return re.sub(r'\s+', ' ', query).strip().strip('?!.').lower()
+
+
+class CachedTool(BaseTool):
+    """Wrap a search tool with a result cache and in-flight request coalescing.
+
+    The wrapper exposes the inner tool's name, description and argument
+    schema, so the model sees exactly the same tool. Identical calls (same
+    normalized query and arguments) are served from the cache, and concurrent
+    identical calls share a single upstream request. With a ``policy`` the
+    upstream call is retried and guarded by ``breaker``.
+    """
+    tool: BaseTool
+    cache: Any
+    flight: Any = None
+    policy: Any = None
+    breaker: Any = None
+
+    def __init__(self, tool: BaseTool, cache, **kwargs):
+        super().__init__(
+            name=tool.name,
+            description=tool.description,
+            args_schema=tool.args_schema,
+            tool=tool,
+            cache=cache,
+            flight=SingleFlight(),
+            **kwargs
+        )
+
+    @staticmethod
+    def cache_key(tool_input: dict) -> str:
+        args = dict(tool_input)
+        if isinstance(args.get('query'), str):
+            args['query'] = normalize_query(args['query'])
+        return json.dumps(args, sort_keys=True, default=str)
+
+    @timed_stage('search')
+    def _run(self, **kwargs):
+        key = self.cache_key(kwargs)
+        result = self.cache.get(key)
+        if result is not None:
+            logger.debug(f'Search cache hit for {self.name}')
+            return result
+
+        def call():
+            result = self.tool.invoke(kwargs)
+            # Tavily reports failures as an error payload instead of raising
+            if isinstance(result, dict) and 'error' in result:
+                raise ProviderError(str(result['error']))
+            return result
+
+        def fetch():
+            result = call_with_retries(call, self.policy, self.breaker) if self.policy else call()
+            self.cache.set(key, result)
+            return result
+
+        return self.flight.do(key, fetch, timeout=remaining_time())
@@ -0,0 +1,81 @@
+from datetime import datetime
+import uuid
+from flask import current_app
+from app.models.chat import Chat
+from app.utils.metrics import stage_timer, timed_stage
+from app.utils.context_window import build_context
+from app.utils.model_graph import MODEL_ID, graph_input_for_thread, invoke_graph
+from app.utils.resilience import deadline_scope
+from app.utils.response_cache import response_cache
+
+
+@timed_stage('chat_load')
+def get_chat_session(user_id, context_id=None):
+    """Return (chat_session, context_id), or (None, context_id) for an unknown context"""
+    if context_id:
+        return Chat.load_for_turn(context_id, user_id), context_id
+
+    context_id = str(uuid.uuid4())
+    chat_session = Chat(
+        user_id=user_id,
+        context_id=context_id,
+        storage=current_app.config['CHAT_MESSAGE_STORE']
+    )
+    chat_session.ttl = datetime.utcnow() + Chat.TTL
+    chat_session.save()
+    return chat_session, context_id
+
+
+@timed_stage('context')
+def prepare_graph_input(chat_session, user_message):
+    """Return (graph_input, thread_id) for a new user message"""
+    if not current_app.config['CHAT_CHECKPOINTER']:
+        return {'messages': build_context(chat_session, [user_message], current_app.config)}, None
+
+    graph_input = graph_input_for_thread(
+        chat_session.context_id,
+        [user_message],
+        lambda: build_context(chat_session, [user_message], current_app.config)
+    )
+    return graph_input, chat_session.context_id
+
+
+def cached_response(data):
+    """Return (cacheable, response) for a request; only opening messages are cached"""
+    cacheable = response_cache.enabled and not data.get('context_id')
+    return cacheable, response_cache.get(data['message'], MODEL_ID) if cacheable else None
+
+
+def run_chat_turn(chat_session, data, turn_id=None):
+    """Answer ``data['message']`` in ``chat_session`` and record the turn; returns the answer.
+
+    A turn with a ``turn_id`` that was already recorded is not recorded again.
+    """
+    user_message = {
+        'role': 'user',
+        'content': data['message']
+    }
+    cacheable, ai_response = cached_response(data)
+
+    # response = current_app.huggingface_client.chat_completion(
+    #     graph_input['messages'],
+    #     max_tokens=1000,
+    #     model="meta-llama/Llama-3.1-8B-Instruct",
+    #     stream=False
+    # )
+    # ai_response = response.choices[0].message.content
+
+    if ai_response is None:
+        with deadline_scope(current_app.config['CHAT_DEADLINE_SECONDS']):
+            graph_input, thread_id = prepare_graph_input(chat_session, user_message)
+            resp = invoke_graph(graph_input, thread_id)
+        ai_response = resp["messages"][-1].content
+        if cacheable and ai_response:
+            response_cache.set(data['message'], MODEL_ID, ai_response)
+
+    with stage_timer('chat_save'):
+        chat_session.append_messages([user_message, {
+            'role': 'assistant',
+            'content': ai_response
+        }], turn_id=turn_id)
+    return ai_response
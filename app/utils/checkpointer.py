@@ -0,0 +1,290 @@
+from collections import OrderedDict
+from datetime import datetime, timedelta
+import threading
+import time
+from typing import Any, Iterator, Optional, Sequence
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+)
+from pymongo import UpdateOne
+
+from app.models.checkpoint import CheckpointBlob, CheckpointMessage, CheckpointRecord, CheckpointWrite
+
+MESSAGES_CHANNEL = 'messages'
+
+
+class MongoCheckpointSaver(BaseCheckpointSaver):
+    """LangGraph checkpoint saver on the app's MongoEngine connection.
+
+    Threads are keyed by chat ``context_id``. Each step stores a small
+    checkpoint record plus blobs only for the channels whose version changed,
+    serialized with the saver's msgpack (ormsgpack) serde. Everything expires
+    ``ttl`` after it was last written, in line with the chats themselves.
+
+    The ``messages`` channel is stored one document per message by position,
+    so a step writes only the messages it added instead of the whole
+    conversation. Older checkpoints of a thread therefore read the current
+    message at each position, which only differs if history was rewritten.
+    """
+
+    def __init__(self, ttl: timedelta = timedelta(days=2), cache_size: int = 10000):
+        super().__init__()
+        self.ttl = ttl
+        self.cache_size = cache_size
+        # (thread_id, checkpoint_ns) -> (ids of the stored messages, last TTL refresh)
+        self._stored = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _ids(config: RunnableConfig):
+        configurable = config['configurable']
+        return (
+            configurable['thread_id'],
+            configurable.get('checkpoint_ns', ''),
+            configurable.get('checkpoint_id')
+        )
+
+    def _expires_at(self):
+        return datetime.utcnow() + self.ttl
+
+    def _stored_messages(self, thread_id, checkpoint_ns):
+        with self._lock:
+            stored = self._stored.get((thread_id, checkpoint_ns))
+        if stored is not None:
+            return stored
+        docs = CheckpointMessage._get_collection().find(
+            {'thread_id': thread_id, 'checkpoint_ns': checkpoint_ns},
+            {'position': 1, 'message_id': 1}
+        ).sort('position', 1)
+        return [doc['message_id'] for doc in docs], 0
+
+    def _remember_messages(self, thread_id, checkpoint_ns, ids, refreshed_at):
+        with self._lock:
+            self._stored[(thread_id, checkpoint_ns)] = (ids, refreshed_at)
+            self._stored.move_to_end((thread_id, checkpoint_ns))
+            while len(self._stored) > self.cache_size:
+                self._stored.popitem(last=False)
+
+    def _put_messages(self, thread_id, checkpoint_ns, messages, expires_at) -> int:
+        """Write the messages after the longest prefix already stored; returns the length"""
+        collection = CheckpointMessage._get_collection()
+        stored_ids, refreshed_at = self._stored_messages(thread_id, checkpoint_ns)
+        ids = [getattr(message, 'id', None) for message in messages]
+
+        start = 0
+        while start < min(len(ids), len(stored_ids)) and ids[start] and ids[start] == stored_ids[start]:
+            start += 1
+
+        ops = []
+        for position in range(start, len(messages)):
+            type_, blob = self.serde.dumps_typed(messages[position])
+            ops.append(UpdateOne(
+                {'thread_id': thread_id, 'checkpoint_ns': checkpoint_ns, 'position': position},
+                {'$set': {'message_id': ids[position], 'type': type_, 'blob': blob, 'expires_at': expires_at}},
+                upsert=True
+            ))
+        if ops:
+            collection.bulk_write(ops, ordered=False)
+        if len(stored_ids) > len(messages):
+            collection.delete_many({
+                'thread_id': thread_id, 'checkpoint_ns': checkpoint_ns, 'position': {'$gte': len(messages)}
+            })
+
+        # Earlier messages are not rewritten, so keep them alive along with the thread
+        now = time.monotonic()
+        if start and now - refreshed_at > self.ttl.total_seconds() / 4:
+            collection.update_many(
+                {'thread_id': thread_id, 'checkpoint_ns': checkpoint_ns, 'position': {'$lt': start}},
+                {'$set': {'expires_at': expires_at}}
+            )
+            refreshed_at = now
+        self._remember_messages(thread_id, checkpoint_ns, ids, refreshed_at)
+        return len(messages)
+
+    def _load_messages(self, thread_id, checkpoint_ns, length) -> list:
+        docs = CheckpointMessage._get_collection().find(
+            {'thread_id': thread_id, 'checkpoint_ns': checkpoint_ns, 'position': {'$lt': length}}
+        ).sort('position', 1)
+        return [self.serde.loads_typed((doc['type'], doc['blob'])) for doc in docs]
+
+    def _load_tuple(self, doc) -> CheckpointTuple:
+        thread_id, checkpoint_ns, checkpoint_id = doc['thread_id'], doc['checkpoint_ns'], doc['checkpoint_id']
+        checkpoint = self.serde.loads_typed((doc['checkpoint_type'], doc['checkpoint']))
+
+        versions = checkpoint['channel_versions']
+        channel_values = {}
+        if versions:
+            blobs = CheckpointBlob._get_collection().find({
+                'thread_id': thread_id,
+                'checkpoint_ns': checkpoint_ns,
+                '$or': [
+                    {'channel': channel, 'version': str(version)}
+                    for channel, version in versions.items()
+                ]
+            })
+            for blob in blobs:
+                if blob['type'] == 'messages':
+                    channel_values[blob['channel']] = self._load_messages(thread_id, checkpoint_ns, blob['length'])
+                elif blob['type'] != 'empty':
+                    channel_values[blob['channel']] = self.serde.loads_typed((blob['type'], blob['blob']))
+
+        writes = CheckpointWrite._get_collection().find({
+            'thread_id': thread_id,
+            'checkpoint_ns': checkpoint_ns,
+            'checkpoint_id': checkpoint_id
+        }).sort([('task_id', 1), ('idx', 1)])
+
+        parent_id = doc.get('parent_checkpoint_id')
+        return CheckpointTuple(
+            config={'configurable': {
+                'thread_id': thread_id,
+                'checkpoint_ns': checkpoint_ns,
+                'checkpoint_id': checkpoint_id
+            }},
+            checkpoint={**checkpoint, 'channel_values': channel_values},
+            metadata=self.serde.loads_typed((doc['metadata_type'], doc['metadata'])),
+            parent_config={'configurable': {
+                'thread_id': thread_id,
+                'checkpoint_ns': checkpoint_ns,
+                'checkpoint_id': parent_id
+            }} if parent_id else None,
+            pending_writes=[
+                (write['task_id'], write['channel'], self.serde.loads_typed((write['type'], write['blob'])))
+                for write in writes
+            ]
+        )
+
+    def get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        thread_id, checkpoint_ns, checkpoint_id = self._ids(config)
+        query = {'thread_id': thread_id, 'checkpoint_ns': checkpoint_ns}
+        if checkpoint_id:
+            query['checkpoint_id'] = checkpoint_id
+        doc = CheckpointRecord._get_collection().find_one(query, sort=[('checkpoint_id', -1)])
+        return self._load_tuple(doc) if doc else None
+
+    def list(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> Iterator[CheckpointTuple]:
+        query = {}
+        if config:
+            thread_id, checkpoint_ns, checkpoint_id = self._ids(config)
+            query['thread_id'] = thread_id
+            if 'checkpoint_ns' in config['configurable']:
+                query['checkpoint_ns'] = checkpoint_ns
+            if checkpoint_id:
+                query['checkpoint_id'] = checkpoint_id
+        if before:
+            query['checkpoint_id'] = {'$lt': before['configurable']['checkpoint_id']}
+
+        returned = 0
+        for doc in CheckpointRecord._get_collection().find(query).sort('checkpoint_id', -1):
+            checkpoint_tuple = self._load_tuple(doc)
+            if filter and not all(checkpoint_tuple.metadata.get(k) == v for k, v in filter.items()):
+                continue
+            yield checkpoint_tuple
+            returned += 1
+            if limit is not None and returned >= limit:
+                return
+
+    def put(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        thread_id, checkpoint_ns, parent_id = self._ids(config)
+        expires_at = self._expires_at()
+        checkpoint = checkpoint.copy()
+        values = checkpoint.pop('channel_values')
+
+        # Only channels updated in this step get a new blob
+        blob_ops = []
+        for channel, version in new_versions.items():
+            fields = {'expires_at': expires_at}
+            if channel == MESSAGES_CHANNEL and isinstance(values.get(channel), list):
+                fields.update(type='messages', blob=None, length=self._put_messages(
+                    thread_id, checkpoint_ns, values[channel], expires_at))
+            else:
+                type_, blob = self.serde.dumps_typed(values[channel]) if channel in values else ('empty', None)
+                fields.update(type=type_, blob=blob)
+            blob_ops.append(UpdateOne(
+                {'thread_id': thread_id, 'checkpoint_ns': checkpoint_ns,
+                 'channel': channel, 'version': str(version)},
+                {'$set': fields},
+                upsert=True
+            ))
+        if blob_ops:
+            CheckpointBlob._get_collection().bulk_write(blob_ops, ordered=False)
+
+        checkpoint_type, checkpoint_blob = self.serde.dumps_typed({**checkpoint, 'channel_values': {}})
+        metadata_type, metadata_blob = self.serde.dumps_typed(metadata)
+        CheckpointRecord._get_collection().update_one(
+            {'thread_id': thread_id, 'checkpoint_ns': checkpoint_ns, 'checkpoint_id': checkpoint['id']},
+            {'$set': {
+                'parent_checkpoint_id': parent_id,
+                'checkpoint_type': checkpoint_type,
+                'checkpoint': checkpoint_blob,
+                'metadata_type': metadata_type,
+                'metadata': metadata_blob,
+                'expires_at': expires_at
+            }},
+            upsert=True
+        )
+
+        return {'configurable': {
+            'thread_id': thread_id,
+            'checkpoint_ns': checkpoint_ns,
+            'checkpoint_id': checkpoint['id']
+        }}
+
+    def put_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[tuple[str, Any]],
+        task_id: str,
+        task_path: str = '',
+    ) -> None:
+        thread_id, checkpoint_ns, checkpoint_id = self._ids(config)
+        expires_at = self._expires_at()
+        ops = []
+        for idx, (channel, value) in enumerate(writes):
+            type_, blob = self.serde.dumps_typed(value)
+            fields = {
+                'task_path': task_path, 'channel': channel,
+                'type': type_, 'blob': blob, 'expires_at': expires_at
+            }
+            # Special channels (errors, interrupts) are overwritten, regular
+            # writes are kept from their first attempt
+            ops.append(UpdateOne(
+                {'thread_id': thread_id, 'checkpoint_ns': checkpoint_ns, 'checkpoint_id': checkpoint_id,
+                 'task_id': task_id, 'idx': WRITES_IDX_MAP.get(channel, idx)},
+                {'$set': fields} if channel in WRITES_IDX_MAP else {'$setOnInsert': fields},
+                upsert=True
+            ))
+        if ops:
+            CheckpointWrite._get_collection().bulk_write(ops, ordered=False)
+
+    def delete_thread(self, thread_id: str) -> None:
+        with self._lock:
+            for key in [key for key in self._stored if key[0] == thread_id]:
+                del self._stored[key]
+        for document in (CheckpointRecord, CheckpointBlob, CheckpointWrite, CheckpointMessage):
+            document._get_collection().delete_many({'thread_id': thread_id})
+
+    @staticmethod
+    def delete_threads(thread_ids: list) -> None:
+        for document in (CheckpointRecord, CheckpointBlob, CheckpointWrite, CheckpointMessage):
+            document._get_collection().delete_many({'thread_id': {'$in': thread_ids}})
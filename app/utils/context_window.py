@@ -0,0 +1,46 @@
+from app.utils.logger import get_logger
+from app.utils.model_graph import summarize_messages
+from app.utils.tokens import count_tokens
+
+logger = get_logger(__name__)
+
+
+def build_context(chat_session, new_messages: list, config) -> list:
+    """Return the messages to send to the model for this turn.
+
+    The most recent messages are kept verbatim while they fit in
+    CONTEXT_TOKEN_BUDGET. Once the history outgrows it, the oldest messages
+    are folded into the summary stored on the chat until the rest fits in
+    CONTEXT_RECENT_TOKENS, so summarizing only happens every few turns and
+    never re-reads messages that were already summarized.
+    """
+    tokenizer_name = config['CONTEXT_TOKENIZER']
+    pending = chat_session.load_messages(start=chat_session.summarized_count) + new_messages
+    sizes = [count_tokens(message['content'], tokenizer_name) for message in pending]
+
+    if sum(sizes) > config['CONTEXT_TOKEN_BUDGET']:
+        # Keep at least the new messages, then as many recent ones as fit
+        keep_from = len(pending) - len(new_messages)
+        total = sum(sizes[keep_from:])
+        while keep_from > 0 and total + sizes[keep_from - 1] <= config['CONTEXT_RECENT_TOKENS']:
+            keep_from -= 1
+            total += sizes[keep_from]
+
+        if keep_from > 0:
+            logger.debug(f'Summarizing {keep_from} messages of chat {chat_session.context_id}')
+            try:
+                summary = summarize_messages(chat_session.summary, pending[:keep_from])
+                chat_session.update_summary(summary, chat_session.summarized_count + keep_from)
+                if config['ARCHIVE_ENABLED']:
+                    chat_session.archive_messages()
+            except Exception as e:
+                # Answer with the recent messages now and summarize on a later turn
+                logger.warning(f'Summarizing chat {chat_session.context_id} failed: {str(e)}')
+            pending = pending[keep_from:]
+
+    if not chat_session.summary:
+        return pending
+    return [{
+        'role': 'system',
+        'content': f'Summary of the earlier conversation:\n{chat_session.summary}'
+    }] + pending
@@ -1,26 +1,27 @@
 from flask import current_app, request
-from flask_mail import Message, Mail
+from flask_mail import Mail
 
 mail = Mail()
 
-def send_reset_password_email(email, token):
-    msg = Message(
-        'Password Reset Request',
+def queue_email(recipients, subject, body):
+    """Store the email in the outbox; the background sender delivers it"""
+    from app.models.outbox_email import OutboxEmail
+    from app.utils.email_outbox import email_sender
+
+    OutboxEmail.enqueue(
+        subject=subject,
         sender=current_app.config['MAIL_USERNAME'],
-        recipients=[email]
+        recipients=recipients,
+        body=body
     )
-    msg.body = f'''To reset your password, visit the following link:
+    email_sender.notify()
+
+def send_reset_password_email(email, token):
+    queue_email([email], 'Password Reset Request', f'''To reset your password, visit the following link:
     {current_app.config['WEB_CLIENT_URL']}reset-password?token={token}
 
     If you did not make this request, please ignore this email.
-    '''
-    mail.send(msg)
+    ''')
 
 def send_email(email, subject, body):
-    msg = Message(
-        subject,
-        sender=current_app.config['MAIL_USERNAME'],
-        recipients=[email]
-    )
-    msg.body = body
-    mail.send(msg)
\ No newline at end of file
+    queue_email([email], subject, body)
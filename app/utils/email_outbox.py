@@ -0,0 +1,118 @@
+import threading
+from flask_mail import Message
+from app.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class EmailSender:
+    """Background thread delivering the email_outbox collection over SMTP.
+
+    Each batch is sent over one SMTP connection. A failed email is retried
+    with exponential backoff and dead-lettered after EMAIL_MAX_ATTEMPTS.
+    Emails are claimed with a lease, so several senders (e.g. one per
+    gunicorn worker) can drain the same outbox.
+    """
+
+    def __init__(self):
+        self._thread = None
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+
+    def start(self, app):
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, args=(app,), name='email-sender', daemon=True)
+            self._thread.start()
+        logger.info('Started email sender')
+
+    def start_outside_gunicorn(self):
+        """before_request hook: gunicorn workers start the sender in
+        post_worker_init, other servers (flask run) with their first request"""
+        from flask import current_app, request
+
+        if self._thread is None and not request.environ.get('SERVER_SOFTWARE', '').startswith('gunicorn'):
+            self.start(current_app._get_current_object())
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self._thread = None
+
+    def notify(self) -> None:
+        """Skip the rest of the poll interval, e.g. right after an enqueue"""
+        self._wake.set()
+
+    def _run(self, app):
+        poll_interval = app.config['EMAIL_POLL_INTERVAL']
+        while not self._stop.is_set():
+            # Cleared before the batch, so an email enqueued while it is
+            # being sent wakes the next wait instead of being missed
+            self._wake.clear()
+            try:
+                with app.app_context():
+                    sent = self.send_batch()
+            except Exception as e:
+                logger.error(f'Email sender error: {str(e)}')
+                sent = 0
+            if not sent:
+                self._wake.wait(poll_interval)
+
+    @staticmethod
+    def backoff(attempts: int, base: float, cap: float) -> float:
+        return min(cap, base * 2 ** (attempts - 1))
+
+    def send_batch(self) -> int:
+        """Deliver one batch of due emails; returns how many were claimed"""
+        from flask import current_app
+        from app.models.outbox_email import OutboxEmail
+        from app.utils.email import mail
+
+        config = current_app.config
+        batch = OutboxEmail.claim_batch(config['EMAIL_BATCH_SIZE'], config['EMAIL_LEASE_SECONDS'])
+        if not batch:
+            return 0
+
+        def failed(email, error):
+            if email.attempts >= config['EMAIL_MAX_ATTEMPTS']:
+                logger.error(f'Email {email.id} dead-lettered after {email.attempts} attempts: {error}')
+                email.dead_letter(error)
+            else:
+                delay = self.backoff(email.attempts, config['EMAIL_BACKOFF_BASE'], config['EMAIL_BACKOFF_MAX'])
+                logger.warning(f'Email {email.id} failed, retrying in {delay:.0f}s: {error}')
+                email.retry_later(error, delay)
+
+        remaining = list(batch)
+        try:
+            with mail.connect() as connection:
+                while remaining:
+                    email = remaining[0]
+                    try:
+                        connection.send(Message(
+                            email.subject,
+                            sender=email.sender,
+                            recipients=email.recipients,
+                            body=email.body
+                        ))
+                    except Exception as e:
+                        failed(email, str(e))
+                    else:
+                        email.mark_sent(config['EMAIL_SENT_TTL'])
+                    remaining.pop(0)
+        except Exception as e:
+            # Connecting failed or the connection dropped: the rest of the
+            # batch is retried later
+            logger.error(f'SMTP connection failed: {str(e)}')
+            for email in remaining:
+                failed(email, str(e))
+
+        logger.info(f'Processed {len(batch) - len(remaining)} of {len(batch)} outbox emails')
+        return len(batch)
+
+
+email_sender = EmailSender()
@@ -0,0 +1,173 @@
+"""Google sign-in: local ID-token verification with a userinfo fallback"""
+import re
+import threading
+import time
+import jwt
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from app.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+GOOGLE_ISSUERS = ('accounts.google.com', 'https://accounts.google.com')
+
+
+class InvalidGoogleToken(Exception):
+    pass
+
+
+def build_http_session(pool_size: int, retries: int = 2) -> requests.Session:
+    """Session that keeps connections to Google open between logins and
+    retries idempotent requests on connection errors and 5xx responses"""
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=pool_size,
+        pool_maxsize=pool_size,
+        max_retries=Retry(total=retries, backoff_factor=0.2, status_forcelist=(500, 502, 503, 504),
+                          allowed_methods=('GET',))
+    )
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+class JwksCache:
+    """Signing keys from a JWKS endpoint, refreshed in the background.
+
+    Keys are kept for the response's Cache-Control max-age (clamped to
+    [min_ttl, max_ttl]) and refreshed shortly before they expire. An unknown
+    key ID forces a refresh, at most once per min_ttl, so a key rotation is
+    picked up without letting bad tokens hammer the endpoint.
+    """
+
+    def __init__(self, url: str, session: requests.Session, timeout: float,
+                 min_ttl: float = 60, max_ttl: float = 86400):
+        self.url = url
+        self.session = session
+        self.timeout = timeout
+        self.min_ttl = min_ttl
+        self.max_ttl = max_ttl
+        self._keys = {}
+        self._expires_at = 0
+        self._fetched_at = 0
+        self._lock = threading.Lock()
+        self._refresher = None
+
+    def _max_age(self, response) -> float:
+        match = re.search(r'max-age=(\d+)', response.headers.get('Cache-Control', ''))
+        max_age = int(match.group(1)) if match else self.min_ttl
+        return min(max(max_age, self.min_ttl), self.max_ttl)
+
+    def refresh(self) -> None:
+        response = self.session.get(self.url, timeout=self.timeout)
+        response.raise_for_status()
+        keys = {}
+        for jwk in response.json().get('keys', []):
+            try:
+                keys[jwk['kid']] = jwt.PyJWK(jwk).key
+            except (KeyError, jwt.PyJWKError) as e:
+                logger.warning(f'Skipping unusable JWKS key: {str(e)}')
+        now = time.monotonic()
+        with self._lock:
+            self._keys = keys
+            self._fetched_at = now
+            self._expires_at = now + self._max_age(response)
+        logger.debug(f'Loaded {len(keys)} signing keys from {self.url}')
+
+    def _refresh_loop(self):
+        while True:
+            # Refresh at 90% of the lifetime, so requests never wait on it
+            delay = max(self.min_ttl / 2, (self._expires_at - time.monotonic()) * 0.9)
+            time.sleep(delay)
+            try:
+                self.refresh()
+            except Exception as e:
+                logger.warning(f'Background JWKS refresh failed: {str(e)}')
+
+    def _start_refresher(self):
+        with self._lock:
+            if self._refresher is None or not self._refresher.is_alive():
+                self._refresher = threading.Thread(target=self._refresh_loop, name='jwks-refresh', daemon=True)
+                self._refresher.start()
+
+    def get_key(self, kid: str):
+        now = time.monotonic()
+        if now >= self._expires_at or (kid not in self._keys and now - self._fetched_at >= self.min_ttl):
+            self.refresh()
+        self._start_refresher()
+        key = self._keys.get(kid)
+        if key is None:
+            raise InvalidGoogleToken(f'Unknown signing key {kid}')
+        return key
+
+
+class GoogleAuth:
+    """Resolves a Google token sent by the web client to the user's identity.
+
+    ID tokens (JWTs) are verified locally against Google's cached signing
+    keys. Anything else is treated as an access token and sent to the
+    userinfo endpoint over a pooled session with a timeout.
+    """
+
+    def __init__(self, app=None):
+        self.client_id = None
+        self.session = None
+        self.jwks = None
+        self.timeout = None
+        self.userinfo_url = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.client_id = app.config['OAUTH_CREDENTIALS']['google']['client_id']
+        self.timeout = app.config['GOOGLE_HTTP_TIMEOUT']
+        self.userinfo_url = app.config['GOOGLE_USERINFO_URL']
+        self.session = build_http_session(app.config['GOOGLE_HTTP_POOL_SIZE'])
+        self.jwks = JwksCache(app.config['GOOGLE_JWKS_URL'], self.session, self.timeout)
+        app.extensions['google_auth'] = self
+
+    @staticmethod
+    def is_id_token(token: str) -> bool:
+        return token.count('.') == 2
+
+    def verify_id_token(self, token: str) -> dict:
+        try:
+            header = jwt.get_unverified_header(token)
+            claims = jwt.decode(
+                token,
+                self.jwks.get_key(header.get('kid')),
+                algorithms=['RS256'],
+                audience=self.client_id,
+                issuer=GOOGLE_ISSUERS,
+                leeway=30,
+                options={'require': ['exp', 'iat', 'sub', 'email']}
+            )
+        except jwt.PyJWTError as e:
+            raise InvalidGoogleToken(str(e))
+        if claims.get('email_verified') is False:
+            raise InvalidGoogleToken('Email address is not verified')
+        return claims
+
+    def fetch_userinfo(self, access_token: str) -> dict:
+        response = self.session.get(
+            self.userinfo_url,
+            headers={'Authorization': f'Bearer {access_token}'},
+            timeout=self.timeout
+        )
+        if response.status_code != 200:
+            raise InvalidGoogleToken(f'userinfo returned {response.status_code}')
+        return response.json()
+
+    def identify(self, token: str) -> dict:
+        """Claims for the token's user (sub, email, given_name, family_name).
+
+        Raises InvalidGoogleToken for bad tokens and requests.RequestException
+        when Google can't be reached.
+        """
+        if self.is_id_token(token):
+            return self.verify_id_token(token)
+        return self.fetch_userinfo(token)
+
+
+google_auth = GoogleAuth()
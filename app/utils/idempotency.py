@@ -0,0 +1,118 @@
+from functools import wraps
+import hashlib
+import time
+import uuid
+from flask import current_app, jsonify, make_response, request
+from flask_jwt_extended import get_jwt_identity
+from app.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+MAX_KEY_LENGTH = 255
+# Headers worth replaying along with a stored response
+REPLAY_HEADERS = ('Content-Type', 'X-RateLimit-Limit', 'X-RateLimit-Remaining')
+
+
+def request_fingerprint() -> str:
+    """Identifies the request a key was first used with, so a reused key with a
+    different body is rejected instead of replaying an unrelated answer"""
+    digest = hashlib.sha256()
+    digest.update(request.method.encode())
+    digest.update(request.path.encode())
+    digest.update(request.get_data())
+    return digest.hexdigest()
+
+
+def _replay(record):
+    response = make_response(record.body, record.status_code)
+    # Replace make_response's defaults (text/html) rather than adding to them
+    for name, value in (record.headers or {}).items():
+        response.headers[name] = value
+    response.headers['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def _wait_for(record, max_wait: float):
+    """Poll an in-flight request until it completes, is abandoned or the wait runs out"""
+    give_up_at = time.monotonic() + max_wait
+    interval = 0.1
+    while time.monotonic() < give_up_at:
+        time.sleep(min(interval, max(0, give_up_at - time.monotonic())))
+        interval = min(interval * 2, 1)
+        record = type(record).objects(pk=record.pk).first()
+        if record is None or record.completed:
+            return record
+    return record
+
+
+def idempotent(f):
+    """Deduplicate retries of a request sent with an Idempotency-Key header.
+
+    Place it outside admission_control and check_request_quota so that a
+    retry is neither charged nor run again. Successful responses are stored
+    and replayed; a duplicate of a request still in flight waits for it.
+    Failed requests release the key, so the client can retry them.
+    """
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        from app.models.idempotency_record import IdempotencyRecord
+
+        key = request.headers.get('Idempotency-Key')
+        if not key:
+            return f(*args, **kwargs)
+        if len(key) > MAX_KEY_LENGTH:
+            return jsonify({'error': f'Idempotency-Key must be at most {MAX_KEY_LENGTH} characters'}), 400
+
+        config = current_app.config
+        user_id = get_jwt_identity()
+        fingerprint = request_fingerprint()
+        record, owned = IdempotencyRecord.begin(
+            user_id,
+            key,
+            fingerprint,
+            owner=uuid.uuid4().hex,
+            lease_seconds=config['CHAT_DEADLINE_SECONDS'] + 30,
+            ttl=config['IDEMPOTENCY_TTL']
+        )
+
+        if not owned:
+            if record is None:
+                # The original failed and released the key in between
+                return decorated_function(*args, **kwargs)
+            if record.fingerprint != fingerprint:
+                return jsonify({'error': 'Idempotency-Key was already used with a different request'}), 422
+            if not record.completed:
+                logger.info(f'Waiting for in-flight request with the same idempotency key for user {user_id}')
+                record = _wait_for(record, config['IDEMPOTENCY_MAX_WAIT'])
+                if record is None:
+                    return decorated_function(*args, **kwargs)
+                if not record.completed:
+                    response = make_response(jsonify({
+                        'error': 'A request with this Idempotency-Key is still in progress',
+                        'success': False
+                    }), 409)
+                    response.headers['Retry-After'] = '1'
+                    return response
+            return _replay(record)
+
+        try:
+            response = make_response(f(*args, **kwargs))
+        except Exception:
+            record.abandon()
+            raise
+
+        try:
+            if response.status_code < 400 and not response.is_streamed:
+                record.complete(
+                    response.status_code,
+                    response.get_data(as_text=True),
+                    {name: response.headers[name] for name in REPLAY_HEADERS if name in response.headers}
+                )
+            else:
+                record.abandon()
+        except Exception as e:
+            # The response is still delivered; a retry just won't be deduplicated
+            logger.warning(f'Failed to store idempotent response for user {user_id}: {str(e)}')
+        return response
+
+    return decorated_function
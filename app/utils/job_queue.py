@@ -0,0 +1,100 @@
+import threading
+from app.utils.logger import correlation_scope, get_logger
+
+logger = get_logger(__name__)
+
+
+class JobWorkerPool:
+    """Bounded pool of threads running queued chat jobs from the chat_jobs collection.
+
+    Jobs are claimed with a lease slightly longer than the chat deadline. If a
+    worker dies mid-run the lease lapses and another worker picks the job up,
+    up to JOB_MAX_ATTEMPTS times.
+    """
+
+    def __init__(self):
+        self._threads = []
+        self._stop = threading.Event()
+
+    def start(self, app, workers=None):
+        workers = app.config['JOB_WORKERS'] if workers is None else workers
+        self._stop.clear()
+        for index in range(workers):
+            thread = threading.Thread(
+                target=self._run, args=(app,), name=f'chat-job-worker-{index}', daemon=True
+            )
+            thread.start()
+            self._threads.append(thread)
+        logger.info(f'Started {workers} chat job workers')
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def _run(self, app):
+        from app.models.chat_job import ChatJob
+        from app.utils.admission import AdmissionRejected, admission
+
+        lease = app.config['CHAT_DEADLINE_SECONDS'] + 30
+        poll_interval = app.config['JOB_POLL_INTERVAL']
+        while not self._stop.is_set():
+            try:
+                with app.app_context():
+                    # Jobs share the LLM concurrency cap with interactive
+                    # requests, so only take a slot when there is a job to run
+                    if not ChatJob.any_runnable():
+                        self._stop.wait(poll_interval)
+                        continue
+                    release = admission.acquire(timeout=poll_interval)
+                    try:
+                        # Another worker may have claimed the job meanwhile
+                        job = ChatJob.claim(lease)
+                        if job is None:
+                            continue
+                        with correlation_scope(f'job-{job.id}'):
+                            self.process(job)
+                    finally:
+                        release()
+            except AdmissionRejected:
+                continue
+            except Exception as e:
+                logger.error(f'Chat job worker error: {str(e)}')
+                self._stop.wait(poll_interval)
+
+    def process(self, job):
+        from flask import current_app
+        from app.utils.chat_service import get_chat_session, run_chat_turn
+        from app.utils.rate_limit import rate_limiter
+        from app.utils.resilience import status_for_error
+
+        config = current_app.config
+        if job.attempts > config['JOB_MAX_ATTEMPTS']:
+            logger.warning(f'Chat job {job.id} abandoned after {job.attempts - 1} attempts')
+            if job.fail('Job abandoned after repeated worker failures', 500, config['JOB_RESULT_TTL']):
+                rate_limiter.refund(job.user_id, job.request_limit)
+            return
+
+        try:
+            chat_session, _ = get_chat_session(job.user_id, job.context_id)
+            if not chat_session:
+                job.fail('Invalid context ID', 404, config['JOB_RESULT_TTL'])
+                return
+            # If this job's lease lapsed and another worker re-ran it, only
+            # the first run to finish records the turn
+            ai_response = run_chat_turn(chat_session, {
+                'message': job.message,
+                # Opening messages stay eligible for the response cache
+                'context_id': None if job.new_conversation else job.context_id
+            }, turn_id=str(job.id))
+            job.succeed(ai_response, config['JOB_RESULT_TTL'])
+        except Exception as e:
+            logger.error(f'Chat job {job.id} failed: {str(e)}')
+            # Refund only if this worker still held the job, so a job whose
+            # lease lapsed and was re-run is refunded once
+            if job.fail(str(e), status_for_error(e), config['JOB_RESULT_TTL']):
+                rate_limiter.refund(job.user_id, job.request_limit)
+
+
+job_workers = JobWorkerPool()
@@ -1,32 +1,119 @@
+import atexit
+import contextvars
 import logging
-from logging.handlers import RotatingFileHandler
+from logging.handlers import QueueHandler, QueueListener, WatchedFileHandler
 import os
+import queue
+import random
+import re
+import threading
+import uuid
+from contextlib import contextmanager
 from typing import Optional
-from flask import Flask
+from flask import Flask, g, request
+import orjson
 
 class LogConfig:
     """Logging configuration loaded from environment variables"""
-    LOG_LEVEL = os.getenv('LOG_LEVEL', 'DEBUG')
-    LOG_FORMAT = os.getenv('LOG_FORMAT', 
-        '%(asctime)s - %(name)s - %(levelname)s - [%(filename)s:%(lineno)d] - %(message)s'
+    LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
+    LOG_FORMAT = os.getenv('LOG_FORMAT',
+        '%(asctime)s - %(name)s - %(levelname)s - [%(correlation_id)s] - [%(filename)s:%(lineno)d] - %(message)s'
     )
+    # Each gunicorn worker appends to this file; rotate it with logrotate
     LOG_FILE = os.getenv('LOG_FILE', 'logs/app.log')
-    LOG_MAX_BYTES = int(os.getenv('LOG_MAX_BYTES', 10240000))  # 10MB default
-    LOG_BACKUP_COUNT = int(os.getenv('LOG_BACKUP_COUNT', 5))
-    
+
     # New configuration options for logging destination
     LOG_TO_CONSOLE = os.getenv('LOG_TO_CONSOLE', 'True').lower() == 'true'
     LOG_TO_FILE = os.getenv('LOG_TO_FILE', 'True').lower() == 'true'
-    
+
+    # One JSON object per line instead of LOG_FORMAT
+    LOG_JSON = os.getenv('LOG_JSON', 'False').lower() == 'true'
+    # Fraction of DEBUG records kept; INFO and above are never sampled
+    LOG_DEBUG_SAMPLE_RATE = float(os.getenv('LOG_DEBUG_SAMPLE_RATE', 1.0))
+    # Records waiting for the writer thread; beyond this they are dropped
+    # rather than blocking the request
+    LOG_QUEUE_SIZE = int(os.getenv('LOG_QUEUE_SIZE', 10000))
+
     @classmethod
     def get_log_level(cls) -> int:
         """Convert string log level to logging constant"""
         return getattr(logging, cls.LOG_LEVEL.upper())
 
+
+correlation_id = contextvars.ContextVar('correlation_id', default=None)
+
+# Client-supplied IDs end up in log lines and a response header
+REQUEST_ID_PATTERN = re.compile(r'[A-Za-z0-9._-]{1,64}')
+
+
+@contextmanager
+def correlation_scope(value: Optional[str] = None):
+    """Tag every record logged in this block with a correlation ID"""
+    token = correlation_id.set(value or uuid.uuid4().hex)
+    try:
+        yield correlation_id.get()
+    finally:
+        correlation_id.reset(token)
+
+
+class ContextFilter(logging.Filter):
+    """Adds the correlation ID and samples DEBUG records"""
+
+    def __init__(self, debug_sample_rate: float = 1.0):
+        super().__init__()
+        self.debug_sample_rate = debug_sample_rate
+
+    def filter(self, record):
+        if record.levelno <= logging.DEBUG and self.debug_sample_rate < 1 \
+                and random.random() >= self.debug_sample_rate:
+            return False
+        record.correlation_id = correlation_id.get() or '-'
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            'time': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'correlation_id': getattr(record, 'correlation_id', '-'),
+            'file': record.filename,
+            'line': record.lineno
+        }
+        if record.exc_text:
+            entry['exception'] = record.exc_text
+        return orjson.dumps(entry, default=str).decode()
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """Hands records to the writer thread without formatting them or waiting"""
+
+    dropped = 0
+
+    def prepare(self, record):
+        # Only resolve what can't safely cross threads; the full format
+        # (timestamp, JSON, ...) is done by the listener
+        record = logging.makeLogRecord(record.__dict__)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            NonBlockingQueueHandler.dropped += 1
+
+
 def create_handlers() -> list:
     """Create and return a list of configured handlers based on environment settings"""
     handlers = []
-    formatter = logging.Formatter(LogConfig.LOG_FORMAT)
+    formatter = JsonFormatter() if LogConfig.LOG_JSON else logging.Formatter(LogConfig.LOG_FORMAT)
 
     # Console handler
     if LogConfig.LOG_TO_CONSOLE:
@@ -39,53 +126,107 @@ def create_handlers() -> list:
     if LogConfig.LOG_TO_FILE:
         # Ensure logs directory exists
         log_dir = os.path.dirname(LogConfig.LOG_FILE)
-        if not os.path.exists(log_dir):
+        if log_dir and not os.path.exists(log_dir):
             os.makedirs(log_dir)
 
-        file_handler = RotatingFileHandler(
-            LogConfig.LOG_FILE,
-            maxBytes=LogConfig.LOG_MAX_BYTES,
-            backupCount=LogConfig.LOG_BACKUP_COUNT,
-            encoding='utf-8'
-        )
+        # Several worker processes write this file, so none of them may
+        # rotate it; each reopens it once logrotate has moved it away
+        file_handler = WatchedFileHandler(LogConfig.LOG_FILE, encoding='utf-8')
         file_handler.setFormatter(formatter)
         file_handler.setLevel(LogConfig.get_log_level())
         handlers.append(file_handler)
 
     return handlers
 
+
+_pipeline_lock = threading.Lock()
+_output_handlers = []
+_queue_handler = None
+_listener = None
+
+
+def _start_listener():
+    global _listener
+    _queue_handler.queue = queue.Queue(LogConfig.LOG_QUEUE_SIZE)
+    _listener = QueueListener(_queue_handler.queue, *_output_handlers, respect_handler_level=True)
+    _listener.start()
+
+
+def _stop_listener():
+    if _listener is not None and _listener._thread is not None:
+        _listener.stop()
+
+
+def get_queue_handler() -> QueueHandler:
+    """The process-wide handler every logger writes to.
+
+    Records go through a bounded queue to one listener thread that owns the
+    console and file handlers, so there is a single handle on the log file
+    and request threads never wait on I/O.
+    """
+    global _queue_handler, _output_handlers
+    with _pipeline_lock:
+        if _queue_handler is None:
+            _output_handlers = create_handlers()
+            if not _output_handlers:
+                raise ValueError("No logging handlers configured. Set either LOG_TO_CONSOLE=True or LOG_TO_FILE=True")
+            _queue_handler = NonBlockingQueueHandler(queue.Queue(LogConfig.LOG_QUEUE_SIZE))
+            _queue_handler.addFilter(ContextFilter(LogConfig.LOG_DEBUG_SAMPLE_RATE))
+            _start_listener()
+            atexit.register(_stop_listener)
+            # The listener thread does not survive a fork (gunicorn workers)
+            os.register_at_fork(after_in_child=_start_listener)
+        return _queue_handler
+
+
+def _attach(logger: logging.Logger) -> None:
+    handler = get_queue_handler()
+    if handler not in logger.handlers:
+        logger.addHandler(handler)
+    logger.setLevel(LogConfig.get_log_level())
+    # Written once by this logger, not again by its ancestors
+    logger.propagate = False
+
+
 def setup_logger(app: Flask) -> None:
     """Configure application logging based on environment settings"""
-    handlers = create_handlers()
-    
-    if not handlers:
-        raise ValueError("No logging handlers configured. Set either LOG_TO_CONSOLE=True or LOG_TO_FILE=True")
-
     # Configure Werkzeug logger (for request/response details)
-    werkzeug_logger = logging.getLogger('werkzeug')
-    werkzeug_logger.setLevel(LogConfig.get_log_level())
-    for handler in handlers:
-        werkzeug_logger.addHandler(handler)
+    _attach(logging.getLogger('werkzeug'))
 
     # Configure MongoDB logger
-    mongo_logger = logging.getLogger('mongodb')
-    mongo_logger.setLevel(LogConfig.get_log_level())
-    for handler in handlers:
-        mongo_logger.addHandler(handler)
+    _attach(logging.getLogger('mongodb'))
 
     # Configure application logger
-    app.logger.setLevel(LogConfig.get_log_level())
-    for handler in handlers:
-        app.logger.addHandler(handler)
+    _attach(app.logger)
+
+    # Correlation ID for every request, taken from the caller if given
+    @app.before_request
+    def set_correlation_id():
+        request_id = request.headers.get('X-Request-ID', '')
+        if not REQUEST_ID_PATTERN.fullmatch(request_id):
+            request_id = uuid.uuid4().hex
+        g.correlation_token = correlation_id.set(request_id)
+
+    @app.after_request
+    def add_correlation_header(response):
+        response.headers['X-Request-ID'] = correlation_id.get() or ''
+        return response
+
+    @app.teardown_request
+    def reset_correlation_id(exc):
+        token = g.pop('correlation_token', None)
+        if token is not None:
+            try:
+                correlation_id.reset(token)
+            except ValueError:
+                # Torn down from another context, e.g. after a streamed response
+                pass
 
 def get_logger(name: Optional[str] = None) -> logging.Logger:
     """Get a configured logger instance for a specific module"""
     logger = logging.getLogger(name or __name__)
-    
+
     if not logger.handlers:  # Only add handler if logger doesn't have one
-        handlers = create_handlers()
-        for handler in handlers:
-            logger.addHandler(handler)
-        logger.setLevel(LogConfig.get_log_level())
-    
-    return logger 
\ No newline at end of file
+        _attach(logger)
+
+    return logger
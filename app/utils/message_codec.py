@@ -0,0 +1,133 @@
+"""zstd codec for archived chat messages.
+
+An archived message keeps its role but stores its content as
+``content_z`` (zstd frame) with ``codec`` and, when compressed with a
+trained dictionary, ``dict_id``. Messages shorter than ARCHIVE_MIN_BYTES
+are left as they are. Decoding is lazy: only reads of the archived part of
+a history (e.g. the messages endpoint) pay for decompression.
+"""
+from collections import OrderedDict
+import threading
+from bson import Binary
+import zstandard
+from app.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+CODEC_ZSTD = 'zstd'
+
+
+class MessageCodec:
+
+    def __init__(self, app=None):
+        self.enabled = False
+        self.level = 9
+        self.min_bytes = 256
+        self._dictionaries = OrderedDict()
+        self._latest_id = None
+        self._latest_loaded = False
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.enabled = app.config['ARCHIVE_ENABLED']
+        self.level = app.config['ARCHIVE_ZSTD_LEVEL']
+        self.min_bytes = app.config['ARCHIVE_MIN_BYTES']
+        app.extensions['message_codec'] = self
+
+    def _dictionary(self, dict_id):
+        """Dictionary by id, loaded from Mongo on first use and kept around"""
+        if dict_id is None:
+            return None
+        with self._lock:
+            if dict_id in self._dictionaries:
+                self._dictionaries.move_to_end(dict_id)
+                return self._dictionaries[dict_id]
+        from app.models.compression_dictionary import CompressionDictionary
+        record = CompressionDictionary.objects(dict_id=dict_id).only('data').first()
+        if record is None:
+            raise LookupError(f'Compression dictionary {dict_id} not found')
+        dictionary = zstandard.ZstdCompressionDict(record.data)
+        with self._lock:
+            self._dictionaries[dict_id] = dictionary
+            while len(self._dictionaries) > 8:
+                self._dictionaries.popitem(last=False)
+        return dictionary
+
+    def latest_dict_id(self):
+        if not self._latest_loaded:
+            from app.models.compression_dictionary import CompressionDictionary
+            latest = CompressionDictionary.latest()
+            self._latest_id = latest.dict_id if latest else None
+            self._latest_loaded = True
+        return self._latest_id
+
+    def use_dictionary(self, dict_id) -> None:
+        """Compress new archives with dict_id (None for no dictionary)"""
+        self._latest_id = dict_id
+        self._latest_loaded = True
+
+    def _compressor(self, dict_id):
+        # zstd (de)compressor objects are not thread-safe; keep one per
+        # thread and dictionary
+        cache = self._local.__dict__.setdefault('compressors', {})
+        key = (dict_id, self.level)
+        if key not in cache:
+            cache[key] = zstandard.ZstdCompressor(level=self.level, dict_data=self._dictionary(dict_id))
+        return cache[key]
+
+    def _decompressor(self, dict_id):
+        cache = self._local.__dict__.setdefault('decompressors', {})
+        if dict_id not in cache:
+            dictionary = self._dictionary(dict_id)
+            cache[dict_id] = zstandard.ZstdDecompressor(dict_data=dictionary) if dictionary else zstandard.ZstdDecompressor()
+        return cache[dict_id]
+
+    @staticmethod
+    def is_encoded(message: dict) -> bool:
+        return 'content_z' in message
+
+    def encode(self, message: dict) -> dict:
+        """Archived form of a message, or the message itself if not worth compressing"""
+        content = message.get('content')
+        if self.is_encoded(message) or not isinstance(content, str):
+            return message
+        raw = content.encode('utf-8')
+        if len(raw) < self.min_bytes:
+            return message
+
+        dict_id = self.latest_dict_id()
+        compressed = self._compressor(dict_id).compress(raw)
+        if len(compressed) >= len(raw):
+            return message
+        encoded = {key: value for key, value in message.items() if key != 'content'}
+        encoded.update(content_z=Binary(compressed), codec=CODEC_ZSTD)
+        if dict_id is not None:
+            encoded['dict_id'] = dict_id
+        return encoded
+
+    def decode(self, message: dict) -> dict:
+        """Plain form of a message that may be archived"""
+        if not self.is_encoded(message):
+            return message
+        if message.get('codec') != CODEC_ZSTD:
+            raise ValueError(f'Unknown message codec {message.get("codec")}')
+        content = self._decompressor(message.get('dict_id')).decompress(bytes(message['content_z']))
+        decoded = {key: value for key, value in message.items() if key not in ('content_z', 'codec', 'dict_id')}
+        decoded['content'] = content.decode('utf-8')
+        return decoded
+
+    def train_dictionary(self, samples: list, size: int):
+        """Train a dictionary on message texts and store it; returns its dict_id"""
+        from app.models.compression_dictionary import CompressionDictionary
+
+        trained = zstandard.train_dictionary(size, [sample.encode('utf-8') for sample in samples])
+        CompressionDictionary(dict_id=trained.dict_id(), data=trained.as_bytes(), samples=len(samples)).save()
+        self.use_dictionary(trained.dict_id())
+        logger.info(f'Trained compression dictionary {trained.dict_id()} on {len(samples)} messages')
+        return trained.dict_id()
+
+
+message_codec = MessageCodec()
@@ -0,0 +1,229 @@
+"""Prometheus metrics for HTTP routes and the stages of a chat turn.
+
+Updating a metric is an in-memory increment, so instrumentation costs
+next to nothing when nobody scrapes /metrics. Cache, admission and job
+figures are only gathered when /metrics is scraped.
+
+With several gunicorn workers set PROMETHEUS_MULTIPROC_DIR to an empty
+directory so /metrics aggregates all of them.
+"""
+from contextlib import contextmanager
+from functools import wraps
+import os
+import time
+from flask import current_app, request, Response, g
+from flask_jwt_extended import verify_jwt_in_request
+from prometheus_client import (
+    CollectorRegistry, Counter, Gauge, Histogram, REGISTRY, CONTENT_TYPE_LATEST, generate_latest
+)
+from prometheus_client.core import GaugeMetricFamily
+from app.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120)
+
+HTTP_REQUESTS = Counter(
+    'http_requests_total', 'HTTP requests by route and status',
+    ['endpoint', 'method', 'status']
+)
+HTTP_LATENCY = Histogram(
+    'http_request_duration_seconds', 'Time to produce the response, by route',
+    ['endpoint', 'method'], buckets=LATENCY_BUCKETS
+)
+HTTP_IN_PROGRESS = Gauge(
+    'http_requests_in_progress', 'Requests being handled, by route',
+    ['endpoint'], multiprocess_mode='livesum'
+)
+STAGE_LATENCY = Histogram(
+    'chat_stage_duration_seconds', 'Time spent in each stage of a chat turn',
+    ['stage'], buckets=LATENCY_BUCKETS
+)
+STAGE_ERRORS = Counter(
+    'chat_stage_errors_total', 'Chat turn stages that raised, by stage',
+    ['stage']
+)
+
+
+@contextmanager
+def stage_timer(stage: str):
+    """Time a block of a chat turn, e.g. ``with stage_timer('llm'):``"""
+    start = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        STAGE_ERRORS.labels(stage).inc()
+        raise
+    finally:
+        STAGE_LATENCY.labels(stage).observe(time.perf_counter() - start)
+
+
+def timed_stage(stage: str):
+    """Decorator form of stage_timer"""
+    def decorator(f):
+        @wraps(f)
+        def wrapper(*args, **kwargs):
+            with stage_timer(stage):
+                return f(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def timed_jwt_required(f):
+    """jwt_required() that records the token check as the 'jwt' stage"""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        with stage_timer('jwt'):
+            verify_jwt_in_request()
+        return f(*args, **kwargs)
+    return decorated_function
+
+
+LOOPBACK_ADDRESSES = ('127.0.0.1', '::1')
+
+
+def is_internal_request() -> bool:
+    """True for a request carrying METRICS_TOKEN as a bearer token or, without a
+    token configured, one made on the loopback interface rather than through
+    the proxy (nginx always sets X-Forwarded-For)"""
+    token = current_app.config['METRICS_TOKEN']
+    if token:
+        return request.headers.get('Authorization') == f'Bearer {token}'
+    return request.remote_addr in LOOPBACK_ADDRESSES and 'X-Forwarded-For' not in request.headers
+
+
+def internal_required(f):
+    """Restrict a view to monitoring, see is_internal_request()"""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if not is_internal_request():
+            return {'message': 'Unauthorized'}, 401
+        return f(*args, **kwargs)
+    return decorated_function
+
+
+class StatsCollector:
+    """Exposes the stats() of caches, admission control and the job queue,
+    computed only at scrape time"""
+
+    # Job stats run several queries on chat_jobs; scrapes closer together
+    # than this reuse the last result
+    JOB_STATS_TTL = 5.0
+
+    def __init__(self):
+        self._job_stats = None
+        self._job_stats_at = 0.0
+
+    def _get_job_stats(self) -> dict:
+        if self._job_stats is None or time.monotonic() - self._job_stats_at > self.JOB_STATS_TTL:
+            from app.models.chat_job import ChatJob
+            self._job_stats = ChatJob.stats()
+            self._job_stats_at = time.monotonic()
+        return self._job_stats
+
+    def describe(self):
+        # Keeps the registry from calling collect() (and querying Mongo) on register
+        return []
+
+    def collect(self):
+        from app.utils.admission import admission
+        from app.utils.logger import NonBlockingQueueHandler
+        from app.utils.model_graph import search_cache_stats
+        from app.utils.response_cache import response_cache
+        from app.utils.user_cache import user_cache
+
+        admission_stats = admission.stats()
+        for name in ('active', 'waiting', 'max_concurrent'):
+            yield GaugeMetricFamily(f'admission_{name}', f'Admission control: {name}', value=admission_stats[name])
+
+        cache = GaugeMetricFamily('cache_entries', 'Entries held in process caches', labels=['cache'])
+        hits = GaugeMetricFamily('cache_hits', 'Process cache hits', labels=['cache'])
+        misses = GaugeMetricFamily('cache_misses', 'Process cache misses', labels=['cache'])
+        caches = (('responses', response_cache.stats()), ('users', user_cache.stats()),
+                  ('search', search_cache_stats()))
+        for name, stats in caches:
+            if stats:
+                cache.add_metric([name], stats.get('size', 0))
+                hits.add_metric([name], stats.get('hits', 0))
+                misses.add_metric([name], stats.get('misses', 0))
+        yield cache
+        yield hits
+        yield misses
+
+        yield GaugeMetricFamily('log_records_dropped', 'Log records dropped because the queue was full',
+                                value=NonBlockingQueueHandler.dropped)
+
+        try:
+            job_stats = self._get_job_stats()
+        except Exception as e:
+            logger.warning(f'Failed to collect job stats: {str(e)}')
+        else:
+            for name in ('queued', 'running', 'oldest_queued_seconds'):
+                yield GaugeMetricFamily(f'chat_jobs_{name}', f'Chat job queue: {name}', value=job_stats[name])
+
+
+_stats_registries = []
+
+
+class Metrics:
+    """Per-route request metrics and the /metrics endpoint"""
+
+    def __init__(self, app=None):
+        self.registry = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        if not app.config['METRICS_ENABLED']:
+            return
+
+        if os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+            from prometheus_client import multiprocess
+            self.registry = CollectorRegistry()
+            multiprocess.MultiProcessCollector(self.registry)
+        else:
+            self.registry = REGISTRY
+        if self.registry not in _stats_registries:
+            self.registry.register(StatsCollector())
+            _stats_registries.append(self.registry)
+
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.add_url_rule('/metrics', 'metrics', self.metrics_view)
+        app.extensions['metrics'] = self
+
+    @staticmethod
+    def _endpoint() -> str:
+        # The route pattern, not the URL, keeps label cardinality bounded
+        return request.url_rule.rule if request.url_rule else 'unmatched'
+
+    def _before_request(self):
+        g.metrics_start = time.perf_counter()
+        HTTP_IN_PROGRESS.labels(self._endpoint()).inc()
+
+    def _after_request(self, response):
+        start = g.pop('metrics_start', None)
+        if start is None:
+            return response
+        endpoint = self._endpoint()
+        method = request.method
+        status = str(response.status_code)
+
+        def finish():
+            HTTP_IN_PROGRESS.labels(endpoint).dec()
+            HTTP_LATENCY.labels(endpoint, method).observe(time.perf_counter() - start)
+            HTTP_REQUESTS.labels(endpoint, method, status).inc()
+
+        # A streamed response is in progress until its body is sent
+        if response.is_streamed:
+            response.call_on_close(finish)
+        else:
+            finish()
+        return response
+
+    @internal_required
+    def metrics_view(self):
+        return Response(generate_latest(self.registry), mimetype=CONTENT_TYPE_LATEST)
+
+
+metrics = Metrics()
@@ -1,56 +1,339 @@
-from langchain.chat_models import init_chat_model
+import threading
 from typing import Annotated
 
 from typing_extensions import TypedDict
 
-from langgraph.graph import StateGraph, START
-from langgraph.graph.message import add_messages
-from langchain_tavily import TavilySearch
-from langgraph.prebuilt import ToolNode, tools_condition
-
+from app.config import Config
 from app.utils.logger import get_logger
+from app.utils.metrics import stage_timer
+from app.utils.resilience import RetryPolicy, call_with_retries, get_breaker, resilient_invoke
+from app.utils.tokens import count_tokens, load_tokenizer
 
 logger = get_logger(__name__)
 
+MODEL_ID = "eu.amazon.nova-micro-v1:0"
 
-class State(TypedDict):
-    # Messages have the type "list". The `add_messages` function
-    # in the annotation defines how this state key should be updated
-    # (in this case, it appends messages to the list, rather than overwriting them)
-    messages: Annotated[list, add_messages]
 
+def build_graph(llm, tools: list, checkpointer=None, max_tokens=None, token_counter=None,
+                policy=None, fallback_llm=None):
+    """Compile the chatbot/tools graph around any chat model that supports tool binding.
 
-def chatbot(state: State):
-    return {"messages": [llm_with_tools.invoke(state["messages"])]}
+    With ``max_tokens`` the model only sees the most recent messages of the
+    state that fit the budget, which keeps checkpointed threads bounded.
+    With a retry ``policy`` model calls go through the resilience layer and
+    switch to ``fallback_llm`` when the primary model keeps failing.
+    """
+    from langchain_core.messages import trim_messages
+    from langgraph.graph import StateGraph, START
+    from langgraph.graph.message import add_messages
+    from langgraph.prebuilt import ToolNode, tools_condition
 
+    class State(TypedDict):
+        # Messages have the type "list". The `add_messages` function
+        # in the annotation defines how this state key should be updated
+        # (in this case, it appends messages to the list, rather than overwriting them)
+        messages: Annotated[list, add_messages]
 
-logger.info("Initializing TavilySearch tool")
+    logger.info("Binding tools to the chat model")
+    llm_with_tools = llm.bind_tools(tools)
+    if policy is None:
+        invoke_model = llm_with_tools.invoke
+    else:
+        invoke_model = resilient_invoke(
+            llm_with_tools, policy, get_breaker('model', Config.CIRCUIT_FAILURE_THRESHOLD, Config.CIRCUIT_RESET_SECONDS),
+            fallback=fallback_llm.bind_tools(tools) if fallback_llm is not None else None,
+            fallback_breaker=get_breaker('fallback_model', Config.CIRCUIT_FAILURE_THRESHOLD, Config.CIRCUIT_RESET_SECONDS),
+        )
 
-tool = TavilySearch(max_results=2)
-tools = [tool]
+    def chatbot(state: State):
+        messages = state["messages"]
+        if max_tokens:
+            messages = trim_messages(
+                messages,
+                max_tokens=max_tokens,
+                token_counter=token_counter,
+                strategy="last",
+                start_on="human",
+                include_system=True,
+            )
+        with stage_timer("llm"):
+            return {"messages": [invoke_model(messages)]}
 
-logger.info("Initializing chat model")
-llm = init_chat_model(
-    "eu.amazon.nova-micro-v1:0",
-    model_provider="bedrock",
-    region_name="eu-west-1",
-)
+    logger.info("Creating chatbot node")
+    graph_builder = StateGraph(State)
+    graph_builder.add_node("chatbot", chatbot)
+
+    tool_node = ToolNode(tools=tools)
+    graph_builder.add_node("tools", tool_node)
+    graph_builder.add_conditional_edges(
+        "chatbot",
+        tools_condition,
+    )
+    graph_builder.add_edge("tools", "chatbot")
+
+    graph_builder.add_edge(START, "chatbot")
+    return graph_builder.compile(checkpointer=checkpointer)
+
+
+def _count_message_tokens(messages: list) -> int:
+    return sum(count_tokens(message.content, Config.CONTEXT_TOKENIZER) for message in messages)
+
+
+class _Components:
+    """Clients and compiled graphs, built on first use instead of at import.
+
+    Building them pulls in langchain, langgraph and boto3 and needs cloud
+    credentials, which importing the app should not.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._built = False
+
+    @staticmethod
+    def _wrap_search(tool):
+        from app.utils.cache import build_cache
+        from app.utils.cached_tool import CachedTool
+
+        return CachedTool(
+            tool,
+            build_cache(Config.SEARCH_CACHE_SIZE, Config.SEARCH_CACHE_TTL, Config.SEARCH_CACHE_SHARED, namespace='search'),
+            policy=RetryPolicy(
+                max_retries=Config.LLM_MAX_RETRIES,
+                backoff_base=Config.LLM_BACKOFF_BASE,
+                backoff_max=Config.LLM_BACKOFF_MAX,
+            ),
+            breaker=get_breaker('search', Config.CIRCUIT_FAILURE_THRESHOLD, Config.CIRCUIT_RESET_SECONDS),
+        )
+
+    def _build(self):
+        from botocore.config import Config as BotoConfig
+        from langchain.chat_models import init_chat_model
+        from app.utils.search_client import build_search_tool
+
+        logger.info("Initializing TavilySearch tool")
+        self.tool = self._wrap_search(build_search_tool(max_results=2, timeout=Config.TOOL_ATTEMPT_TIMEOUT))
+
+        # Retries are handled by the resilience layer, not by botocore. The
+        # client timeouts bound each attempt; nothing runs on past them.
+        boto_config = BotoConfig(
+            connect_timeout=5,
+            read_timeout=Config.LLM_ATTEMPT_TIMEOUT,
+            retries={"max_attempts": 1},
+        )
+
+        logger.info("Initializing chat model")
+        self.llm = init_chat_model(
+            MODEL_ID,
+            model_provider="bedrock",
+            region_name="eu-west-1",
+            config=boto_config,
+        )
+        self.fallback_llm = None
+        if Config.FALLBACK_MODEL_ID:
+            logger.info(f"Initializing fallback chat model {Config.FALLBACK_MODEL_ID}")
+            self.fallback_llm = init_chat_model(
+                Config.FALLBACK_MODEL_ID,
+                model_provider="bedrock",
+                region_name="eu-west-1",
+                config=boto_config,
+            )
+
+        self._compile()
+
+    def _compile(self):
+        from app.utils.checkpointer import MongoCheckpointSaver
+
+        self.policy = RetryPolicy(
+            max_retries=Config.LLM_MAX_RETRIES,
+            backoff_base=Config.LLM_BACKOFF_BASE,
+            backoff_max=Config.LLM_BACKOFF_MAX,
+        )
+        self.tools = [self.tool]
+        self.graph = build_graph(self.llm, self.tools, policy=self.policy, fallback_llm=self.fallback_llm)
+
+        # Same graph, but resuming each conversation from its stored thread state
+        self.checkpointer = MongoCheckpointSaver()
+        self.checkpointed_graph = build_graph(
+            self.llm, self.tools,
+            checkpointer=self.checkpointer,
+            max_tokens=Config.CONTEXT_TOKEN_BUDGET,
+            token_counter=_count_message_tokens,
+            policy=self.policy,
+            fallback_llm=self.fallback_llm,
+        )
+        logger.info("Chatbot graph created successfully")
+
+    def use(self, llm, search_tool, fallback_llm=None):
+        """Build the graphs around the given model and search tool instead of
+        Bedrock and Tavily, e.g. local stand-ins for benchmarks"""
+        with self._lock:
+            self.llm = llm
+            self.fallback_llm = fallback_llm
+            self.tool = self._wrap_search(search_tool)
+            self._compile()
+            self._built = True
+
+    def get(self):
+        if not self._built:
+            with self._lock:
+                if not self._built:
+                    self._build()
+                    self._built = True
+        return self
+
+
+_components = _Components()
+
+
+def use_components(llm, search_tool, fallback_llm=None):
+    _components.use(llm, search_tool, fallback_llm)
+
+
+def get_llm():
+    return _components.get().llm
 
-logger.info("Binding tools to the chat model")
-llm_with_tools = llm.bind_tools(tools)
 
-logger.info("Creating chatbot node")
-graph_builder = StateGraph(State)
-graph_builder.add_node("chatbot", chatbot)
+def get_graph():
+    return _components.get().graph
 
-tool_node = ToolNode(tools=[tool])
-graph_builder.add_node("tools", tool_node)
-graph_builder.add_conditional_edges(
-    "chatbot",
-    tools_condition,
+
+def get_checkpointed_graph():
+    return _components.get().checkpointed_graph
+
+
+def search_cache_stats() -> dict:
+    """Stats of the search result cache, or {} before the tool is built"""
+    return _components.tool.cache.stats() if _components._built else {}
+
+
+def warm_up():
+    """Build the model clients and graphs ahead of the first request.
+
+    Called from gunicorn hooks either once in the master before forking
+    (with preload) or in each worker after it starts.
+    """
+    _components.get()
+    load_tokenizer(Config.CONTEXT_TOKENIZER)
+
+
+def _thread_config(thread_id: str) -> dict:
+    return {"configurable": {"thread_id": thread_id}}
+
+
+def graph_input_for_thread(thread_id: str, new_messages: list, build_seed):
+    """Input for a turn of a checkpointed conversation.
+
+    A thread with no stored state is seeded from ``build_seed()``. If the
+    previous run of the same message was interrupted, None is returned so the
+    graph resumes from its last checkpoint instead of starting over.
+    """
+    state = get_checkpointed_graph().get_state(_thread_config(thread_id))
+    if not state.values:
+        return {"messages": build_seed()}
+
+    if state.next:
+        last_human = next(
+            (message for message in reversed(state.values["messages"]) if message.type == "human"),
+            None
+        )
+        if last_human is not None and last_human.content == new_messages[-1]["content"]:
+            logger.info(f"Resuming interrupted run for thread {thread_id}")
+            return None
+
+    # A run abandoned mid tool call leaves tool calls without results,
+    # which Bedrock rejects; close them before the new message
+    return {"messages": _cancelled_tool_results(state.values["messages"]) + new_messages}
+
+
+def _cancelled_tool_results(messages: list) -> list:
+    """ToolMessages answering the unanswered tool calls of the last AI message"""
+    from langchain_core.messages import ToolMessage
+
+    answered = set()
+    for message in reversed(messages):
+        if message.type == "tool":
+            answered.add(message.tool_call_id)
+        elif message.type == "ai":
+            return [
+                ToolMessage(content="Cancelled: the user sent a new message.",
+                            tool_call_id=tool_call["id"], name=tool_call["name"])
+                for tool_call in getattr(message, "tool_calls", None) or []
+                if tool_call["id"] not in answered
+            ]
+        else:
+            break
+    return []
+
+
+def invoke_graph(graph_input, thread_id=None):
+    if thread_id:
+        return get_checkpointed_graph().invoke(graph_input, _thread_config(thread_id))
+    return get_graph().invoke(graph_input)
+
+
+def _text_from_content(content) -> str:
+    # Bedrock Converse chunks carry either a plain string or a list of content blocks
+    if isinstance(content, str):
+        return content
+    if isinstance(content, list):
+        return "".join(
+            block.get("text", "") for block in content
+            if isinstance(block, dict) and block.get("type") == "text"
+        )
+    return ""
+
+
+def stream_graph(graph_input, thread_id=None):
+    """Run the graph in streaming mode, yielding (event, data) tuples.
+
+    Events are ``token`` for model output, ``tool_call`` / ``tool_result``
+    for tool progress and a final ``message`` with the full assistant answer.
+    """
+    compiled, config = (get_checkpointed_graph(), _thread_config(thread_id)) if thread_id else (get_graph(), None)
+    final_message = None
+    for mode, chunk in compiled.stream(graph_input, config, stream_mode=["messages", "updates"]):
+        if mode == "messages":
+            message_chunk, metadata = chunk
+            if metadata.get("langgraph_node") != "chatbot":
+                continue
+            text = _text_from_content(message_chunk.content)
+            if text:
+                yield "token", {"content": text}
+            continue
+
+        for node, update in chunk.items():
+            for message in (update or {}).get("messages", []):
+                if node == "chatbot":
+                    if getattr(message, "tool_calls", None):
+                        for tool_call in message.tool_calls:
+                            yield "tool_call", {"name": tool_call["name"], "args": tool_call["args"]}
+                    else:
+                        final_message = message
+                elif node == "tools":
+                    yield "tool_result", {"name": getattr(message, "name", None)}
+
+    content = _text_from_content(final_message.content) if final_message else ""
+    yield "message", {"content": content}
+
+
+SUMMARY_PROMPT = (
+    "You maintain a running summary of a conversation between a user and an assistant. "
+    "Update the summary with the new messages below. Keep names, facts, decisions and open "
+    "questions; drop small talk. Reply with the updated summary only."
 )
-graph_builder.add_edge("tools", "chatbot")
 
-graph_builder.add_edge(START, "chatbot")
-graph = graph_builder.compile()
-logger.info("Chatbot graph created successfully")
+
+def summarize_messages(summary: str, messages: list) -> str:
+    """Fold ``messages`` into an existing conversation summary"""
+    transcript = "\n".join(f"{message['role']}: {message['content']}" for message in messages)
+    prompt = [
+        {"role": "system", "content": SUMMARY_PROMPT},
+        {"role": "user", "content": f"Current summary:\n{summary or '(none)'}\n\nNew messages:\n{transcript}"},
+    ]
+    resp = call_with_retries(
+        lambda: get_llm().invoke(prompt),
+        _components.get().policy,
+        get_breaker('model', Config.CIRCUIT_FAILURE_THRESHOLD, Config.CIRCUIT_RESET_SECONDS),
+    )
+    return _text_from_content(resp.content)
@@ -0,0 +1,114 @@
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+import multiprocessing
+import os
+import threading
+from passlib.hash import pbkdf2_sha256
+from app.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class HasherBusy(Exception):
+    """Too many hashes are already queued; the caller should retry later"""
+
+
+# Run in the pool processes, so they must be importable top-level functions
+
+def _hash(password: str, rounds: int) -> str:
+    return pbkdf2_sha256.using(rounds=rounds).hash(password)
+
+
+def _verify(password: str, password_hash: str, rounds: int):
+    """Returns (matches, new_hash). new_hash is set when the stored hash was
+    made with other cost parameters than the configured ones."""
+    if not pbkdf2_sha256.verify(password, password_hash):
+        return False, None
+    if pbkdf2_sha256.using(rounds=rounds).needs_update(password_hash):
+        return True, _hash(password, rounds)
+    return True, None
+
+
+class PasswordHasher:
+    """Runs pbkdf2 in a process pool so hashing never holds the request
+    worker's GIL. At most pool size + PASSWORD_POOL_QUEUE hashes are in
+    flight; beyond that HasherBusy is raised instead of queueing without bound.
+    With PASSWORD_POOL_SIZE=0 hashing runs inline.
+
+    Pool processes come from a forkserver (spawn where that is unavailable),
+    never a fork of the worker: a gevent worker's monkey-patched locks and
+    hub would be copied mid-state into the children.
+    """
+
+    def __init__(self, app=None):
+        self.rounds = pbkdf2_sha256.default_rounds
+        self.pool_size = 0
+        self.timeout = None
+        self._slots = None
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.rounds = app.config['PASSWORD_HASH_ROUNDS']
+        self.pool_size = app.config['PASSWORD_POOL_SIZE']
+        self.timeout = app.config['PASSWORD_POOL_TIMEOUT']
+        self._slots = threading.BoundedSemaphore(self.pool_size + app.config['PASSWORD_POOL_QUEUE'])
+        app.extensions['password_hasher'] = self
+
+    @staticmethod
+    def _mp_context():
+        method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+        return multiprocessing.get_context(method)
+
+    def start(self) -> None:
+        """Create this process's pool; called from gunicorn's post_worker_init"""
+        if self.pool_size:
+            self._get_executor()
+
+    def _get_executor(self):
+        # Created per process, so each gunicorn worker owns its pool. Outside
+        # gunicorn (dev server, CLI) it is created on first use.
+        with self._lock:
+            if self._executor is None or self._pid != os.getpid():
+                self._executor = ProcessPoolExecutor(max_workers=self.pool_size, mp_context=self._mp_context())
+                self._pid = os.getpid()
+            return self._executor
+
+    def _run(self, fn, *args):
+        if not self.pool_size:
+            return fn(*args)
+        if not self._slots.acquire(blocking=False):
+            logger.warning('Password hashing queue is full')
+            raise HasherBusy()
+        try:
+            future = self._get_executor().submit(fn, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        # A hash that started cannot be cancelled, so its slot is held until
+        # it actually finishes, not until the caller stops waiting
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeout:
+            future.cancel()
+            logger.warning(f'Password hashing took longer than {self.timeout}s')
+            raise HasherBusy()
+
+    def hash(self, password: str) -> str:
+        return self._run(_hash, password, self.rounds)
+
+    def verify(self, password: str, password_hash: str):
+        """Returns (matches, new_hash); see _verify"""
+        return self._run(_verify, password, password_hash, self.rounds)
+
+    def shutdown(self) -> None:
+        with self._lock:
+            if self._executor is not None and self._pid == os.getpid():
+                self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+password_hasher = PasswordHasher()
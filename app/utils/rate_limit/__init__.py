@@ -0,0 +1,80 @@
+import time
+
+from app.utils.rate_limit.algorithms import ALGORITHMS, FixedWindow, RateLimitResult
+from app.utils.rate_limit.backends import BACKENDS, ContentionError
+
+
+class RateLimiter:
+    """Per-user request quota, configured from the app config.
+
+    ``RATE_LIMIT_ALGORITHM`` picks one of ``fixed_window``, ``sliding_window``
+    or ``token_bucket`` and ``RATE_LIMIT_BACKEND`` one of ``memory``,
+    ``redis`` or ``mongo``. A user's limit is their own ``request_limit``
+    override if set, otherwise the limit of their plan.
+    """
+
+    def __init__(self, app=None):
+        self.algorithm = None
+        self.backend = None
+        self.plans = {}
+        self.default_plan = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        period = app.config['RATE_LIMIT_PERIOD']
+        self.algorithm = ALGORITHMS[app.config['RATE_LIMIT_ALGORITHM']](period)
+        self.backend = BACKENDS[app.config['RATE_LIMIT_BACKEND']]()
+        self.plans = app.config['RATE_LIMIT_PLANS']
+        self.default_plan = app.config['RATE_LIMIT_DEFAULT_PLAN']
+        app.extensions['rate_limiter'] = self
+
+    def limit_for(self, user: dict) -> int:
+        """Limit for a user profile (or token claims) with ``plan`` and ``request_limit``"""
+        if user.get('request_limit'):
+            return user['request_limit']
+        return self.plans.get(user.get('plan'), self.plans[self.default_plan])
+
+    @staticmethod
+    def _key(user_id: str) -> str:
+        return f'quota:{user_id}'
+
+    def _counts_windows(self) -> bool:
+        # A fixed window is a plain counter the backend can charge in one write
+        return isinstance(self.algorithm, FixedWindow) and hasattr(self.backend, 'consume_window')
+
+    def consume(self, user_id: str, limit: int) -> RateLimitResult:
+        if self._counts_windows():
+            window_start = self.algorithm.window_start(time.time())
+            count = self.backend.consume_window(self._key(user_id), window_start, limit, self.algorithm.period)
+            if count is None:
+                return self.algorithm.result(window_start, limit, limit, False)
+            return self.algorithm.result(window_start, count, limit, True)
+
+        return self.backend.update(
+            self._key(user_id),
+            lambda state: self.algorithm.consume(state, limit, time.time()),
+            self.algorithm.period
+        )
+
+    def peek(self, user_id: str, limit: int) -> RateLimitResult:
+        state = self.backend.get(self._key(user_id))
+        return self.algorithm.peek(state, limit, time.time())
+
+    def refund(self, user_id: str, limit: int) -> RateLimitResult:
+        if self._counts_windows():
+            window_start = self.algorithm.window_start(time.time())
+            count = self.backend.refund_window(self._key(user_id), window_start)
+            return self.algorithm.result(window_start, count, limit, count < limit)
+
+        return self.backend.update(
+            self._key(user_id),
+            lambda state: self.algorithm.refund(state, limit, time.time()),
+            self.algorithm.period
+        )
+
+    def reset(self, user_id: str) -> None:
+        self.backend.delete(self._key(user_id))
+
+
+rate_limiter = RateLimiter()
@@ -0,0 +1,170 @@
+"""Rate limiting algorithms.
+
+Each algorithm is a pure function of the stored state, the user's limit and
+the current time. ``consume`` returns ``(new_state, result)`` where a
+``new_state`` of None means nothing needs to be written back.
+"""
+from dataclasses import dataclass
+from datetime import datetime
+import math
+
+
+@dataclass
+class RateLimitResult:
+    allowed: bool
+    remaining: int
+    limit: int
+    reset_at: float
+
+    def to_dict(self) -> dict:
+        return {
+            'remaining_requests': self.remaining,
+            'max_requests': self.limit,
+            'reset_time': datetime.utcfromtimestamp(self.reset_at).isoformat() + 'Z'
+        }
+
+
+class FixedWindow:
+    """Counter that resets at the start of every window (midnight UTC for a day)"""
+    name = 'fixed_window'
+
+    def __init__(self, period: int):
+        self.period = period
+
+    def window_start(self, now):
+        return now - now % self.period
+
+    def result(self, window_start, count, limit, allowed) -> RateLimitResult:
+        """Result for a window that has ``count`` requests charged"""
+        return RateLimitResult(allowed, max(0, limit - count), limit, window_start + self.period)
+
+    def _count(self, state, now):
+        window_start = self.window_start(now)
+        if not state or state['window_start'] != window_start:
+            return window_start, 0
+        return window_start, state['count']
+
+    def consume(self, state, limit, now):
+        window_start, count = self._count(state, now)
+        reset_at = window_start + self.period
+        if count >= limit:
+            return None, RateLimitResult(False, 0, limit, reset_at)
+        count += 1
+        return (
+            {'window_start': window_start, 'count': count},
+            RateLimitResult(True, limit - count, limit, reset_at)
+        )
+
+    def peek(self, state, limit, now):
+        window_start, count = self._count(state, now)
+        return RateLimitResult(count < limit, max(0, limit - count), limit, window_start + self.period)
+
+    def refund(self, state, limit, now):
+        window_start, count = self._count(state, now)
+        if count == 0:
+            return None, self.peek(state, limit, now)
+        new_state = {'window_start': window_start, 'count': count - 1}
+        return new_state, self.peek(new_state, limit, now)
+
+
+class SlidingWindow:
+    """Sliding window counter.
+
+    The previous window's count is weighted by how much of it still overlaps
+    the trailing period, so quota frees up gradually instead of all at once
+    when the window flips.
+    """
+    name = 'sliding_window'
+
+    def __init__(self, period: int):
+        self.period = period
+
+    def _roll(self, state, now):
+        window_start = now - now % self.period
+        if not state:
+            return window_start, 0, 0
+        if state['window_start'] == window_start:
+            return window_start, state['count'], state['previous']
+        if state['window_start'] == window_start - self.period:
+            return window_start, 0, state['count']
+        return window_start, 0, 0
+
+    def _result(self, window_start, count, previous, limit, now, allowed):
+        elapsed = now - window_start
+        used = previous * (1 - elapsed / self.period) + count
+        remaining = max(0, math.floor(limit - used))
+        if remaining > 0 or previous == 0 or count >= limit:
+            # Either usable now, or blocked by the current window alone
+            reset_at = now if remaining > 0 else window_start + self.period
+        else:
+            # Time until the previous window's weight drops enough for one request
+            reset_at = window_start + self.period * (1 - (limit - 1 - count) / previous)
+        return RateLimitResult(allowed, remaining, limit, reset_at)
+
+    def consume(self, state, limit, now):
+        window_start, count, previous = self._roll(state, now)
+        elapsed = now - window_start
+        if previous * (1 - elapsed / self.period) + count + 1 > limit:
+            return None, self._result(window_start, count, previous, limit, now, False)
+        count += 1
+        return (
+            {'window_start': window_start, 'count': count, 'previous': previous},
+            self._result(window_start, count, previous, limit, now, True)
+        )
+
+    def peek(self, state, limit, now):
+        window_start, count, previous = self._roll(state, now)
+        result = self._result(window_start, count, previous, limit, now, True)
+        result.allowed = result.remaining > 0
+        return result
+
+    def refund(self, state, limit, now):
+        window_start, count, previous = self._roll(state, now)
+        if count == 0:
+            return None, self.peek(state, limit, now)
+        new_state = {'window_start': window_start, 'count': count - 1, 'previous': previous}
+        return new_state, self.peek(new_state, limit, now)
+
+
+class TokenBucket:
+    """Bucket of ``limit`` tokens refilled continuously over the period.
+
+    Each user's quota recovers on their own schedule, so there is no global
+    moment when everyone's requests unlock together.
+    """
+    name = 'token_bucket'
+
+    def __init__(self, period: int):
+        self.period = period
+
+    def _tokens(self, state, limit, now):
+        if not state:
+            return float(limit)
+        rate = limit / self.period
+        return min(float(limit), state['tokens'] + (now - state['updated']) * rate)
+
+    def _result(self, tokens, limit, now, allowed):
+        rate = limit / self.period
+        reset_at = now if tokens >= 1 else now + (1 - tokens) / rate
+        return RateLimitResult(allowed, math.floor(tokens), limit, reset_at)
+
+    def consume(self, state, limit, now):
+        tokens = self._tokens(state, limit, now)
+        if tokens < 1:
+            return None, self._result(tokens, limit, now, False)
+        tokens -= 1
+        return {'tokens': tokens, 'updated': now}, self._result(tokens, limit, now, True)
+
+    def peek(self, state, limit, now):
+        tokens = self._tokens(state, limit, now)
+        return self._result(tokens, limit, now, tokens >= 1)
+
+    def refund(self, state, limit, now):
+        tokens = min(float(limit), self._tokens(state, limit, now) + 1)
+        return {'tokens': tokens, 'updated': now}, self._result(tokens, limit, now, tokens >= 1)
+
+
+ALGORITHMS = {
+    algorithm.name: algorithm
+    for algorithm in (FixedWindow, SlidingWindow, TokenBucket)
+}
@@ -0,0 +1,330 @@
+"""Storage backends for rate limit state.
+
+Every backend exposes ``update(key, fn, ttl)``, which atomically applies
+``fn(state) -> (new_state, result)`` to the stored state and returns the
+result, plus ``get`` and ``delete``.
+"""
+from collections import OrderedDict
+from datetime import datetime, timedelta
+import json
+import threading
+import time
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+
+class ContentionError(RuntimeError):
+    """Raised when optimistic updates keep losing to concurrent writers"""
+
+
+class MemoryBackend:
+    """Process-local store for tests and single-node deployments"""
+
+    def __init__(self, max_keys: int = 100000):
+        self.max_keys = max_keys
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def _live(self, key, now):
+        entry = self._data.get(key)
+        if entry and entry[1] <= now:
+            del self._data[key]
+            return None
+        return entry[0] if entry else None
+
+    def _prune(self, now):
+        for key in [k for k, (_, expires) in self._data.items() if expires <= now]:
+            del self._data[key]
+
+    def get(self, key):
+        with self._lock:
+            return self._live(key, time.time())
+
+    def update(self, key, fn, ttl):
+        with self._lock:
+            now = time.time()
+            new_state, result = fn(self._live(key, now))
+            if new_state is not None:
+                if len(self._data) >= self.max_keys:
+                    self._prune(now)
+                self._data[key] = (new_state, now + ttl)
+            return result
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+
+class WatchError(Exception):
+    """A watched key changed before the transaction executed"""
+
+
+class InMemoryRedis:
+    """Local stand-in for the subset of the redis-py client the Redis backend uses"""
+
+    def __init__(self):
+        self._values = {}
+        self._versions = {}
+        self._lock = threading.Lock()
+
+    def _get(self, key):
+        entry = self._values.get(key)
+        if entry and entry[1] is not None and entry[1] <= time.time():
+            del self._values[key]
+            self._versions[key] = self._versions.get(key, 0) + 1
+            return None
+        return entry[0] if entry else None
+
+    def _set(self, key, value, ex=None):
+        expires = time.time() + ex if ex else None
+        self._values[key] = (value if isinstance(value, bytes) else str(value).encode(), expires)
+        self._versions[key] = self._versions.get(key, 0) + 1
+
+    def get(self, key):
+        with self._lock:
+            return self._get(key)
+
+    def set(self, key, value, ex=None):
+        with self._lock:
+            self._set(key, value, ex)
+        return True
+
+    def delete(self, key):
+        with self._lock:
+            existed = self._values.pop(key, None) is not None
+            self._versions[key] = self._versions.get(key, 0) + 1
+        return int(existed)
+
+    def pipeline(self):
+        return _InMemoryPipeline(self)
+
+
+class _InMemoryPipeline:
+    def __init__(self, client):
+        self._client = client
+        self._watched = {}
+        self._commands = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.reset()
+
+    def watch(self, *keys):
+        with self._client._lock:
+            for key in keys:
+                self._watched[key] = self._client._versions.get(key, 0)
+
+    def get(self, key):
+        return self._client.get(key)
+
+    def multi(self):
+        self._commands = []
+
+    def set(self, key, value, ex=None):
+        self._commands.append((key, value, ex))
+
+    def execute(self):
+        with self._client._lock:
+            for key, version in self._watched.items():
+                if self._client._versions.get(key, 0) != version:
+                    raise WatchError(key)
+            for key, value, ex in self._commands or []:
+                self._client._set(key, value, ex)
+        return [True] * len(self._commands or [])
+
+    def reset(self):
+        self._watched = {}
+        self._commands = None
+
+
+class RedisBackend:
+    """Optimistic WATCH/MULTI updates against a Redis-style client.
+
+    Defaults to ``InMemoryRedis``; pass a ``redis.Redis`` client and
+    ``redis.WatchError`` to use a real server.
+    """
+
+    def __init__(self, client=None, watch_error=WatchError, max_retries: int = 10):
+        self.client = client or InMemoryRedis()
+        self.watch_error = watch_error
+        self.max_retries = max_retries
+
+    def get(self, key):
+        raw = self.client.get(key)
+        return json.loads(raw) if raw else None
+
+    def update(self, key, fn, ttl):
+        for _ in range(self.max_retries):
+            with self.client.pipeline() as pipe:
+                pipe.watch(key)
+                raw = pipe.get(key)
+                new_state, result = fn(json.loads(raw) if raw else None)
+                if new_state is None:
+                    return result
+                pipe.multi()
+                pipe.set(key, json.dumps(new_state), ex=int(ttl))
+                try:
+                    pipe.execute()
+                    return result
+                except self.watch_error:
+                    continue
+        raise ContentionError(f'Too many concurrent updates to {key}')
+
+    def delete(self, key):
+        self.client.delete(key)
+
+
+class MongoBackend:
+    """Shared store.
+
+    Fixed windows are a plain counter and are charged with one conditional
+    upsert (``consume_window``). Other algorithms use compare-and-swap on a
+    version field: the last state this process wrote is cached, so when the
+    same node keeps serving a user an update is a single conditional write.
+    A stale cache just loses the swap and falls back to reading the current
+    document.
+    """
+
+    def __init__(self, max_retries: int = 10, cache_size: int = 10000):
+        self.max_retries = max_retries
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _collection():
+        from app.models.rate_limit_state import RateLimitState
+        return RateLimitState._get_collection()
+
+    def _remember(self, key, state, version):
+        with self._lock:
+            self._cache[key] = (state, version)
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def _forget(self, key):
+        with self._lock:
+            self._cache.pop(key, None)
+
+    def _read(self, key):
+        doc = self._collection().find_one({'key': key}, {'state': 1, 'version': 1, 'expires_at': 1})
+        if not doc:
+            return None, 0
+        # The TTL monitor only runs periodically, so skip expired leftovers
+        state = doc['state'] if doc['expires_at'] > datetime.utcnow() else None
+        return state, doc['version']
+
+    def get(self, key):
+        state, version = self._read(key)
+        self._remember(key, state, version)
+        return state
+
+    def update(self, key, fn, ttl):
+        collection = self._collection()
+        with self._lock:
+            cached = self._cache.get(key)
+
+        for _ in range(self.max_retries):
+            from_cache = cached is not None
+            state, version = cached if from_cache else self._read(key)
+            cached = None
+
+            new_state, result = fn(state)
+            if new_state is None:
+                if from_cache and not result.allowed:
+                    # Never reject on possibly stale data
+                    continue
+                return result
+
+            expires_at = datetime.utcnow() + timedelta(seconds=ttl)
+            if version == 0:
+                try:
+                    collection.insert_one({
+                        'key': key, 'state': new_state, 'version': 1, 'expires_at': expires_at
+                    })
+                except DuplicateKeyError:
+                    continue
+            else:
+                swapped = collection.update_one(
+                    {'key': key, 'version': version},
+                    {'$set': {'state': new_state, 'expires_at': expires_at}, '$inc': {'version': 1}}
+                )
+                if not swapped.modified_count:
+                    continue
+
+            self._remember(key, new_state, version + 1)
+            return result
+
+        self._forget(key)
+        raise ContentionError(f'Too many concurrent updates to {key}')
+
+    def consume_window(self, key, window_start, limit, ttl):
+        """Atomically reset, check and increment a fixed window counter.
+
+        Returns the count including this request, or None when the limit is
+        already reached.
+        """
+        self._forget(key)
+        expires_at = datetime.utcnow() + timedelta(seconds=ttl)
+
+        # A duplicate key means the filter missed an existing document. On the
+        # first attempt that can be a concurrent first request inserting it, so
+        # retry once; after that it means the limit is reached.
+        for _ in range(2):
+            try:
+                doc = self._collection().find_one_and_update(
+                    {
+                        'key': key,
+                        '$or': [
+                            {'state.window_start': {'$ne': window_start}},
+                            {'state.count': {'$lt': limit}}
+                        ]
+                    },
+                    [
+                        {'$set': {'state.count': {'$cond': [
+                            {'$eq': ['$state.window_start', window_start]}, {'$add': ['$state.count', 1]}, 1
+                        ]}}},
+                        {'$set': {
+                            'state.window_start': window_start,
+                            'expires_at': expires_at,
+                            'version': {'$add': [{'$ifNull': ['$version', 0]}, 1]}
+                        }}
+                    ],
+                    projection={'state': 1},
+                    upsert=True,
+                    return_document=ReturnDocument.AFTER
+                )
+            except DuplicateKeyError:
+                continue
+            return doc['state']['count']
+
+        return None
+
+    def refund_window(self, key, window_start):
+        """Give back one request of a fixed window; returns the count left in it"""
+        self._forget(key)
+        doc = self._collection().find_one_and_update(
+            {'key': key, 'state.window_start': window_start, 'state.count': {'$gt': 0}},
+            {'$inc': {'state.count': -1, 'version': 1}},
+            projection={'state': 1},
+            return_document=ReturnDocument.AFTER
+        )
+        if doc:
+            return doc['state']['count']
+        state, _ = self._read(key)
+        return state['count'] if state and state['window_start'] == window_start else 0
+
+    def delete(self, key):
+        self._forget(key)
+        self._collection().delete_one({'key': key})
+
+
+BACKENDS = {
+    'memory': MemoryBackend,
+    'redis': RedisBackend,
+    'mongo': MongoBackend,
+}
@@ -1,11 +1,38 @@
 from functools import wraps
+import math
+import time
 from flask import jsonify, request, make_response
-from flask_jwt_extended import get_jwt_identity
-from app.models.request_quota import RequestQuota
+from flask_jwt_extended import get_jwt_identity, get_jwt
+from app.utils.rate_limit import rate_limiter, ContentionError
 from app.utils.logger import get_logger
+from app.utils.metrics import stage_timer
+from app.utils.user_cache import user_cache
 
 logger = get_logger(__name__)
 
+def request_limit_for(user_id, claims=None) -> int:
+    """Request limit of the user's current plan or override.
+
+    Read through the user cache, so a plan change applies within
+    USER_CACHE_TTL seconds rather than at the next login. The token claims
+    are only used if the user record cannot be found.
+    """
+    profile = user_cache.get(user_id, ('plan', 'request_limit')) if user_id else None
+    return rate_limiter.limit_for(profile or claims or {})
+
+def current_request_limit() -> int:
+    """Request limit for the authenticated user"""
+    return request_limit_for(get_jwt_identity(), get_jwt())
+
+def refund_request_quota(user_id, quota):
+    """Give back the request charged by check_request_quota, e.g. when no answer
+    was produced. Returns the updated quota, or the original one if it fails."""
+    try:
+        return rate_limiter.refund(user_id, quota.limit)
+    except Exception as e:
+        logger.warning(f"Failed to refund request for user {user_id}: {str(e)}")
+        return quota
+
 def check_request_quota(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
@@ -13,23 +40,25 @@ def check_request_quota(f):
         
         if not current_user:
             return jsonify({"error": "Authentication required"}), 401
-            
-        remaining = RequestQuota.get_remaining_requests(current_user)
-        
-        if remaining <= 0:
-            logger.warning(f"User {current_user} has exceeded their daily request quota")
-            return jsonify({
-                "error": "Daily request quota exceeded",
-                "remaining_requests": 0,
-                "reset_time": "midnight UTC"
-            }), 429
-            
-        if not RequestQuota.increment_request_count(current_user):
+
+        try:
+            with stage_timer('quota'):
+                quota = rate_limiter.consume(current_user, current_request_limit())
+        except ContentionError:
             logger.warning(f"Failed to increment request count for user {current_user}")
             return jsonify({"error": "Failed to process request"}), 500
+        
+        if not quota.allowed:
+            logger.warning(f"User {current_user} has exceeded their request quota")
+            response_obj = make_response(jsonify({
+                "error": "Request quota exceeded",
+                **quota.to_dict()
+            }), 429)
+            response_obj.headers['Retry-After'] = str(max(1, math.ceil(quota.reset_at - time.time())))
+            return response_obj
             
-        # Pass remaining requests to the decorated function
-        response = f(*args, **kwargs)
+        # Pass the quota state to the decorated function
+        response = f(*args, quota=quota, **kwargs)
         
         # Convert response to a response object if it isn't already
         if isinstance(response, tuple):
@@ -40,9 +69,10 @@ def check_request_quota(f):
         else:
             response_obj = make_response(response)
             
-        # Add rate limit header
-        response_obj.headers['X-RateLimit-Remaining'] = str(remaining - 1)
+        # Add rate limit headers
+        response_obj.headers['X-RateLimit-Limit'] = str(quota.limit)
+        response_obj.headers['X-RateLimit-Remaining'] = str(quota.remaining)
         
         return response_obj
         
-    return decorated_function
\ No newline at end of file
+    return decorated_function
@@ -0,0 +1,246 @@
+"""Deadlines, retries and circuit breaking for calls to model and tool providers"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+import random
+import threading
+import time
+from typing import Optional
+from app.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class DeadlineExceeded(TimeoutError):
+    """The request ran out of its time budget"""
+
+
+class CircuitOpenError(RuntimeError):
+    """The provider is failing and calls are being rejected without trying"""
+
+
+class ProviderError(RuntimeError):
+    """A provider returned an error payload instead of raising"""
+
+
+class StreamInterrupted(RuntimeError):
+    """A model call failed after some of its tokens were already streamed to
+    the client, so it can neither be retried nor handed to the fallback"""
+
+
+_deadline: ContextVar[Optional[float]] = ContextVar('deadline', default=None)
+
+
+@contextmanager
+def deadline_scope(seconds: Optional[float]):
+    """Give every provider call inside the block a shared time budget"""
+    token = _deadline.set(time.monotonic() + seconds if seconds else None)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining_time() -> Optional[float]:
+    """Seconds left in the current deadline, or None without one"""
+    deadline = _deadline.get()
+    if deadline is None:
+        return None
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        raise DeadlineExceeded('Request deadline exceeded')
+    return remaining
+
+
+class CircuitBreaker:
+    """Open after ``failure_threshold`` consecutive failures and reject calls
+    for ``reset_timeout`` seconds, then let a single trial call through."""
+
+    def __init__(self, name: str, failure_threshold: int, reset_timeout: float):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at = None
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self._opened_at is None:
+            return 'closed'
+        if time.monotonic() - self._opened_at < self.reset_timeout:
+            return 'open'
+        return 'half_open'
+
+    def before_call(self):
+        with self._lock:
+            state = self.state
+            if state == 'open' or (state == 'half_open' and self._trial_running):
+                raise CircuitOpenError(f'{self.name} is unavailable')
+            if state == 'half_open':
+                self._trial_running = True
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._trial_running or self._failures >= self.failure_threshold:
+                if self._opened_at is None or self._trial_running:
+                    logger.warning(f'Circuit for {self.name} opened after {self._failures} failures')
+                self._opened_at = time.monotonic()
+            self._trial_running = False
+
+
+@dataclass
+class RetryPolicy:
+    max_retries: int = 2
+    backoff_base: float = 0.5
+    backoff_max: float = 4.0
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(name: str, failure_threshold: int = 5, reset_timeout: float = 30) -> CircuitBreaker:
+    with _breakers_lock:
+        if name not in _breakers:
+            _breakers[name] = CircuitBreaker(name, failure_threshold, reset_timeout)
+        return _breakers[name]
+
+
+_RETRYABLE_CODES = {
+    'ThrottlingException', 'ServiceUnavailableException', 'InternalServerException',
+    'ModelNotReadyException', 'ModelTimeoutException', 'TooManyRequestsException',
+}
+# Client-side timeouts: botocore's read/connect timeouts and requests'
+_TIMEOUT_NAMES = {'ReadTimeoutError', 'ConnectTimeoutError', 'ReadTimeout', 'ConnectTimeout'}
+_RETRYABLE_NAMES = _TIMEOUT_NAMES | {'EndpointConnectionError', 'ConnectionClosedError', 'ConnectionError'}
+
+
+def is_retryable(error: Exception) -> bool:
+    if isinstance(error, (DeadlineExceeded, CircuitOpenError, StreamInterrupted)):
+        return False
+    if isinstance(error, (TimeoutError, ConnectionError, ProviderError)):
+        return True
+    code = getattr(error, 'response', None)
+    if isinstance(code, dict) and code.get('Error', {}).get('Code') in _RETRYABLE_CODES:
+        return True
+    return type(error).__name__ in _RETRYABLE_NAMES
+
+
+def call_with_retries(fn, policy: RetryPolicy, breaker: Optional[CircuitBreaker] = None):
+    """Call ``fn`` within the current deadline, retrying transient failures
+    with jittered exponential backoff and reporting outcomes to ``breaker``.
+
+    Attempts are not cut short here: each call is bounded by its client's
+    own timeouts (botocore read/connect timeouts, the search HTTP timeout),
+    so a slow attempt never keeps running behind a retry.
+    """
+    attempt = 0
+    while True:
+        remaining_time()
+        if breaker:
+            breaker.before_call()
+        try:
+            result = fn()
+        except Exception as e:
+            retryable = is_retryable(e)
+            provider_failed = retryable or (isinstance(e, StreamInterrupted) and is_retryable(e.__cause__))
+            if breaker and provider_failed:
+                breaker.record_failure()
+            elif breaker:
+                # Errors like invalid input still mean the provider is up
+                breaker.record_success()
+            if not retryable or attempt >= policy.max_retries:
+                raise
+            attempt += 1
+            # Full jitter: sleep a random time up to the exponential backoff
+            delay = random.uniform(0, min(policy.backoff_max, policy.backoff_base * 2 ** attempt))
+            remaining = remaining_time()
+            if remaining is not None and delay >= remaining:
+                raise DeadlineExceeded('Request deadline exceeded') from e
+            logger.warning(f'Retrying provider call (attempt {attempt}) after {type(e).__name__}: {e}')
+            time.sleep(delay)
+            continue
+        if breaker:
+            breaker.record_success()
+        return result
+
+
+def status_for_error(error: Exception) -> int:
+    """HTTP status for a failed chat turn"""
+    if isinstance(error, StreamInterrupted) and error.__cause__ is not None:
+        error = error.__cause__
+    if isinstance(error, TimeoutError) or type(error).__name__ in _TIMEOUT_NAMES:
+        return 504
+    if isinstance(error, CircuitOpenError):
+        return 503
+    return 500
+
+
+def _watching_tokens(watcher) -> dict:
+    """The current run config with ``watcher`` added to its callbacks"""
+    from langchain_core.runnables.config import ensure_config
+
+    config = ensure_config()
+    callbacks = config.get('callbacks')
+    if callbacks is None:
+        callbacks = [watcher]
+    elif isinstance(callbacks, list):
+        callbacks = [*callbacks, watcher]
+    else:
+        callbacks = callbacks.copy()
+        callbacks.add_handler(watcher, inherit=True)
+    return {**config, 'callbacks': callbacks}
+
+
+def resilient_invoke(primary, policy: RetryPolicy, breaker: CircuitBreaker,
+                     fallback=None, fallback_breaker: Optional[CircuitBreaker] = None):
+    """Return a callable invoking ``primary`` with retries, falling back to
+    ``fallback`` once the primary fails or its circuit is open.
+
+    Once an attempt has streamed tokens to the client, a failure raises
+    StreamInterrupted instead, since a second answer would be appended to
+    the partial first one.
+    """
+    from langchain_core.callbacks import BaseCallbackHandler
+
+    class TokenWatcher(BaseCallbackHandler):
+        def __init__(self):
+            self.streamed = False
+
+        def on_llm_new_token(self, token, **kwargs):
+            if token:
+                self.streamed = True
+
+    def invoke(messages):
+        watcher = TokenWatcher()
+        config = _watching_tokens(watcher)
+
+        def attempt(model):
+            def call():
+                try:
+                    return model.invoke(messages, config)
+                except Exception as e:
+                    if watcher.streamed:
+                        raise StreamInterrupted(f'Model failed mid-answer: {e}') from e
+                    raise
+            return call
+
+        try:
+            return call_with_retries(attempt(primary), policy, breaker)
+        except (DeadlineExceeded, StreamInterrupted):
+            raise
+        except Exception as e:
+            if fallback is None:
+                raise
+            logger.warning(f'Primary model failed ({type(e).__name__}: {e}), using fallback model')
+            return call_with_retries(attempt(fallback), policy, fallback_breaker)
+    return invoke
@@ -0,0 +1,56 @@
+import hashlib
+import re
+from app.utils.cache import build_cache
+from app.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+def normalize_prompt(prompt: str) -> str:
+    return re.sub(r'\s+', ' ', prompt).strip().lower()
+
+
+class ResponseCache:
+    """Cache of model answers to opening messages, i.e. turns without a context_id.
+
+    Entries are keyed on the normalized prompt and the model ID, so changing
+    the model never serves answers from the old one.
+    """
+
+    def __init__(self, app=None):
+        self.cache = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        if app.config['RESPONSE_CACHE_ENABLED']:
+            self.cache = build_cache(
+                app.config['RESPONSE_CACHE_SIZE'],
+                app.config['RESPONSE_CACHE_TTL'],
+                app.config['RESPONSE_CACHE_SHARED'],
+                namespace='responses'
+            )
+        app.extensions['response_cache'] = self
+
+    @property
+    def enabled(self) -> bool:
+        return self.cache is not None
+
+    @staticmethod
+    def key(prompt: str, model_id: str) -> str:
+        return hashlib.sha256(f'{model_id}\n{normalize_prompt(prompt)}'.encode()).hexdigest()
+
+    def get(self, prompt: str, model_id: str):
+        response = self.cache.get(self.key(prompt, model_id))
+        if response is not None:
+            logger.debug('Response cache hit')
+        return response
+
+    def set(self, prompt: str, model_id: str, response) -> None:
+        self.cache.set(self.key(prompt, model_id), response)
+
+    def stats(self) -> dict:
+        return self.cache.stats() if self.cache else {}
+
+
+response_cache = ResponseCache()
@@ -0,0 +1,108 @@
+"""Fast JSON serialization and response compression"""
+import gzip
+import threading
+from flask import current_app, request
+from flask.json.provider import JSONProvider
+import orjson
+import zstandard
+from app.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+COMPRESSIBLE_TYPES = ('application/json', 'text/plain', 'text/html', 'text/csv')
+
+
+class OrjsonProvider(JSONProvider):
+    """JSON provider for jsonify() and request.get_json() backed by orjson.
+
+    Datetimes are written as ISO 8601 and anything orjson can't handle
+    natively (ObjectId, Decimal, ...) falls back to str().
+    """
+    option = orjson.OPT_NON_STR_KEYS
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, default=str, option=self.option).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        # Skip the str round trip that dumps() needs
+        return self._app.response_class(
+            orjson.dumps(obj, default=str, option=self.option),
+            mimetype='application/json'
+        )
+
+
+_zstd = threading.local()
+
+
+def _zstd_compress(data: bytes, level: int) -> bytes:
+    # ZstdCompressor instances must not be shared between threads
+    compressor = getattr(_zstd, 'compressor', None)
+    if compressor is None or _zstd.level != level:
+        compressor = _zstd.compressor = zstandard.ZstdCompressor(level=level)
+        _zstd.level = level
+    return compressor.compress(data)
+
+
+def accepted_encodings(header: str) -> dict:
+    """Accept-Encoding as {coding: q}"""
+    encodings = {}
+    for part in header.split(','):
+        coding, _, params = part.strip().partition(';')
+        if not coding:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        encodings[coding.strip().lower()] = q
+    return encodings
+
+
+def choose_encoding(header: str):
+    """zstd when the client accepts it, else gzip, else None"""
+    encodings = accepted_encodings(header)
+    candidates = [coding for coding in ('zstd', 'gzip') if encodings.get(coding, encodings.get('*', 0)) > 0]
+    if not candidates:
+        return None
+    return max(candidates, key=lambda coding: encodings.get(coding, encodings.get('*', 0)))
+
+
+def compress_response(response):
+    """after_request hook: compress buffered responses above COMPRESS_MIN_SIZE.
+
+    Streamed responses (SSE) are passed through untouched, since compressing
+    them would buffer events until the stream ends.
+    """
+    config = current_app.config
+    if (not config['COMPRESS_ENABLED']
+            or response.is_streamed
+            or response.direct_passthrough
+            or not 200 <= response.status_code < 300
+            or response.status_code == 204
+            or 'Content-Encoding' in response.headers
+            or response.mimetype not in COMPRESSIBLE_TYPES):
+        return response
+
+    response.vary.add('Accept-Encoding')
+    data = response.get_data()
+    if len(data) < config['COMPRESS_MIN_SIZE']:
+        return response
+
+    encoding = choose_encoding(request.headers.get('Accept-Encoding', ''))
+    if encoding == 'zstd':
+        compressed = _zstd_compress(data, config['COMPRESS_ZSTD_LEVEL'])
+    elif encoding == 'gzip':
+        compressed = gzip.compress(data, compresslevel=config['COMPRESS_GZIP_LEVEL'], mtime=0)
+    else:
+        return response
+
+    response.set_data(compressed)
+    response.headers['Content-Encoding'] = encoding
+    return response
@@ -0,0 +1,77 @@
+"""Tavily search with a pooled HTTP session and a request timeout.
+
+langchain-tavily posts without a timeout, so a hung request would hold its
+worker until the turn's deadline and beyond. The tool keeps the public
+TavilySearch name, description and arguments, but makes the API call itself.
+"""
+from typing import Any, Dict, List, Literal, Optional
+
+from langchain_core.tools import ToolException
+from langchain_tavily import TavilySearch
+from pydantic import PrivateAttr
+
+from app.utils.google_auth import build_http_session
+
+TAVILY_SEARCH_URL = 'https://api.tavily.com/search'
+
+
+class TimeoutTavilySearch(TavilySearch):
+    timeout: float = 10.0
+    pool_size: int = 10
+    _session: Any = PrivateAttr(default=None)
+
+    def _post(self, params: dict) -> Dict:
+        if self._session is None:
+            # Retries are handled by the resilience layer
+            self._session = build_http_session(self.pool_size, retries=0)
+        response = self._session.post(
+            TAVILY_SEARCH_URL,
+            json={k: v for k, v in params.items() if v is not None},
+            headers={
+                'Authorization': f'Bearer {self.api_wrapper.tavily_api_key.get_secret_value()}',
+                'Content-Type': 'application/json',
+            },
+            timeout=self.timeout,
+        )
+        if response.status_code != 200:
+            detail = response.json().get('detail', {})
+            error_message = detail.get('error') if isinstance(detail, dict) else 'Unknown error'
+            raise ValueError(f'Error {response.status_code}: {error_message}')
+        return response.json()
+
+    def _run(
+        self,
+        query: str,
+        include_domains: Optional[List[str]] = None,
+        exclude_domains: Optional[List[str]] = None,
+        search_depth: Optional[Literal['basic', 'advanced']] = 'basic',
+        include_images: Optional[bool] = False,
+        time_range: Optional[Literal['day', 'week', 'month', 'year']] = None,
+        topic: Optional[Literal['general', 'news', 'finance']] = 'general',
+        run_manager=None,
+    ) -> Dict[str, Any]:
+        # Arguments the model left empty fall back to the tool's settings, as in TavilySearch
+        try:
+            results = self._post({
+                'query': query,
+                'include_domains': include_domains or self.include_domains,
+                'exclude_domains': exclude_domains or self.exclude_domains,
+                'search_depth': search_depth or self.search_depth,
+                'include_images': include_images or self.include_images,
+                'time_range': time_range or self.time_range,
+                'topic': topic or self.topic,
+                'max_results': self.max_results,
+                'include_answer': self.include_answer,
+                'include_raw_content': self.include_raw_content,
+                'include_image_descriptions': self.include_image_descriptions,
+            })
+        except Exception as e:
+            # Reported as a payload like TavilySearch does; CachedTool turns it into a retryable error
+            return {'error': e}
+        if not results.get('results'):
+            raise ToolException(f"No search results found for '{query}'. Try a broader query.")
+        return results
+
+
+def build_search_tool(max_results: int, timeout: float) -> TavilySearch:
+    return TimeoutTavilySearch(max_results=max_results, timeout=timeout)
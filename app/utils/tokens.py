@@ -0,0 +1,65 @@
+import os
+import threading
+from typing import Optional
+from app.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+_tokenizer = None
+_tokenizer_name = None
+_load_lock = threading.Lock()
+_unavailable = set()
+
+
+def _loads_without_network(name: str) -> bool:
+    # A hub download runs in native code that gevent cannot patch, so under
+    # gevent it would stall every greenlet in the worker
+    if os.path.isfile(name):
+        return True
+    try:
+        from gevent import monkey
+    except ImportError:
+        return True
+    return not monkey.is_module_patched('socket')
+
+
+def load_tokenizer(name: str) -> Optional['Tokenizer']:
+    """Load ``name``, a tokenizer.json path or a Hugging Face hub name.
+
+    Called from model_graph.warm_up() so the download never happens on a request.
+    """
+    global _tokenizer, _tokenizer_name
+    with _load_lock:
+        if _tokenizer_name == name:
+            return _tokenizer
+        try:
+            from tokenizers import Tokenizer
+            tokenizer = Tokenizer.from_file(name) if os.path.isfile(name) else Tokenizer.from_pretrained(name)
+        except Exception as e:
+            logger.warning(f'Could not load tokenizer {name}, estimating token counts: {str(e)}')
+            _unavailable.add(name)
+            return None
+        _tokenizer = tokenizer
+        _tokenizer_name = name
+        return _tokenizer
+
+
+def _get_tokenizer(name: str) -> Optional['Tokenizer']:
+    if _tokenizer_name == name:
+        return _tokenizer
+    if name in _unavailable:
+        return None
+    if _loads_without_network(name):
+        return load_tokenizer(name)
+    _unavailable.add(name)
+    logger.warning(f'Tokenizer {name} was not loaded at warm-up, estimating token counts')
+    return None
+
+
+def count_tokens(content, tokenizer_name: str) -> int:
+    text = content if isinstance(content, str) else str(content)
+    tokenizer = _get_tokenizer(tokenizer_name)
+    if tokenizer is None:
+        # Roughly four characters per token for English text
+        return len(text) // 4 + 1
+    return len(tokenizer.encode(text, add_special_tokens=False).ids)
@@ -0,0 +1,65 @@
+from mongoengine import signals
+from app.utils.cache import TTLCache
+from app.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Fields loaded into the cache. Secrets (password hash, reset tokens) are
+# never projected, so they never sit in memory between requests.
+PROFILE_FIELDS = (
+    'email', 'first_name', 'last_name', 'oauth_provider',
+    'plan', 'request_limit', 'is_active', 'created_at'
+)
+
+
+class UserCache:
+    """Per-process cache of user profiles keyed by JWT identity.
+
+    Entries are dropped when a User is saved or deleted in this process.
+    Other processes pick up the change once their entry expires, so
+    USER_CACHE_TTL bounds how stale a profile can be.
+    """
+
+    def __init__(self, app=None):
+        self.cache = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        from app.models.user import User
+
+        self.cache = TTLCache(app.config['USER_CACHE_SIZE'], app.config['USER_CACHE_TTL'])
+        signals.post_save.connect(self._on_change, sender=User, weak=False)
+        signals.post_delete.connect(self._on_change, sender=User, weak=False)
+        app.extensions['user_cache'] = self
+
+    def _on_change(self, sender, document, **kwargs):
+        self.invalidate(document.pk)
+
+    @staticmethod
+    def load(user_id, fields=PROFILE_FIELDS):
+        """Fetch only the given fields of a user, as a dict; None if not found"""
+        from app.models.user import User
+        return User.objects(id=user_id).only(*fields).as_pymongo().first()
+
+    def get(self, user_id, fields=None):
+        """Profile of user_id, limited to fields if given; None if not found"""
+        user_id = str(user_id)
+        profile = self.cache.get(user_id)
+        if profile is None:
+            profile = self.load(user_id)
+            if profile is None:
+                return None
+            self.cache.set(user_id, profile)
+        if fields:
+            return {name: profile.get(name) for name in fields}
+        return dict(profile)
+
+    def invalidate(self, user_id) -> None:
+        self.cache.delete(str(user_id))
+
+    def stats(self) -> dict:
+        return self.cache.stats() if self.cache else {}
+
+
+user_cache = UserCache()
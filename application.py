@@ -1,8 +1,8 @@
-from app import create_app
+from app import create_app, socketio
 
 app = create_app()
 
 if __name__ == '__main__':
-    app.run()
+    socketio.run(app)
 
 application = app
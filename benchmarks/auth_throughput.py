@@ -0,0 +1,113 @@
+"""Measure /api/auth/register and /api/auth/login throughput per password pool size.
+
+Usage:
+    MONGODB_URI=mongodb://localhost:27017/bench python -m benchmarks.auth_throughput \
+        --pool-sizes 0,1,2,4 --users 40 --concurrency 16
+
+Each pool size runs in a fresh interpreter with PASSWORD_POOL_SIZE set. The
+app is driven through the Werkzeug test client from ``--concurrency`` gevent
+greenlets, like one gevent gunicorn worker. A cheap request is timed while
+the logins run, which shows how much hashing stalls the rest of the worker.
+Pool size 0 hashes on the request thread. The benchmark users are deleted
+afterwards.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+CHILD = '''
+from gevent import monkey
+monkey.patch_all()
+
+import json, sys, time, uuid
+import gevent
+import gevent.event
+from gevent.pool import Pool
+from werkzeug.test import Client
+from app import create_app
+from app.models.user import User
+
+users, concurrency = int(sys.argv[1]), int(sys.argv[2])
+application = create_app()
+# Flask 2.2's test_client() predates the pinned Werkzeug 3
+client = Client(application)
+prefix = f"bench-{uuid.uuid4().hex[:8]}"
+emails = [f"{prefix}-{i}@example.com" for i in range(users)]
+
+
+def timed(fn, email):
+    start = time.perf_counter()
+    response = fn(email)
+    return time.perf_counter() - start, response.status_code
+
+
+def register(email):
+    return client.post("/api/auth/register", json={
+        "email": email, "first_name": "Bench", "last_name": "User", "password": "benchmark-password"
+    })
+
+
+def login(email):
+    return client.post("/api/auth/login", json={"email": email, "password": "benchmark-password"})
+
+
+def probe(stop, latencies):
+    while not stop.is_set():
+        start = time.perf_counter()
+        client.get("/api/auth/nonexistent")
+        latencies.append(time.perf_counter() - start)
+        gevent.sleep(0.01)
+
+
+def phase(fn):
+    stop, probe_latencies = gevent.event.Event(), []
+    prober = gevent.spawn(probe, stop, probe_latencies)
+    start = time.perf_counter()
+    results = Pool(concurrency).map(lambda email: timed(fn, email), emails)
+    total = time.perf_counter() - start
+    stop.set()
+    prober.join()
+    latencies = sorted(latency for latency, _ in results)
+    probe_latencies.sort()
+    return {
+        "per_second": len(results) / total,
+        "p50_ms": latencies[len(latencies) // 2] * 1000,
+        "p95_ms": latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] * 1000,
+        "errors": sum(1 for _, status in results if status >= 400),
+        "probe_max_ms": (probe_latencies[-1] if probe_latencies else 0) * 1000
+    }
+
+
+try:
+    result = {"register": phase(register), "login": phase(login)}
+finally:
+    with application.app_context():
+        User.objects(email__startswith=prefix).delete()
+print(json.dumps(result))
+'''
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--pool-sizes', default='0,1,2,4', help='comma separated PASSWORD_POOL_SIZE values')
+    parser.add_argument('--users', type=int, default=40)
+    parser.add_argument('--concurrency', type=int, default=16)
+    args = parser.parse_args()
+
+    print(f'{"pool":>4} {"phase":>8} {"req/s":>8} {"p50 ms":>8} {"p95 ms":>8} {"stall ms":>9} {"errors":>6}')
+    for pool_size in args.pool_sizes.split(','):
+        env = {**os.environ, 'PASSWORD_POOL_SIZE': pool_size, 'PASSWORD_POOL_QUEUE': str(args.concurrency)}
+        output = subprocess.run(
+            [sys.executable, '-c', CHILD, str(args.users), str(args.concurrency)],
+            capture_output=True, text=True, check=True, env=env
+        ).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        for name, stats in result.items():
+            print(f'{pool_size:>4} {name:>8} {stats["per_second"]:8.1f} {stats["p50_ms"]:8.1f} '
+                  f'{stats["p95_ms"]:8.1f} {stats["probe_max_ms"]:9.1f} {stats["errors"]:6d}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+"""Compare chat throughput with one request per worker against gevent workers.
+
+Usage:
+    python -m benchmarks.chat_concurrency --requests 200 --latency 0.5 --workers 4
+
+The "sync" run caps concurrency at ``--workers`` the way gunicorn sync workers
+do. The "gevent" run uses a single hub with ``--connections`` greenlets, which
+is what each worker gets with the shipped gunicorn.conf.py.
+"""
+from gevent import monkey
+
+monkey.patch_all()
+
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from gevent.pool import Pool
+
+from benchmarks.fakes import FakeChatModel
+from app.utils.model_graph import build_graph
+
+
+def run_turn(graph):
+    start = time.perf_counter()
+    graph.invoke({"messages": [{"role": "user", "content": "Hello"}]})
+    return time.perf_counter() - start
+
+
+def report(name, total, latencies):
+    latencies = sorted(latencies)
+    p50 = latencies[len(latencies) // 2]
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+    print(f"{name:>7}: {len(latencies) / total:8.1f} req/s  "
+          f"p50 {p50 * 1000:7.1f} ms  p99 {p99 * 1000:7.1f} ms  total {total:.2f} s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--latency', type=float, default=0.5, help='fake LLM latency in seconds')
+    parser.add_argument('--workers', type=int, default=4, help='sync worker count to emulate')
+    parser.add_argument('--connections', type=int, default=500, help='gevent worker_connections')
+    args = parser.parse_args()
+
+    graph = build_graph(FakeChatModel(latency=args.latency), [])
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.workers) as executor:
+        latencies = list(executor.map(lambda _: run_turn(graph), range(args.requests)))
+    report('sync', time.perf_counter() - start, latencies)
+
+    start = time.perf_counter()
+    pool = Pool(args.connections)
+    latencies = pool.map(lambda _: run_turn(graph), range(args.requests))
+    report('gevent', time.perf_counter() - start, latencies)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,145 @@
+"""Local stand-ins for external services used by the benchmarks"""
+import json
+import random
+import time
+import uuid
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.tools import BaseTool
+from pydantic import BaseModel
+
+
+class FakeChatModel(BaseChatModel):
+    """Chat model that answers after a fixed delay instead of calling Bedrock.
+
+    ``latency`` is the time to the first token. With ``tokens_per_second``
+    each word of the answer adds generation time as well. ``search_rate`` is
+    the fraction of turns that first call the ``fake_search`` tool.
+    """
+    latency: float = 0.5
+    tokens_per_second: float = 0.0
+    search_rate: float = 0.0
+    response: str = "This is a canned answer from the fake chat model."
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat"
+
+    def bind_tools(self, tools, **kwargs):
+        return self
+
+    def _wants_search(self, messages) -> bool:
+        return bool(self.search_rate) and messages[-1].type == "human" and random.random() < self.search_rate
+
+    def _search_call(self, messages) -> AIMessage:
+        return AIMessage(content="", tool_calls=[{
+            "name": "fake_search",
+            "args": {"query": str(messages[-1].content)},
+            "id": f"call_{uuid.uuid4().hex[:12]}",
+        }])
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        time.sleep(self.latency)
+        if self._wants_search(messages):
+            return ChatResult(generations=[ChatGeneration(message=self._search_call(messages))])
+        if self.tokens_per_second:
+            time.sleep(len(self.response.split()) / self.tokens_per_second)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=self.response))])
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        time.sleep(self.latency)
+        if self._wants_search(messages):
+            call = self._search_call(messages)
+            yield ChatGenerationChunk(message=AIMessageChunk(content="", tool_call_chunks=[{
+                "name": call.tool_calls[0]["name"],
+                "args": json.dumps(call.tool_calls[0]["args"]),
+                "id": call.tool_calls[0]["id"],
+                "index": 0,
+            }]))
+            return
+        for index, word in enumerate(self.response.split()):
+            if self.tokens_per_second:
+                time.sleep(1 / self.tokens_per_second)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=word if index == 0 else f" {word}"))
+
+
+class SearchInput(BaseModel):
+    query: str
+
+
+class FakeSearchTool(BaseTool):
+    """Search tool with a fixed delay and canned results instead of Tavily"""
+    name: str = "fake_search"
+    description: str = "Search the web for current information."
+    args_schema: type = SearchInput
+    latency: float = 0.2
+
+    def _run(self, query: str, **kwargs):
+        time.sleep(self.latency)
+        return {
+            "query": query,
+            "results": [
+                {"title": f"Result {i} for {query}", "url": f"https://example.com/{i}", "content": "Lorem ipsum."}
+                for i in range(2)
+            ],
+        }
+
+
+class InjectedFault(ConnectionError):
+    """Transient provider failure raised by FaultyChatModel"""
+
+
+class InjectedTimeout(TimeoutError):
+    """Client read timeout raised by FaultyChatModel after a hang"""
+
+
+class FaultyChatModel(FakeChatModel):
+    """Fake chat model that injects provider faults.
+
+    ``script`` is consumed one entry per call: ``"ok"`` answers normally,
+    ``"error"`` raises a transient error, ``"hang"`` stalls for
+    ``hang_seconds`` and then times out like a client read timeout,
+    ``"fatal"`` raises a non-retryable error and ``"partial"`` streams a
+    few tokens before failing. Once the script runs out, calls fail at
+    random with ``failure_rate``.
+    """
+    script: list = []
+    failure_rate: float = 0.0
+    hang_seconds: float = 30.0
+    seed: int = 0
+    calls: int = 0
+
+    def _next_action(self) -> str:
+        import random
+        self.calls += 1
+        if self.script:
+            return self.script.pop(0)
+        return "error" if random.Random(self.seed + self.calls).random() < self.failure_rate else "ok"
+
+    def _fail(self, action):
+        if action == "error":
+            raise InjectedFault("injected transient failure")
+        if action == "fatal":
+            raise ValueError("injected invalid request")
+        if action == "hang":
+            time.sleep(self.hang_seconds)
+            raise InjectedTimeout("injected read timeout")
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        action = self._next_action()
+        # Without streaming there is nothing to interrupt part way
+        self._fail("error" if action == "partial" else action)
+        return super()._generate(messages, stop, run_manager, **kwargs)
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        action = self._next_action()
+        if action == "partial":
+            for index, chunk in enumerate(super()._stream(messages, stop, run_manager, **kwargs)):
+                if index == 2:
+                    raise InjectedFault("injected failure mid-stream")
+                yield chunk
+            return
+        self._fail(action)
+        yield from super()._stream(messages, stop, run_manager, **kwargs)
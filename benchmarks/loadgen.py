@@ -0,0 +1,267 @@
+"""Offline load test of the API against local stand-ins.
+
+Usage:
+    pip install -r benchmarks/requirements.txt
+    python -m benchmarks.loadgen --concurrency 16 --requests 200 \
+        --latency 0.2 --tokens-per-second 50 --search-rate 0.2
+    python -m benchmarks.loadgen --compare benchmarks/results/<earlier run>.json
+
+The app is booted with create_app() in one gevent process, like a single
+gevent gunicorn worker. Bedrock is replaced by FakeChatModel, Tavily by
+FakeSearchTool and MongoDB by mongomock, unless --mongo-uri points at a
+real server. Each endpoint is driven in turn at the given concurrency.
+For each endpoint the test reports requests per second, p50/p95/p99
+latency, error count and Mongo operations per request.
+
+Results are written as JSON to benchmarks/results/, named after the commit,
+so runs on two commits can be compared with --compare.
+"""
+from gevent import monkey
+
+monkey.patch_all()
+
+import os
+
+# Must be set before the app reads its configuration
+os.environ.setdefault('LOG_TO_FILE', 'False')
+os.environ.setdefault('LOG_LEVEL', 'WARNING')
+os.environ.setdefault('CONTEXT_TOKENIZER', 'estimate')
+
+import argparse
+import json
+import platform
+import subprocess
+import time
+import uuid
+from datetime import datetime
+
+from gevent.pool import Pool
+from werkzeug.test import Client
+
+from benchmarks.fakes import FakeChatModel, FakeSearchTool
+
+ENDPOINTS = ('login', 'send', 'quota', 'profile')
+PASSWORD = 'benchmark-password'
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), 'results')
+
+
+class MongoOpCounter:
+    """Counts operations sent to Mongo, either through pymongo's command
+    monitoring or by wrapping mongomock's collection methods"""
+
+    MOCK_METHODS = (
+        'find', 'find_one', 'insert_one', 'insert_many', 'update_one', 'update_many', 'replace_one',
+        'find_one_and_update', 'find_one_and_replace', 'find_one_and_delete', 'delete_one',
+        'delete_many', 'aggregate', 'count_documents', 'bulk_write', 'distinct'
+    )
+
+    def __init__(self):
+        self.count = 0
+
+    def install_mongomock(self):
+        from mongomock.collection import Collection
+
+        for name in self.MOCK_METHODS:
+            method = getattr(Collection, name)
+
+            def counted(collection, *args, _method=method, **kwargs):
+                self.count += 1
+                return _method(collection, *args, **kwargs)
+
+            setattr(Collection, name, counted)
+
+    def install_pymongo(self):
+        from pymongo import monitoring
+
+        counter = self
+
+        class Listener(monitoring.CommandListener):
+            def started(self, event):
+                if event.command_name not in ('hello', 'isMaster', 'ping', 'endSessions'):
+                    counter.count += 1
+
+            def succeeded(self, event):
+                pass
+
+            def failed(self, event):
+                pass
+
+        monitoring.register(Listener())
+
+
+def build_app(args, counter):
+    from app import create_app
+    from app.config import Config
+    from app.utils.model_graph import use_components
+
+    settings = {'host': args.mongo_uri or 'mongodb://localhost/load_test'}
+    if args.mongo_uri:
+        counter.install_pymongo()
+    else:
+        import mongomock
+        counter.install_mongomock()
+        settings['mongo_client_class'] = mongomock.MongoClient
+
+    class LoadTestConfig(Config):
+        MONGODB_SETTINGS = settings
+        # Measure the full pipeline, not the quota or cache short-cuts
+        RATE_LIMIT_PLANS = {'free': 10 ** 9}
+        RESPONSE_CACHE_ENABLED = args.response_cache
+        ADMISSION_MAX_CONCURRENT = max(Config.ADMISSION_MAX_CONCURRENT, args.concurrency)
+        METRICS_ENABLED = True
+
+    app = create_app(LoadTestConfig)
+    use_components(
+        FakeChatModel(latency=args.latency, tokens_per_second=args.tokens_per_second, search_rate=args.search_rate),
+        FakeSearchTool(latency=args.search_latency),
+    )
+    return app
+
+
+def create_users(client, count):
+    prefix = f'load-{uuid.uuid4().hex[:8]}'
+    emails = [f'{prefix}-{i}@example.com' for i in range(count)]
+    for email in emails:
+        response = client.post('/api/auth/register', json={
+            'email': email, 'first_name': 'Load', 'last_name': 'Test', 'password': PASSWORD
+        })
+        assert response.status_code == 201, response.get_json()
+    tokens = []
+    for email in emails:
+        tokens.append(client.post('/api/auth/login', json={'email': email, 'password': PASSWORD}).get_json()['access_token'])
+    return prefix, emails, tokens
+
+
+def make_request(client, endpoint, email, token, state):
+    headers = {'Authorization': f'Bearer {token}'}
+    if endpoint == 'login':
+        return client.post('/api/auth/login', json={'email': email, 'password': PASSWORD})
+    if endpoint == 'send':
+        # Each simulated user keeps talking in one conversation
+        response = client.post('/api/chat/send', headers=headers, json={
+            'message': f'Question {uuid.uuid4().hex[:6]} about the weather?',
+            'context_id': state.get(email)
+        })
+        if response.status_code == 200:
+            state[email] = response.get_json()['context_id']
+        return response
+    if endpoint == 'quota':
+        return client.get('/api/users/quota', headers=headers)
+    return client.get('/api/users/profile', headers=headers)
+
+
+def percentile(values, fraction):
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def run_endpoint(app, endpoint, users, args, counter):
+    emails, tokens = users
+    state = {}
+    ops_before = counter.count
+
+    def one(i):
+        client = Client(app)
+        user = i % len(emails)
+        start = time.perf_counter()
+        response = make_request(client, endpoint, emails[user], tokens[user], state)
+        return time.perf_counter() - start, response.status_code
+
+    start = time.perf_counter()
+    results = Pool(args.concurrency).map(one, range(args.requests))
+    total = time.perf_counter() - start
+
+    latencies = sorted(latency for latency, _ in results)
+    return {
+        'requests': len(results),
+        'requests_per_second': round(len(results) / total, 2),
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 2),
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 2),
+        'errors': sum(1 for _, status in results if status >= 400),
+        'mongo_ops_per_request': round((counter.count - ops_before) / len(results), 2),
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def print_results(results, baseline=None):
+    columns = ('requests_per_second', 'p50_ms', 'p95_ms', 'p99_ms', 'errors', 'mongo_ops_per_request')
+    print(f'{"endpoint":>8} ' + ' '.join(f'{column:>22}' for column in columns))
+    for endpoint, stats in results.items():
+        cells = []
+        for column in columns:
+            cell = f'{stats[column]}'
+            old = (baseline or {}).get(endpoint, {}).get(column)
+            if old:
+                cell += f' ({(stats[column] - old) / old * 100:+.0f}%)'
+            cells.append(f'{cell:>22}')
+        print(f'{endpoint:>8} ' + ' '.join(cells))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--endpoints', default=','.join(ENDPOINTS), help='comma separated subset of ' + ', '.join(ENDPOINTS))
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--requests', type=int, default=200, help='requests per endpoint')
+    parser.add_argument('--users', type=int, default=None, help='distinct users (default: --concurrency)')
+    parser.add_argument('--latency', type=float, default=0.2, help='fake model time to first token, seconds')
+    parser.add_argument('--tokens-per-second', type=float, default=50, help='fake model generation speed')
+    parser.add_argument('--search-rate', type=float, default=0.2, help='fraction of turns that call search')
+    parser.add_argument('--search-latency', type=float, default=0.1, help='fake search delay, seconds')
+    parser.add_argument('--response-cache', action='store_true', help='leave the response cache on')
+    parser.add_argument('--mongo-uri', default=None, help='use a real MongoDB instead of mongomock')
+    parser.add_argument('--output', default=None, help='results file (default: benchmarks/results/<commit>.json)')
+    parser.add_argument('--compare', default=None, help='earlier results file to compare against')
+    args = parser.parse_args()
+
+    counter = MongoOpCounter()
+    app = build_app(args, counter)
+    # Flask 2.2's test_client() predates the pinned Werkzeug 3
+    client = Client(app)
+    prefix, emails, tokens = create_users(client, args.users or args.concurrency)
+
+    results = {}
+    try:
+        for endpoint in args.endpoints.split(','):
+            results[endpoint] = run_endpoint(app, endpoint, (emails, tokens), args, counter)
+    finally:
+        if args.mongo_uri:
+            from app.models.user import User
+            with app.app_context():
+                User.objects(email__startswith=prefix).delete()
+
+    commit = git_commit()
+    report = {
+        'meta': {
+            'commit': commit,
+            'date': datetime.utcnow().isoformat() + 'Z',
+            'python': platform.python_version(),
+            'mongo': 'real' if args.mongo_uri else 'mongomock',
+            'args': {name: value for name, value in vars(args).items() if name not in ('output', 'compare', 'mongo_uri')},
+        },
+        'results': results,
+    }
+    output = args.output or os.path.join(RESULTS_DIR, f'{commit}.json')
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if baseline['meta']['args'] != report['meta']['args']:
+            print('Warning: the runs used different settings, so the comparison may be misleading')
+        baseline = baseline['results']
+    print_results(results, baseline)
+    print(f'Saved to {output}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+"""Compression ratio against read latency for archived chat messages.
+
+Usage:
+    python -m benchmarks.message_compression [--messages 4000] [--window 50]
+    python -m benchmarks.message_compression --from-mongo   # sample real chats
+
+Messages are split in two halves: dictionaries are trained on one and every
+codec is measured on the other. For each codec it prints the compression
+ratio, encode and decode time per message and the time to decode a window
+of ``--window`` messages, which is what reading archived history costs.
+"""
+import argparse
+import random
+import time
+
+import zstandard
+
+WORDS = ("the assistant search result answer question weather forecast price history "
+         "python flask mongo deploy server request response error retry timeout cache "
+         "summary conversation example because however therefore first second finally "
+         "according to recent reports the data shows that users should consider").split()
+PHRASES = [
+    "Here is a summary of what I found:",
+    "Based on the search results, ",
+    "I hope this helps! Let me know if you have any other questions.",
+    "Please note that this information may have changed since it was published.",
+    "1. **Overview**: ",
+    "2. **Details**: ",
+]
+
+
+def synthetic_messages(count: int, seed: int = 0) -> list:
+    rng = random.Random(seed)
+    messages = []
+    for i in range(count):
+        if i % 2 == 0:
+            messages.append(" ".join(rng.choice(WORDS) for _ in range(rng.randint(5, 30))) + "?")
+        else:
+            parts = [rng.choice(PHRASES[:2])]
+            for _ in range(rng.randint(3, 12)):
+                parts.append(rng.choice(PHRASES[4:]) + " ".join(rng.choice(WORDS) for _ in range(rng.randint(10, 40))) + ".")
+            parts.append(rng.choice(PHRASES[2:4]))
+            messages.append("\n".join(parts))
+    return messages
+
+
+def mongo_messages(count: int) -> list:
+    from app import create_app
+    from app.models.chat import Chat
+
+    app = create_app()
+    with app.app_context():
+        texts = []
+        for chat in Chat.objects.only('context_id', 'storage', 'messages', 'summarized_count').order_by('-updated_at'):
+            texts += [message['content'] for message in chat.load_messages() if message.get('content')]
+            if len(texts) >= count:
+                break
+    return texts[:count]
+
+
+def measure(name, compressor, decompressor, messages, window):
+    raw = [message.encode('utf-8') for message in messages]
+    start = time.perf_counter()
+    compressed = [compressor.compress(data) for data in raw]
+    encode = (time.perf_counter() - start) / len(raw)
+
+    start = time.perf_counter()
+    for data in compressed:
+        decompressor.decompress(data)
+    decode = (time.perf_counter() - start) / len(raw)
+
+    ratio = sum(map(len, raw)) / sum(map(len, compressed))
+    print(f'{name:<22} ratio {ratio:5.2f}  encode {encode * 1e6:7.1f} us  decode {decode * 1e6:6.1f} us  '
+          f'window of {window} {decode * window * 1000:6.2f} ms')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--messages', type=int, default=4000)
+    parser.add_argument('--window', type=int, default=50, help='messages per history page')
+    parser.add_argument('--from-mongo', action='store_true', help='use messages from MONGODB_URI')
+    args = parser.parse_args()
+
+    messages = mongo_messages(args.messages) if args.from_mongo else synthetic_messages(args.messages)
+    training, test = messages[::2] + messages[1::4], messages[3::4]
+    print(f'{len(test)} test messages, {sum(len(m) for m in test) / len(test):.0f} bytes on average\n')
+
+    for level in (3, 9, 19):
+        measure(f'zstd-{level}', zstandard.ZstdCompressor(level=level), zstandard.ZstdDecompressor(), test, args.window)
+
+    for size in (16 * 1024, 64 * 1024):
+        dictionary = zstandard.train_dictionary(size, [message.encode('utf-8') for message in training])
+        for level in (3, 9):
+            measure(f'zstd-{level} + {size // 1024}K dict',
+                    zstandard.ZstdCompressor(level=level, dict_data=dictionary),
+                    zstandard.ZstdDecompressor(dict_data=dictionary), test, args.window)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,52 @@
+"""Exercise the resilience layer offline against a fault-injecting fake model.
+
+Usage:
+    python -m benchmarks.resilience
+
+Each scenario builds the chat graph around FaultyChatModel and prints the
+outcome, the number of model calls and the elapsed time.
+"""
+import time
+
+from benchmarks.fakes import FakeChatModel, FaultyChatModel
+from app.utils.model_graph import build_graph
+from app.utils.resilience import RetryPolicy, deadline_scope, get_breaker
+
+POLICY = RetryPolicy(max_retries=2, backoff_base=0.05, backoff_max=0.2)
+
+
+def run(name, llm, fallback=None, deadline=5.0, turns=1):
+    graph = build_graph(llm, [], policy=POLICY, fallback_llm=fallback)
+    outcomes = []
+    start = time.perf_counter()
+    for _ in range(turns):
+        try:
+            with deadline_scope(deadline):
+                resp = graph.invoke({"messages": [{"role": "user", "content": "Hello"}]})
+            outcomes.append("answer" if resp["messages"][-1].content else "empty")
+        except Exception as e:
+            outcomes.append(type(e).__name__)
+    elapsed = time.perf_counter() - start
+    summary = ", ".join(f"{outcome} x{outcomes.count(outcome)}" for outcome in dict.fromkeys(outcomes))
+    print(f"{name:<34} {summary:<40} calls {llm.calls:<3} {elapsed:6.2f} s")
+
+
+def main():
+    for breaker in ("model", "fallback_model"):
+        get_breaker(breaker).record_success()
+
+    run("transient errors then success", FaultyChatModel(latency=0.01, script=["error", "error", "ok"]))
+    run("errors exhaust retries", FaultyChatModel(latency=0.01, script=["error"] * 3))
+    get_breaker("model").record_success()
+    run("non-retryable error", FaultyChatModel(latency=0.01, script=["fatal"]))
+    run("read timeout then success", FaultyChatModel(latency=0.01, script=["hang", "ok"], hang_seconds=0.5))
+    run("deadline spent by a timed-out call", FaultyChatModel(latency=0.01, script=["hang", "ok"], hang_seconds=0.5),
+        deadline=0.3)
+    get_breaker("model").record_success()
+    run("fallback model", FaultyChatModel(latency=0.01, script=["error"] * 3), fallback=FakeChatModel(latency=0.01))
+    get_breaker("model").record_success()
+    run("circuit opens under outage", FaultyChatModel(latency=0.01, failure_rate=1.0), turns=5)
+
+
+if __name__ == "__main__":
+    main()
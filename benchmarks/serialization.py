@@ -0,0 +1,82 @@
+"""Compare JSON serialization and compression cost against bytes saved.
+
+Usage:
+    python -m benchmarks.serialization [--messages 200] [--repeat 200]
+
+Payloads mimic the API: a single chat answer, a page of message history
+and a page of the conversation list. For each payload it prints the time to
+serialize with the stdlib json module (Flask's default) and with orjson, then
+for gzip and zstd at a few levels the compression time, size and ratio.
+"""
+import argparse
+import gzip
+import json
+import time
+import uuid
+from datetime import datetime
+
+import orjson
+import zstandard
+
+SENTENCE = ("The assistant explains the answer step by step, citing the search results "
+            "it found and noting anything that is uncertain. ")
+
+
+def payloads(messages: int) -> dict:
+    history = [
+        {'seq': i, 'role': 'user' if i % 2 == 0 else 'assistant', 'content': SENTENCE * (1 if i % 2 == 0 else 6)}
+        for i in range(messages)
+    ]
+    return {
+        'chat answer': {
+            'response': SENTENCE * 12,
+            'context_id': str(uuid.uuid4()),
+            'success': True,
+            'quota': {'remaining_requests': 12, 'max_requests': 15, 'reset_time': datetime.utcnow().isoformat() + 'Z'},
+        },
+        'message history': {'context_id': str(uuid.uuid4()), 'messages': history, 'message_count': messages,
+                            'next_before': None},
+        'conversation list': {'conversations': [
+            {'context_id': str(uuid.uuid4()), 'preview': SENTENCE[:100], 'message_count': 12,
+             'created_at': datetime.utcnow().isoformat(), 'updated_at': datetime.utcnow().isoformat()}
+            for _ in range(50)
+        ], 'next_cursor': None},
+    }
+
+
+def timed(fn, repeat: int) -> float:
+    """Returns (mean seconds per call, last result)"""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    elapsed = (time.perf_counter() - start) / repeat
+    return elapsed, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--messages', type=int, default=200, help='messages in the history payload')
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+
+    for name, payload in payloads(args.messages).items():
+        stdlib_time, text = timed(lambda: json.dumps(payload, sort_keys=True).encode(), args.repeat)
+        orjson_time, data = timed(lambda: orjson.dumps(payload), args.repeat)
+        print(f'\n{name}: {len(data):,} bytes')
+        print(f'  {"json (stdlib)":<14} {stdlib_time * 1e6:9.1f} us')
+        print(f'  {"orjson":<14} {orjson_time * 1e6:9.1f} us  ({stdlib_time / orjson_time:.1f}x faster)')
+
+        codecs = [(f'gzip-{level}', lambda level=level: gzip.compress(data, compresslevel=level, mtime=0))
+                  for level in (1, 6, 9)]
+        codecs += [(f'zstd-{level}', lambda level=level: zstandard.ZstdCompressor(level=level).compress(data))
+                   for level in (1, 3, 9)]
+        for codec, compress in codecs:
+            seconds, compressed = timed(compress, args.repeat)
+            saved = len(data) - len(compressed)
+            print(f'  {codec:<14} {seconds * 1e6:9.1f} us  {len(compressed):>9,} bytes  '
+                  f'ratio {len(data) / len(compressed):5.1f}  saved {saved:,} bytes '
+                  f'({saved / max(seconds * 1e6, 1e-9):,.0f} bytes/us)')
+
+
+if __name__ == '__main__':
+    main()
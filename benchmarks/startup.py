@@ -0,0 +1,53 @@
+"""Measure application startup cost.
+
+Usage:
+    python -m benchmarks.startup [--warm-up] [--runs 5]
+
+Each run starts a fresh interpreter and records, in milliseconds, the time
+to import the app package, to run create_app() and, with --warm-up, to build
+the model clients and graphs (this needs AWS and Tavily credentials).
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+
+CHILD = '''
+import json, sys, time
+start = time.perf_counter()
+import app
+imported = time.perf_counter()
+application = app.create_app()
+created = time.perf_counter()
+result = {"import_ms": (imported - start) * 1000, "create_app_ms": (created - imported) * 1000}
+if sys.argv[1] == "1":
+    from app.utils.model_graph import warm_up
+    warm_up()
+    result["warm_up_ms"] = (time.perf_counter() - created) * 1000
+result["modules"] = len(sys.modules)
+print(json.dumps(result))
+'''
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--warm-up', action='store_true', help='also time building the model graph')
+    args = parser.parse_args()
+
+    runs = []
+    for _ in range(args.runs):
+        output = subprocess.run(
+            [sys.executable, '-c', CHILD, '1' if args.warm_up else '0'],
+            capture_output=True, text=True, check=True
+        ).stdout
+        runs.append(json.loads(output.strip().splitlines()[-1]))
+
+    for metric in runs[0]:
+        values = [run[metric] for run in runs]
+        print(f'{metric:>14}: median {statistics.median(values):9.1f}  min {min(values):9.1f}  max {max(values):9.1f}')
+
+
+if __name__ == '__main__':
+    main()
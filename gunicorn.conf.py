@@ -0,0 +1,74 @@
+import multiprocessing
+import os
+
+# Chat requests spend almost all their time waiting on Bedrock and Tavily,
+# so each worker runs a gevent hub and serves many conversations at once
+# instead of blocking one OS thread per request.
+bind = os.getenv('GUNICORN_BIND', '127.0.0.1:8000')
+worker_class = os.getenv('GUNICORN_WORKER_CLASS', 'gevent')
+workers = int(os.getenv('GUNICORN_WORKERS', multiprocessing.cpu_count()))
+worker_connections = int(os.getenv('GUNICORN_WORKER_CONNECTIONS', 500))
+# The gevent worker also serves the /chat Socket.IO channel: each open
+# socket holds one of worker_connections, upgraded via simple-websocket
+
+# Streamed and tool-heavy turns can legitimately run long
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 120))
+graceful_timeout = int(os.getenv('GUNICORN_GRACEFUL_TIMEOUT', 30))
+keepalive = int(os.getenv('GUNICORN_KEEPALIVE', 5))
+
+accesslog = '-'
+errorlog = '-'
+
+# Build the model clients and graphs before the first request.
+# MODEL_WARMUP=pre_fork builds them once in the master and needs
+# GUNICORN_PRELOAD=True; post_fork builds them in each worker as it starts.
+preload_app = os.getenv('GUNICORN_PRELOAD', 'False').lower() == 'true'
+model_warmup = os.getenv('MODEL_WARMUP', 'post_fork')
+
+# gevent workers monkey-patch after the fork, so boto3 clients (urllib3
+# pools, locks) built in the master can hang them. pre_fork is only
+# honoured for other worker classes.
+pre_fork_refused = model_warmup == 'pre_fork' and worker_class.startswith('gevent')
+if pre_fork_refused:
+    model_warmup = 'post_fork'
+
+
+def _warm_up(log):
+    try:
+        from app.utils.model_graph import warm_up
+        warm_up()
+    except Exception as e:
+        # Not fatal: the graph is built on the first request instead
+        log.warning(f'Model warm-up failed: {e}')
+
+
+def when_ready(server):
+    if pre_fork_refused:
+        server.log.warning('MODEL_WARMUP=pre_fork is not supported with gevent workers, warming up post_fork')
+    if model_warmup == 'pre_fork' and preload_app:
+        _warm_up(server.log)
+
+
+def child_exit(server, worker):
+    # Drop the exited worker's live gauges from the shared metrics files
+    if os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
+
+
+def post_worker_init(worker):
+    # After gevent has patched the worker, so the pool is not built pre-patch
+    from app.utils.password_hasher import password_hasher
+    password_hasher.start()
+
+    if model_warmup == 'post_fork' or (model_warmup == 'pre_fork' and not preload_app):
+        _warm_up(worker.log)
+
+    # Each web worker also runs JOB_WORKERS background chat jobs
+    if worker.wsgi.config['JOB_WORKERS'] > 0:
+        from app.utils.job_queue import job_workers
+        job_workers.start(worker.wsgi)
+
+    if worker.wsgi.config['EMAIL_SENDER_ENABLED']:
+        from app.utils.email_outbox import email_sender
+        email_sender.start(worker.wsgi)
@@ -0,0 +1,69 @@
+"""Shared fixtures: the app on mongomock with local stand-ins for Bedrock and Tavily.
+
+Usage:
+    pip install -r tests/requirements.txt
+    python -m pytest tests
+"""
+import uuid
+
+import mongomock
+import pytest
+from werkzeug.test import Client
+
+from app import create_app
+from app.config import Config
+from app.utils import resilience
+from app.utils.model_graph import use_components
+from benchmarks.fakes import FakeChatModel, FakeSearchTool
+
+PASSWORD = 'test-password'
+
+
+class TestConfig(Config):
+    TESTING = True
+    MONGODB_SETTINGS = {'host': 'mongodb://localhost/tests', 'mongo_client_class': mongomock.MongoClient}
+    RESPONSE_CACHE_ENABLED = False
+    PASSWORD_POOL_SIZE = 0
+    METRICS_ENABLED = False
+    ARCHIVE_ENABLED = False
+
+
+@pytest.fixture(scope='session')
+def app():
+    return create_app(TestConfig)
+
+
+@pytest.fixture(autouse=True)
+def reset_breakers():
+    # Breakers are per process; start every test with all circuits closed
+    resilience._breakers.clear()
+    yield
+    resilience._breakers.clear()
+
+
+@pytest.fixture
+def client(app):
+    # Flask 2.2's FlaskClient predates the pinned Werkzeug 3; the plain
+    # Werkzeug client covers what the tests need
+    return Client(app)
+
+
+@pytest.fixture
+def use_model():
+    """Build the chat graphs around the given fake model(s)"""
+    def use(llm, fallback_llm=None):
+        use_components(llm, FakeSearchTool(latency=0), fallback_llm)
+        return llm
+    yield use
+    use_components(FakeChatModel(latency=0), FakeSearchTool(latency=0))
+
+
+@pytest.fixture
+def auth_headers(client):
+    email = f'test-{uuid.uuid4().hex[:8]}@example.com'
+    response = client.post('/api/auth/register', json={
+        'email': email, 'first_name': 'Test', 'last_name': 'User', 'password': PASSWORD
+    })
+    assert response.status_code == 201, response.get_json()
+    token = client.post('/api/auth/login', json={'email': email, 'password': PASSWORD}).get_json()['access_token']
+    return {'Authorization': f'Bearer {token}'}
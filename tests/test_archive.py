@@ -0,0 +1,64 @@
+import uuid
+from datetime import datetime
+
+from app.models.chat import Chat
+from app.models.chat_message import ChatMessage
+from app.utils.message_codec import message_codec
+
+LONG = 'A message long enough to be worth compressing when it is archived. ' * 8
+
+
+def conversation(count):
+    return [{'role': 'user' if i % 2 == 0 else 'assistant', 'content': f'{i}: {LONG}'} for i in range(count)]
+
+
+def new_chat(storage, messages, **fields):
+    chat = Chat(user_id='archive-user', context_id=str(uuid.uuid4()), storage=storage,
+                ttl=datetime.utcnow() + Chat.TTL, **fields).save()
+    chat.append_messages(messages)
+    return chat
+
+
+def stored_messages(chat):
+    if chat.storage == Chat.STORAGE_COLLECTION:
+        return list(ChatMessage._get_collection().find({'context_id': chat.context_id}).sort('seq', 1))
+    return Chat._get_collection().find_one({'_id': chat.pk})['messages']
+
+
+def test_summarized_messages_are_archived_and_read_back(app):
+    messages = conversation(6)
+    with app.app_context():
+        for storage in (Chat.STORAGE_EMBEDDED, Chat.STORAGE_COLLECTION):
+            chat = new_chat(storage, messages)
+            chat.update_summary('Summary', 4)
+            chat.summarized_count = 4
+            assert chat.archive_messages() == 4
+            # Nothing new to archive until the summary moves on
+            assert chat.archive_messages() == 0
+
+            archived = [message_codec.is_encoded(message) for message in stored_messages(chat)]
+            assert archived == [True] * 4 + [False] * 2
+            assert [message['content'] for message in chat.load_messages()] == [m['content'] for m in messages]
+
+
+def test_migration_covers_chats_that_were_never_summarized(app):
+    runner = app.test_cli_runner()
+    messages = conversation(12)
+    with app.app_context():
+        legacy = new_chat(Chat.STORAGE_EMBEDDED, messages)
+        Chat._get_collection().update_one({'_id': legacy.pk}, {'$unset': {'archived_count': 1, 'summarized_count': 1}})
+
+        result = runner.invoke(args=['chats', 'archive-messages'])
+        assert result.exit_code == 0, result.output
+        assert not any(message_codec.is_encoded(message) for message in stored_messages(legacy))
+
+        result = runner.invoke(args=['chats', 'archive-messages', '--keep-recent', '4'])
+        assert result.exit_code == 0, result.output
+        archived = [message_codec.is_encoded(message) for message in stored_messages(legacy)]
+        assert archived == [True] * 8 + [False] * 4
+
+        legacy = Chat.objects.get(id=legacy.id)
+        assert legacy.archived_count == 8
+        assert [message['content'] for message in legacy.load_messages()] == [m['content'] for m in messages]
+        # A second run finds nothing left to do for this chat
+        assert legacy.archive_messages(keep_recent=4) == 0
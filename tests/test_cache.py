@@ -0,0 +1,131 @@
+import threading
+
+import pytest
+
+from app.utils import cache as cache_module
+from app.utils.cache import RedisCacheTier, SingleFlight, TieredCache, TTLCache
+from app.utils.chat_service import get_chat_session, run_chat_turn
+from app.utils.response_cache import response_cache
+from benchmarks.fakes import FaultyChatModel
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cache_module.time, 'monotonic', lambda: now[0])
+    return now
+
+
+def test_entries_expire_after_their_ttl(clock):
+    cache = TTLCache(maxsize=10, ttl=30)
+    cache.set('default', 'a')
+    cache.set('short', 'b', ttl=5)
+
+    clock[0] += 10
+    assert cache.get('short') is None
+    assert cache.get('default') == 'a'
+    clock[0] += 20
+    assert cache.get('default') is None
+    assert cache.stats() == {'size': 0, 'hits': 1, 'misses': 2}
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = TTLCache(maxsize=2, ttl=60)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    cache.get('a')
+    cache.set('c', 3)
+    assert cache.get('b') is None
+    assert (cache.get('a'), cache.get('c')) == (1, 3)
+    assert len(cache) == 2
+
+
+def test_shared_hit_is_promoted_to_the_local_tier():
+    shared = RedisCacheTier('tests', ttl=60)
+    writer = TieredCache(TTLCache(10, 60), shared)
+    reader = TieredCache(TTLCache(10, 60), shared)
+    writer.set('key', {'answer': 42})
+
+    assert reader.get('key') == {'answer': 42}
+    assert reader.local.get('key') == {'answer': 42}
+    assert reader.get('key') == {'answer': 42}
+    assert reader.stats()['shared_hits'] == 1
+
+    writer.delete('key')
+    assert writer.get('key') is None
+    assert shared.get('key') is None
+
+
+def collapse(flight, fn, callers=5):
+    """Run fn through flight.do from several threads at once; returns what each got"""
+    outcomes = []
+    threads = [threading.Thread(target=lambda: outcomes.append(call(flight, fn))) for _ in range(callers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return outcomes
+
+
+def call(flight, fn):
+    try:
+        return flight.do('key', fn, timeout=5)
+    except Exception as e:
+        return e
+
+
+def test_single_flight_runs_concurrent_callers_once():
+    flight = SingleFlight()
+    release = threading.Event()
+    loads = []
+
+    def load():
+        loads.append(1)
+        release.wait(5)
+        return 'value'
+
+    threading.Timer(0.2, release.set).start()
+    assert collapse(flight, load) == ['value'] * 5
+    assert len(loads) == 1
+
+
+def test_single_flight_error_reaches_every_waiter():
+    flight = SingleFlight()
+    release = threading.Event()
+    loads = []
+
+    def load():
+        loads.append(1)
+        release.wait(5)
+        raise ConnectionError('backend down')
+
+    threading.Timer(0.2, release.set).start()
+    outcomes = collapse(flight, load)
+    assert len(loads) == 1
+    assert all(isinstance(outcome, ConnectionError) for outcome in outcomes)
+    # Errors are not remembered
+    assert flight.do('key', lambda: 'recovered') == 'recovered'
+
+
+@pytest.fixture
+def response_caching(app):
+    app.config['RESPONSE_CACHE_ENABLED'] = True
+    response_cache.init_app(app)
+    yield response_cache
+    app.config['RESPONSE_CACHE_ENABLED'] = False
+    response_cache.cache = None
+
+
+def test_opening_message_is_answered_from_the_cache(app, use_model, response_caching):
+    model = use_model(FaultyChatModel(latency=0))
+    with app.app_context():
+        answers = []
+        for message in ('What is  Flask?', 'what is flask?'):
+            chat_session, context_id = get_chat_session('cache-user')
+            answers.append(run_chat_turn(chat_session, {'message': message}))
+        assert answers[0] == answers[1]
+        assert model.calls == 1
+
+        # Follow-up turns are never cached
+        run_chat_turn(chat_session, {'message': 'What is Flask?', 'context_id': context_id})
+        assert model.calls == 2
@@ -0,0 +1,67 @@
+import pytest
+
+from app.utils.cache import TieredCache, TTLCache
+from app.utils.cached_tool import CachedTool
+from app.utils.resilience import CircuitBreaker, CircuitOpenError, ProviderError, RetryPolicy
+from benchmarks.fakes import FakeSearchTool, InjectedFault
+
+POLICY = RetryPolicy(max_retries=1, backoff_base=0.01, backoff_max=0.02)
+
+
+class ScriptedSearchTool(FakeSearchTool):
+    """``script`` entries: "ok", "error" raises, "payload" returns a Tavily-style error"""
+    latency: float = 0
+    script: list = []
+    calls: int = 0
+
+    def _run(self, query: str, **kwargs):
+        self.calls += 1
+        action = self.script.pop(0) if self.script else 'ok'
+        if action == 'error':
+            raise InjectedFault('search unavailable')
+        if action == 'payload':
+            return {'error': 'rate limited'}
+        return super()._run(query, **kwargs)
+
+
+def cached(tool, **kwargs):
+    return CachedTool(tool, TieredCache(TTLCache(100, 60)), **kwargs)
+
+
+def test_identical_queries_are_served_from_the_cache():
+    inner = ScriptedSearchTool()
+    tool = cached(inner)
+    first = tool.invoke({'query': 'Weather in Paris?'})
+    assert tool.invoke({'query': '  weather   in paris '}) == first
+    assert inner.calls == 1
+
+    tool.invoke({'query': 'Weather in Rome'})
+    assert inner.calls == 2
+
+
+def test_failures_are_not_cached():
+    inner = ScriptedSearchTool(script=['error', 'payload'])
+    tool = cached(inner)
+    with pytest.raises(InjectedFault):
+        tool.invoke({'query': 'news'})
+    with pytest.raises(ProviderError):
+        tool.invoke({'query': 'news'})
+
+    assert tool.invoke({'query': 'news'})['query'] == 'news'
+    assert tool.invoke({'query': 'news'})['query'] == 'news'
+    assert inner.calls == 3
+
+
+def test_breaker_opens_and_stops_calling_the_tool():
+    inner = ScriptedSearchTool(script=['error'] * 10)
+    breaker = CircuitBreaker('test-search', failure_threshold=2, reset_timeout=60)
+    tool = cached(inner, policy=POLICY, breaker=breaker)
+
+    # One call with its retry is enough to reach the threshold
+    with pytest.raises(InjectedFault):
+        tool.invoke({'query': 'news'})
+    assert breaker.state == 'open'
+
+    with pytest.raises(CircuitOpenError):
+        tool.invoke({'query': 'something else'})
+    assert inner.calls == POLICY.max_retries + 1
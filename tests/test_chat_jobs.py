@@ -0,0 +1,93 @@
+import time
+
+from app.models.chat import Chat
+from app.models.chat_job import ChatJob
+from app.utils.admission import admission
+from app.utils.chat_service import get_chat_session
+from app.utils.job_queue import JobWorkerPool, job_workers
+from app.utils.rate_limit import rate_limiter
+from benchmarks.fakes import FakeChatModel, FaultyChatModel
+
+
+LOCAL = {'REMOTE_ADDR': '127.0.0.1'}
+
+
+def test_job_stats_are_internal(client):
+    assert client.get('/api/chat/jobs/stats', environ_base=LOCAL).status_code == 200
+    assert client.get('/api/chat/jobs/stats', environ_base=LOCAL,
+                      headers={'X-Forwarded-For': '203.0.113.7'}).status_code == 401
+    assert client.get('/api/chat/jobs/stats', environ_base={'REMOTE_ADDR': '203.0.113.7'}).status_code == 401
+
+
+def test_rerun_job_records_its_turn_once(app, use_model):
+    use_model(FakeChatModel(latency=0))
+    with app.app_context():
+        chat_session, context_id = get_chat_session('job-user')
+        job = ChatJob(user_id='job-user', context_id=context_id, new_conversation=True, message='Hello')
+        job.save()
+
+        # The first worker stalls past its lease and a second one re-runs the job
+        stalled = ChatJob.claim(lease_seconds=-1)
+        job_workers.process(ChatJob.claim(lease_seconds=60))
+        job_workers.process(stalled)
+
+        chat = Chat.objects.get(context_id=context_id)
+        assert chat.message_count == 2
+        assert ChatJob.objects.get(id=job.id).status == ChatJob.STATUS_SUCCEEDED
+
+
+def test_job_reclaimed_after_its_lease_is_refunded_once(app, use_model):
+    use_model(FaultyChatModel(latency=0, script=['fatal', 'fatal']))
+    with app.app_context():
+        chat_session, context_id = get_chat_session('lease-user')
+        job = ChatJob(user_id='lease-user', context_id=context_id, message='Hello', request_limit=5)
+        job.save()
+        for _ in range(2):
+            rate_limiter.consume('lease-user', 5)
+
+        stalled = ChatJob.claim(lease_seconds=-1)
+        current = ChatJob.claim(lease_seconds=60)
+        assert current.id == stalled.id and current.attempts == 2
+
+        # The worker whose lease lapsed can no longer finish the job
+        job_workers.process(stalled)
+        assert ChatJob.objects.get(id=job.id).status == ChatJob.STATUS_RUNNING
+        assert rate_limiter.peek('lease-user', 5).remaining == 3
+
+        job_workers.process(current)
+        assert ChatJob.objects.get(id=job.id).status == ChatJob.STATUS_FAILED
+        assert rate_limiter.peek('lease-user', 5).remaining == 4
+
+
+def wait_for(condition, timeout=5):
+    give_up_at = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < give_up_at
+        time.sleep(0.05)
+
+
+def test_job_waits_in_the_queue_while_no_slot_is_free(app, use_model):
+    use_model(FakeChatModel(latency=0))
+    slots = [admission.acquire() for _ in range(admission.max_concurrent)]
+    pool = JobWorkerPool()
+    try:
+        with app.app_context():
+            chat_session, context_id = get_chat_session('queued-user')
+            job = ChatJob(user_id='queued-user', context_id=context_id, new_conversation=True, message='Hello')
+            job.save()
+
+            pool.start(app, workers=1)
+            time.sleep(app.config['JOB_POLL_INTERVAL'] * 1.5)
+            job.reload()
+            assert job.status == ChatJob.STATUS_QUEUED
+            assert job.attempts == 0
+
+            for release in slots:
+                release()
+            slots = []
+            wait_for(lambda: ChatJob.objects.get(id=job.id).status == ChatJob.STATUS_SUCCEEDED)
+            assert ChatJob.objects.get(id=job.id).attempts == 1
+    finally:
+        pool.stop(timeout=5)
+        for release in slots:
+            release()
@@ -0,0 +1,45 @@
+from datetime import datetime
+
+import pytest
+
+from app import socketio
+from app.models.chat import Chat
+from app.routes.chat_socket import NAMESPACE
+from app.utils.chat_service import get_chat_session
+
+
+def token(headers):
+    return headers['Authorization'].split(' ', 1)[1]
+
+
+def connect(app, **kwargs):
+    return socketio.test_client(app, namespace=NAMESPACE, **kwargs)
+
+
+def test_token_is_only_accepted_from_auth(app, auth_headers):
+    assert connect(app, auth={'token': token(auth_headers)}).is_connected(NAMESPACE)
+    with pytest.raises(ConnectionRefusedError):
+        connect(app, query_string=f'token={token(auth_headers)}')
+    with pytest.raises(ConnectionRefusedError):
+        connect(app)
+
+
+def test_rejected_message_gets_an_error_event(app, auth_headers):
+    socket = connect(app, auth={'token': token(auth_headers)})
+    socket.emit('send', {'request_id': 'r1'}, namespace=NAMESPACE)
+    events = socket.get_received(NAMESPACE)
+    assert [(event['name'], event['args'][0]['status'], event['args'][0]['request_id']) for event in events] == \
+        [('error', 400, 'r1')]
+
+
+def test_turn_loads_the_summary_and_the_messages_after_it(app):
+    messages = [{'role': 'user', 'content': str(index)} for index in range(6)]
+    with app.app_context():
+        Chat(user_id='tail-user', context_id='tail', messages=messages, message_count=6, summary='Earlier',
+             summarized_count=4, ttl=datetime.utcnow() + Chat.TTL).save()
+
+        chat_session, _ = get_chat_session('tail-user', 'tail')
+        assert chat_session.summary == 'Earlier'
+        assert chat_session.messages == messages[4:]
+        assert chat_session.load_messages(start=4) == messages[4:]
+        assert chat_session.load_messages() == messages
@@ -0,0 +1,66 @@
+import uuid
+from datetime import datetime
+
+import mongomock
+import pytest
+from pymongo.errors import AutoReconnect
+
+from app.models.chat import Chat
+from app.models.chat_message import ChatMessage
+
+TURN = [{'role': 'user', 'content': 'Hello'}, {'role': 'assistant', 'content': 'Hi'}]
+
+
+def new_chat(storage, **fields):
+    chat = Chat(user_id='storage-user', context_id=str(uuid.uuid4()), storage=storage,
+                ttl=datetime.utcnow() + Chat.TTL, **fields)
+    return chat.save()
+
+
+def test_failed_insert_leaves_no_gap(app, monkeypatch):
+    with app.app_context():
+        chat = new_chat(Chat.STORAGE_COLLECTION)
+        assert chat.append_messages(TURN, turn_id='turn-1')
+
+        def unavailable(self, *args, **kwargs):
+            raise AutoReconnect('primary stepped down')
+        with monkeypatch.context() as patch:
+            patch.setattr(mongomock.Collection, 'insert_many', unavailable)
+            with pytest.raises(AutoReconnect):
+                chat.append_messages(TURN, turn_id='turn-2')
+
+        stored = Chat.objects.get(id=chat.id)
+        assert stored.message_count == 2
+        assert 'turn-2' not in stored.recorded_turns
+
+        # The retried turn is recorded right after the first one
+        assert chat.append_messages(TURN, turn_id='turn-2')
+        assert not chat.append_messages(TURN, turn_id='turn-2')
+        seqs = [row.seq for row in ChatMessage.objects(context_id=chat.context_id).order_by('seq')]
+        assert seqs == [0, 1, 2, 3]
+        assert Chat.objects.get(id=chat.id).message_count == 4
+
+
+def test_append_goes_after_rows_the_count_has_not_caught_up_with(app):
+    with app.app_context():
+        chat = new_chat(Chat.STORAGE_COLLECTION)
+        # A concurrent append that has inserted its rows but not yet moved the count
+        ChatMessage(user_id=chat.user_id, context_id=chat.context_id, seq=0, role='user', content='First').save()
+
+        assert chat.append_messages(TURN)
+        messages, _, total = Chat.objects.get(id=chat.id).message_window(10)
+        assert [message['content'] for message in messages] == ['First', 'Hello', 'Hi']
+        assert total == 3
+
+
+def test_backfill_counts_legacy_chats(app):
+    with app.app_context():
+        legacy = new_chat(Chat.STORAGE_EMBEDDED, messages=TURN * 2)
+        Chat._get_collection().update_one({'_id': legacy.id}, {'$unset': {'message_count': 1}})
+        current = new_chat(Chat.STORAGE_EMBEDDED)
+        current.append_messages(TURN)
+
+        assert Chat.backfill_message_counts() >= 1
+        assert Chat.objects.get(id=legacy.id).message_count == 4
+        assert Chat.objects.get(id=current.id).message_count == 2
+        assert Chat.backfill_message_counts() == 0
@@ -0,0 +1,92 @@
+import uuid
+
+import pytest
+
+from app.utils.model_graph import _components, get_checkpointed_graph, graph_input_for_thread, invoke_graph
+from benchmarks.fakes import FakeChatModel, FakeSearchTool
+
+
+class WorkerKilled(BaseException):
+    """Stands in for the worker dying; not an Exception, so nothing handles it"""
+
+
+class DyingSearchTool(FakeSearchTool):
+    latency: float = 0
+    calls: int = 0
+    die_on: tuple = (1,)
+
+    def _run(self, query: str, **kwargs):
+        self.calls += 1
+        if self.calls in self.die_on:
+            raise WorkerKilled()
+        return super()._run(query, **kwargs)
+
+
+def config(thread_id):
+    return {'configurable': {'thread_id': thread_id}}
+
+
+def seed(content):
+    return lambda: [{'role': 'user', 'content': content}]
+
+
+def test_thread_round_trip(app, use_model):
+    use_model(FakeChatModel(latency=0))
+    thread_id = str(uuid.uuid4())
+    with app.app_context():
+        invoke_graph(graph_input_for_thread(thread_id, [], seed('Hello')), thread_id)
+        invoke_graph(graph_input_for_thread(thread_id, [{'role': 'user', 'content': 'Again'}], None), thread_id)
+
+        saver = _components.get().checkpointer
+        latest = saver.get_tuple(config(thread_id))
+        messages = latest.checkpoint['channel_values']['messages']
+        assert [message.type for message in messages] == ['human', 'ai', 'human', 'ai']
+        assert messages[2].content == 'Again'
+
+        history = list(saver.list(config(thread_id)))
+        assert history[0].config == latest.config
+        assert [item.checkpoint['id'] for item in history] == sorted(
+            (item.checkpoint['id'] for item in history), reverse=True)
+        assert len(list(saver.list(config(thread_id), limit=2))) == 2
+        # An earlier checkpoint still sees only the messages it had
+        parent = saver.get_tuple(latest.parent_config)
+        assert len(parent.checkpoint['channel_values']['messages']) < 4
+
+
+@pytest.fixture
+def dying_search(use_model):
+    # use_model puts the usual fakes back afterwards
+    tool = DyingSearchTool()
+    _components.use(FakeChatModel(latency=0, search_rate=1.0), tool)
+    return tool
+
+
+def test_retried_message_resumes_the_interrupted_tool_call(app, dying_search):
+    thread_id = str(uuid.uuid4())
+    with app.app_context():
+        with pytest.raises(WorkerKilled):
+            invoke_graph(graph_input_for_thread(thread_id, [], seed('Search this')), thread_id)
+        assert get_checkpointed_graph().get_state(config(thread_id)).next == ('tools',)
+
+        # The same message again continues from the tool call
+        graph_input = graph_input_for_thread(thread_id, [{'role': 'user', 'content': 'Search this'}], None)
+        assert graph_input is None
+        result = invoke_graph(graph_input, thread_id)
+        assert [message.type for message in result['messages']] == ['human', 'ai', 'tool', 'ai']
+        assert dying_search.calls == 2
+
+
+def test_new_message_closes_the_interrupted_tool_call(app, dying_search):
+    thread_id = str(uuid.uuid4())
+    with app.app_context():
+        with pytest.raises(WorkerKilled):
+            invoke_graph(graph_input_for_thread(thread_id, [], seed('Search this')), thread_id)
+
+        graph_input = graph_input_for_thread(thread_id, [{'role': 'user', 'content': 'Never mind'}], None)
+        cancelled = graph_input['messages'][0]
+        assert cancelled.type == 'tool' and cancelled.content.startswith('Cancelled')
+
+        result = invoke_graph(graph_input, thread_id)
+        types = [message.type for message in result['messages']]
+        assert types[:4] == ['human', 'ai', 'tool', 'human']
+        assert result['messages'][3].content == 'Never mind'
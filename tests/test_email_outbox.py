@@ -0,0 +1,111 @@
+import socketserver
+import threading
+import time
+
+import pytest
+
+from app.models.outbox_email import OutboxEmail
+from app.utils.email import mail
+from app.utils.email_outbox import email_sender
+
+
+class SMTPHandler(socketserver.StreamRequestHandler):
+    """Just enough SMTP for smtplib to deliver a message"""
+
+    def reply(self, line):
+        self.wfile.write(f'{line}\r\n'.encode())
+
+    def handle(self):
+        self.reply('220 localhost ready')
+        recipients = []
+        for raw in self.rfile:
+            command = raw.decode().strip()
+            verb = command.split(' ', 1)[0].upper()
+            if verb in ('EHLO', 'HELO'):
+                self.reply('250 localhost')
+            elif verb == 'RCPT':
+                recipients.append(command.split(':', 1)[1].strip('<> '))
+                self.reply('250 OK')
+            elif verb == 'DATA':
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+                lines = []
+                for line in self.rfile:
+                    if line == b'.\r\n':
+                        break
+                    lines.append(line.decode())
+                self.server.received.append((recipients, ''.join(lines)))
+                recipients = []
+                self.reply('250 OK')
+            elif verb == 'QUIT':
+                self.reply('221 Bye')
+                return
+            else:
+                self.reply('250 OK')
+
+
+@pytest.fixture
+def smtp_server(app):
+    server = socketserver.ThreadingTCPServer(('127.0.0.1', 0), SMTPHandler)
+    server.daemon_threads = True
+    server.received = []
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    overrides = {'MAIL_SERVER': '127.0.0.1', 'MAIL_PORT': server.server_address[1],
+                 'MAIL_USE_TLS': False, 'MAIL_USERNAME': None, 'MAIL_PASSWORD': None,
+                 # Flask-Mail suppresses sending under TESTING
+                 'MAIL_SUPPRESS_SEND': False}
+    saved = {name: app.config[name] for name in overrides if name in app.config}
+    app.config.update(overrides)
+    mail.init_app(app)
+    yield server
+    for name in overrides:
+        app.config.pop(name)
+    app.config.update(saved)
+    mail.init_app(app)
+    server.shutdown()
+    server.server_close()
+
+
+def enqueue(recipient):
+    return OutboxEmail.enqueue('Hello', 'noreply@example.com', [recipient], 'Hello from the outbox')
+
+
+def test_batch_is_delivered_over_smtp(app, smtp_server):
+    with app.app_context():
+        email = enqueue('batch@example.com')
+        assert email_sender.send_batch() >= 1
+
+        email.reload()
+        assert email.status == OutboxEmail.STATUS_SENT
+        recipients, message = next(item for item in smtp_server.received if item[0] == ['batch@example.com'])
+        assert 'Hello from the outbox' in message
+
+
+def test_failed_delivery_is_retried_later(app, smtp_server):
+    with app.app_context():
+        app.config['MAIL_PORT'] = 1
+        mail.init_app(app)
+        email = enqueue('down@example.com')
+        email_sender.send_batch()
+
+        email.reload()
+        assert email.status == OutboxEmail.STATUS_PENDING
+        assert email.attempts == 1 and email.last_error
+
+
+def test_running_sender_wakes_on_notify(app, smtp_server):
+    email_sender.start(app)
+    try:
+        with app.app_context():
+            for index in range(3):
+                recipient = f'wake-{index}@example.com'
+                enqueue(recipient)
+                email_sender.notify()
+
+                # Well within EMAIL_POLL_INTERVAL
+                give_up_at = time.monotonic() + 2
+                while not any(item[0] == [recipient] for item in smtp_server.received):
+                    assert time.monotonic() < give_up_at
+                    time.sleep(0.05)
+    finally:
+        email_sender.stop(timeout=5)
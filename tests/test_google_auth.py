@@ -0,0 +1,132 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import threading
+import time
+
+from cryptography.hazmat.primitives.asymmetric import rsa
+from flask import Flask
+import jwt
+import pytest
+
+from app.utils.google_auth import GoogleAuth, InvalidGoogleToken
+
+CLIENT_ID = 'test-client.apps.googleusercontent.com'
+ACCESS_TOKEN = 'ya29.test-access-token'
+USERINFO = {'sub': '1234', 'email': 'someone@example.com', 'given_name': 'Some', 'family_name': 'One'}
+
+
+def new_key(kid):
+    private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    jwk = json.loads(jwt.algorithms.RSAAlgorithm.to_jwk(private_key.public_key()))
+    return private_key, {**jwk, 'kid': kid, 'alg': 'RS256', 'use': 'sig'}
+
+
+class GoogleHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        self.server.requests.append(self.path)
+        if self.path == '/certs':
+            self.reply(200, {'keys': self.server.jwks}, {'Cache-Control': 'public, max-age=3600'})
+        elif self.headers.get('Authorization') == f'Bearer {ACCESS_TOKEN}':
+            self.reply(200, USERINFO)
+        else:
+            self.reply(401, {'error': 'invalid_token'})
+
+    def reply(self, status, payload, headers=None):
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(json.dumps(payload).encode())
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture(scope='module')
+def signing_key():
+    return new_key('key-1')
+
+
+@pytest.fixture
+def google(signing_key):
+    server = ThreadingHTTPServer(('127.0.0.1', 0), GoogleHandler)
+    server.daemon_threads = True
+    server.requests = []
+    server.jwks = [signing_key[1]]
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    base = f'http://127.0.0.1:{server.server_address[1]}'
+    app = Flask(__name__)
+    app.config.update(OAUTH_CREDENTIALS={'google': {'client_id': CLIENT_ID}}, GOOGLE_HTTP_TIMEOUT=5,
+                      GOOGLE_HTTP_POOL_SIZE=2, GOOGLE_JWKS_URL=f'{base}/certs',
+                      GOOGLE_USERINFO_URL=f'{base}/userinfo')
+    auth = GoogleAuth(app)
+    auth.server = server
+    yield auth
+    server.shutdown()
+    server.server_close()
+
+
+def id_token(key, **overrides):
+    private_key, jwk = key
+    now = int(time.time())
+    claims = {'iss': 'https://accounts.google.com', 'aud': CLIENT_ID, 'sub': '1234',
+              'email': 'someone@example.com', 'email_verified': True, 'iat': now, 'exp': now + 3600}
+    claims.update(overrides)
+    return jwt.encode(claims, private_key, algorithm='RS256', headers={'kid': jwk['kid']})
+
+
+def jwks_fetches(google):
+    return google.server.requests.count('/certs')
+
+
+def test_valid_id_token_is_verified_locally(google, signing_key):
+    assert google.identify(id_token(signing_key))['email'] == 'someone@example.com'
+    assert google.identify(id_token(signing_key, sub='5678'))['sub'] == '5678'
+    # The keys are fetched once and no userinfo call is made
+    assert google.server.requests == ['/certs']
+
+
+@pytest.mark.parametrize('overrides', [
+    {'aud': 'someone-else.apps.googleusercontent.com'},
+    {'iss': 'https://evil.example.com'},
+    {'exp': int(time.time()) - 3600, 'iat': int(time.time()) - 7200},
+    {'email_verified': False},
+])
+def test_invalid_claims_are_rejected(google, signing_key, overrides):
+    with pytest.raises(InvalidGoogleToken):
+        google.identify(id_token(signing_key, **overrides))
+
+
+def test_bad_signature_is_rejected(google, signing_key):
+    # Signed by another key under the same key ID
+    forged = id_token((new_key('key-1')[0], signing_key[1]))
+    with pytest.raises(InvalidGoogleToken):
+        google.identify(forged)
+
+
+def test_unknown_key_triggers_one_refresh_per_interval(google, signing_key):
+    google.jwks.min_ttl = 0.2
+    google.identify(id_token(signing_key))
+
+    # Google rotates in a new key; a token signed with it forces a refresh
+    rotated = new_key('key-2')
+    google.server.jwks = [signing_key[1], rotated[1]]
+    time.sleep(0.25)
+    assert google.identify(id_token(rotated))['sub'] == '1234'
+    assert jwks_fetches(google) == 2
+
+    # Tokens with unknown keys right after it do not reach the endpoint
+    stranger = new_key('key-3')
+    for _ in range(5):
+        with pytest.raises(InvalidGoogleToken):
+            google.identify(id_token(stranger))
+    assert jwks_fetches(google) == 2
+
+
+def test_access_token_falls_back_to_userinfo(google):
+    assert google.identify(ACCESS_TOKEN) == USERINFO
+    with pytest.raises(InvalidGoogleToken):
+        google.identify('ya29.revoked')
+    assert google.server.requests == ['/userinfo', '/userinfo']
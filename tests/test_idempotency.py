@@ -0,0 +1,63 @@
+import threading
+import uuid
+
+from werkzeug.test import Client
+
+from benchmarks.fakes import FakeChatModel, FaultyChatModel
+
+ORIGIN = 'http://localhost:3000'
+
+
+def send(client, headers, key, message='Hello'):
+    return client.post('/api/chat/send', headers={**headers, 'Idempotency-Key': key}, json={'message': message})
+
+
+def test_retry_replays_the_stored_response(client, auth_headers, use_model):
+    model = use_model(FaultyChatModel(latency=0))
+    key = uuid.uuid4().hex
+    first = send(client, auth_headers, key)
+    retry = send(client, auth_headers, key)
+
+    assert first.status_code == retry.status_code == 200
+    assert retry.get_json() == first.get_json()
+    assert retry.headers['Idempotent-Replayed'] == 'true'
+    assert model.calls == 1
+
+
+def test_key_reused_with_another_body_is_rejected(client, auth_headers, use_model):
+    use_model(FakeChatModel(latency=0))
+    key = uuid.uuid4().hex
+    assert send(client, auth_headers, key).status_code == 200
+    assert send(client, auth_headers, key, message='Something else').status_code == 422
+
+
+def test_duplicate_of_a_slow_request_gets_409_after_waiting(app, client, auth_headers, use_model):
+    use_model(FakeChatModel(latency=1))
+    app.config['IDEMPOTENCY_MAX_WAIT'] = 0.2
+    key = uuid.uuid4().hex
+    try:
+        original = []
+        thread = threading.Thread(target=lambda: original.append(send(Client(app), auth_headers, key)))
+        thread.start()
+        # Let the original take the key first
+        threading.Event().wait(0.3)
+
+        duplicate = send(client, auth_headers, key)
+        assert duplicate.status_code == 409
+        assert duplicate.headers['Retry-After'] == '1'
+
+        thread.join()
+        assert original[0].status_code == 200
+        assert send(client, auth_headers, key).headers['Idempotent-Replayed'] == 'true'
+    finally:
+        app.config['IDEMPOTENCY_MAX_WAIT'] = 90
+
+
+def test_browsers_may_send_the_idempotency_and_request_id_headers(client):
+    response = client.options('/api/chat/send', headers={
+        'Origin': ORIGIN,
+        'Access-Control-Request-Method': 'POST',
+        'Access-Control-Request-Headers': 'Idempotency-Key, X-Request-ID',
+    })
+    allowed = response.headers['Access-Control-Allow-Headers'].lower()
+    assert 'idempotency-key' in allowed and 'x-request-id' in allowed
@@ -0,0 +1,37 @@
+"""Query plans need a real server; mongomock has no planner.
+
+    MONGODB_TEST_URI=mongodb://localhost:27017/chat_index_tests python -m pytest tests/test_indexes.py
+
+The database is dropped afterwards.
+"""
+import os
+
+from mongoengine import connect, disconnect
+from mongoengine.context_managers import switch_db
+import pytest
+
+from app.models.chat import Chat
+from app.models.chat_message import ChatMessage
+
+MONGODB_TEST_URI = os.getenv('MONGODB_TEST_URI')
+
+pytestmark = pytest.mark.skipif(not MONGODB_TEST_URI, reason='set MONGODB_TEST_URI to explain queries on a real mongod')
+
+
+@pytest.fixture
+def real_mongo():
+    client = connect(alias='index-tests', host=MONGODB_TEST_URI, serverSelectionTimeoutMS=5000)
+    client.admin.command('ping')
+    try:
+        with switch_db(Chat, 'index-tests'), switch_db(ChatMessage, 'index-tests'):
+            Chat.ensure_indexes()
+            ChatMessage.ensure_indexes()
+            yield
+    finally:
+        client.drop_database(client.get_default_database().name)
+        disconnect(alias='index-tests')
+
+
+def test_hot_queries_use_indexes(real_mongo):
+    for name, stages in Chat.explain_hot_queries().items():
+        assert stages and 'COLLSCAN' not in stages, f'{name}: {" <- ".join(stages)}'
@@ -0,0 +1,28 @@
+import json
+import logging
+
+import pytest
+
+from app.utils.logger import ContextFilter, JsonFormatter, correlation_scope
+
+
+@pytest.mark.parametrize('header', ['abc-123.DEF_4', 'x' * 64])
+def test_valid_request_id_is_kept(client, header):
+    assert client.get('/api/auth/none', headers={'X-Request-ID': header}).headers['X-Request-ID'] == header
+
+
+@pytest.mark.parametrize('header', ['', 'x' * 65, 'a b', 'idé', 'id"}{'])
+def test_invalid_request_id_is_replaced(client, header):
+    request_id = client.get('/api/auth/none', headers={'X-Request-ID': header}).headers['X-Request-ID']
+    assert request_id != header
+    assert len(request_id) == 32
+
+
+def test_json_lines_carry_the_correlation_id():
+    record = logging.makeLogRecord({'name': 'tests', 'levelno': logging.INFO, 'levelname': 'INFO',
+                                    'msg': 'turn took %sms', 'args': (12,)})
+    with correlation_scope('req-1'):
+        ContextFilter().filter(record)
+    entry = json.loads(JsonFormatter().format(record))
+    assert entry['message'] == 'turn took 12ms'
+    assert entry['correlation_id'] == 'req-1'
@@ -0,0 +1,37 @@
+from prometheus_client import CollectorRegistry
+
+from app.models.chat_job import ChatJob
+from app.utils.metrics import Metrics, StatsCollector
+
+
+def test_metrics_need_the_token_or_a_local_request(app, monkeypatch):
+    view = Metrics()
+    view.registry = CollectorRegistry()
+    local = {'REMOTE_ADDR': '127.0.0.1'}
+
+    with app.test_request_context('/metrics', environ_base=local):
+        assert view.metrics_view().status_code == 200
+    with app.test_request_context('/metrics', environ_base=local, headers={'X-Forwarded-For': '203.0.113.7'}):
+        assert view.metrics_view()[1] == 401
+
+    monkeypatch.setitem(app.config, 'METRICS_TOKEN', 'secret')
+    with app.test_request_context('/metrics', environ_base=local):
+        assert view.metrics_view()[1] == 401
+    with app.test_request_context('/metrics', headers={'Authorization': 'Bearer secret'}):
+        assert view.metrics_view().status_code == 200
+
+
+def test_job_stats_are_cached_between_scrapes(app, monkeypatch):
+    calls = []
+    monkeypatch.setattr(ChatJob, 'stats', classmethod(lambda cls: calls.append(1) or {
+        'queued': 0, 'running': 0, 'oldest_queued_seconds': 0
+    }))
+    collector = StatsCollector()
+    with app.app_context():
+        for _ in range(3):
+            list(collector.collect())
+        assert len(calls) == 1
+
+        collector._job_stats_at -= StatsCollector.JOB_STATS_TTL + 1
+        list(collector.collect())
+        assert len(calls) == 2
@@ -0,0 +1,59 @@
+import time
+
+from flask import Flask
+import pytest
+
+from app.utils.password_hasher import HasherBusy, PasswordHasher
+
+
+def pool_hasher(queue):
+    app = Flask(__name__)
+    app.config.update(PASSWORD_HASH_ROUNDS=1000, PASSWORD_POOL_SIZE=1, PASSWORD_POOL_QUEUE=queue,
+                      PASSWORD_POOL_TIMEOUT=30)
+    hasher = PasswordHasher(app)
+    hasher.start()
+    return hasher
+
+
+@pytest.fixture
+def hasher():
+    hasher = pool_hasher(queue=4)
+    yield hasher
+    hasher.shutdown()
+
+
+def test_pool_hashes_and_verifies(hasher):
+    password_hash = hasher.hash('secret')
+    assert hasher.verify('secret', password_hash) == (True, None)
+    assert hasher.verify('wrong', password_hash) == (False, None)
+    assert hasher._executor._mp_context.get_start_method() in ('forkserver', 'spawn')
+
+
+def test_slow_hash_raises_busy(hasher):
+    hasher.hash('warm up the pool process')
+    hasher.rounds = 2_000_000
+    hasher.timeout = 0.01
+    with pytest.raises(HasherBusy):
+        hasher.hash('secret')
+
+
+def test_timed_out_hash_keeps_its_slot_until_it_finishes():
+    hasher = pool_hasher(queue=0)
+    try:
+        hasher.hash('warm up the pool process')
+        hasher.timeout = 0.1
+        # Stands in for a hash that outlives its caller's wait
+        with pytest.raises(HasherBusy):
+            hasher._run(time.sleep, 1)
+
+        # The pool is still busy with it, so the only slot is still taken
+        started = time.monotonic()
+        with pytest.raises(HasherBusy):
+            hasher.hash('secret')
+        assert time.monotonic() - started < 0.1
+
+        time.sleep(1.5)
+        hasher.timeout = 30
+        assert hasher.verify('secret', hasher.hash('secret')) == (True, None)
+    finally:
+        hasher.shutdown()
@@ -0,0 +1,143 @@
+import threading
+import uuid
+
+from flask import Flask
+import mongomock
+import pytest
+
+from app.models.user import User
+from app.utils.rate_limit import RateLimiter
+from app.utils.rate_limit.algorithms import FixedWindow, SlidingWindow, TokenBucket
+
+PERIOD = 100
+LIMIT = 3
+# Inside a window, away from its edges
+NOW = 10 * PERIOD + 10
+
+
+def limiter(algorithm, backend):
+    app = Flask(__name__)
+    app.config.update(RATE_LIMIT_PERIOD=PERIOD, RATE_LIMIT_ALGORITHM=algorithm, RATE_LIMIT_BACKEND=backend,
+                      RATE_LIMIT_PLANS={'free': LIMIT}, RATE_LIMIT_DEFAULT_PLAN='free')
+    return RateLimiter(app)
+
+
+def charge(algorithm, times, state=None, now=NOW):
+    results = []
+    for _ in range(times):
+        new_state, result = algorithm.consume(state, LIMIT, now)
+        state = new_state if new_state is not None else state
+        results.append(result)
+    return state, results
+
+
+@pytest.mark.parametrize('algorithm', [FixedWindow, SlidingWindow, TokenBucket])
+def test_limit_boundary(algorithm):
+    state, results = charge(algorithm(PERIOD), LIMIT + 1)
+    assert [result.allowed for result in results] == [True] * LIMIT + [False]
+    assert [result.remaining for result in results] == [2, 1, 0, 0]
+
+
+@pytest.mark.parametrize('algorithm', [FixedWindow, SlidingWindow, TokenBucket])
+def test_refund_gives_back_one_request(algorithm):
+    algorithm = algorithm(PERIOD)
+    state, _ = charge(algorithm, LIMIT)
+    state, result = algorithm.refund(state, LIMIT, NOW)
+    assert result.allowed and result.remaining == 1
+
+    state, results = charge(algorithm, 2, state)
+    assert [result.allowed for result in results] == [True, False]
+
+
+def test_fixed_window_resets_at_the_next_window():
+    algorithm = FixedWindow(PERIOD)
+    state, results = charge(algorithm, LIMIT + 1)
+    assert results[-1].reset_at == 11 * PERIOD
+    assert algorithm.consume(state, LIMIT, 11 * PERIOD)[1].allowed
+
+
+def test_sliding_window_resets_when_the_previous_window_weighs_less():
+    algorithm = SlidingWindow(PERIOD)
+    # Full previous window: at NOW it still counts for 90% of LIMIT
+    state, _ = charge(algorithm, LIMIT, now=9 * PERIOD + 50)
+    _, result = algorithm.consume(state, LIMIT, NOW)
+    assert not result.allowed
+
+    # One request fits once previous * (1 - elapsed / period) <= LIMIT - 1
+    expected = 10 * PERIOD + PERIOD * (1 - (LIMIT - 1) / LIMIT)
+    assert result.reset_at == pytest.approx(expected)
+    assert not algorithm.consume(state, LIMIT, expected - 1)[1].allowed
+    assert algorithm.consume(state, LIMIT, expected + 1)[1].allowed
+
+
+def test_token_bucket_resets_when_one_token_has_refilled():
+    algorithm = TokenBucket(PERIOD)
+    state, results = charge(algorithm, LIMIT + 1)
+    expected = NOW + PERIOD / LIMIT
+    assert results[-1].reset_at == pytest.approx(expected)
+    assert not algorithm.consume(state, LIMIT, expected - 1)[1].allowed
+    assert algorithm.consume(state, LIMIT, expected + 1)[1].allowed
+
+
+@pytest.mark.parametrize('algorithm', ['fixed_window', 'sliding_window', 'token_bucket'])
+def test_mongo_backend_charges_and_refunds(app, algorithm):
+    rate_limiter = limiter(algorithm, 'mongo')
+    user_id = uuid.uuid4().hex
+    with app.app_context():
+        results = [rate_limiter.consume(user_id, LIMIT) for _ in range(LIMIT + 1)]
+        assert [result.allowed for result in results] == [True] * LIMIT + [False]
+
+        assert rate_limiter.refund(user_id, LIMIT).remaining == 1
+        assert rate_limiter.consume(user_id, LIMIT).allowed
+        assert not rate_limiter.consume(user_id, LIMIT).allowed
+        assert rate_limiter.peek(user_id, LIMIT).remaining == 0
+
+
+@pytest.fixture
+def atomic_writes(monkeypatch):
+    # A server applies each single-document operation atomically; mongomock
+    # does not, so serialize them and leave the interleaving to the limiter
+    lock = threading.RLock()
+    for name in ('find_one', 'find_one_and_update', 'insert_one', 'update_one'):
+        method = getattr(mongomock.Collection, name)
+
+        def atomic(*args, _method=method, **kwargs):
+            with lock:
+                return _method(*args, **kwargs)
+        monkeypatch.setattr(mongomock.Collection, name, atomic)
+
+
+@pytest.mark.parametrize('algorithm', ['fixed_window', 'token_bucket'])
+def test_concurrent_consumers_share_one_limit(app, atomic_writes, algorithm):
+    limit = 20
+    # Separate limiters, like two processes with their own caches
+    limiters = [limiter(algorithm, 'mongo'), limiter(algorithm, 'mongo')]
+    user_id = uuid.uuid4().hex
+    allowed = []
+    start = threading.Barrier(len(limiters))
+
+    def consume(rate_limiter):
+        with app.app_context():
+            start.wait()
+            for _ in range(limit):
+                allowed.append(rate_limiter.consume(user_id, limit).allowed)
+
+    threads = [threading.Thread(target=consume, args=(rate_limiter,)) for rate_limiter in limiters]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert allowed.count(True) == limit
+
+
+def test_plan_change_applies_without_a_new_token(client, auth_headers):
+    def max_requests():
+        return client.get('/api/users/quota', headers=auth_headers).get_json()['max_requests']
+
+    assert max_requests() == 15
+    email = client.get('/api/users/profile', headers=auth_headers).get_json()['email']
+    user = User.objects.get(email=email)
+    user.request_limit = 200
+    # Saving drops the cache entry in this process; others wait for USER_CACHE_TTL
+    user.save()
+    assert max_requests() == 200
@@ -0,0 +1,134 @@
+import json
+
+import pytest
+
+from app.config import Config
+from app.utils.model_graph import build_graph
+from app.utils.resilience import (
+    CircuitOpenError, DeadlineExceeded, RetryPolicy, StreamInterrupted, deadline_scope, status_for_error
+)
+from benchmarks.fakes import FakeChatModel, FaultyChatModel, InjectedFault, InjectedTimeout
+
+POLICY = RetryPolicy(max_retries=2, backoff_base=0.01, backoff_max=0.02)
+HELLO = {'messages': [{'role': 'user', 'content': 'Hello'}]}
+
+
+def answer(graph):
+    return graph.invoke(HELLO)['messages'][-1].content
+
+
+def streamed_tokens(graph):
+    return [
+        chunk.content for mode, (chunk, metadata) in graph.stream(HELLO, stream_mode=['messages'])
+        if metadata.get('langgraph_node') == 'chatbot' and chunk.content
+    ]
+
+
+def test_transient_errors_are_retried():
+    llm = FaultyChatModel(latency=0, script=['error', 'error', 'ok'])
+    assert answer(build_graph(llm, [], policy=POLICY)) == llm.response
+    assert llm.calls == 3
+
+
+def test_retries_are_bounded():
+    llm = FaultyChatModel(latency=0, script=['error'] * 5)
+    with pytest.raises(InjectedFault):
+        answer(build_graph(llm, [], policy=POLICY))
+    assert llm.calls == POLICY.max_retries + 1
+
+
+def test_non_retryable_errors_fail_fast():
+    llm = FaultyChatModel(latency=0, script=['fatal', 'ok'])
+    with pytest.raises(ValueError):
+        answer(build_graph(llm, [], policy=POLICY))
+    assert llm.calls == 1
+
+
+def test_client_timeouts_are_retried():
+    llm = FaultyChatModel(latency=0, script=['hang', 'ok'], hang_seconds=0.01)
+    assert answer(build_graph(llm, [], policy=POLICY)) == llm.response
+    assert status_for_error(InjectedTimeout()) == 504
+
+
+def test_deadline_stops_retries():
+    llm = FaultyChatModel(latency=0, script=['hang', 'ok'], hang_seconds=0.2)
+    with pytest.raises(DeadlineExceeded), deadline_scope(0.1):
+        answer(build_graph(llm, [], policy=POLICY))
+    assert llm.calls == 1
+
+
+def test_circuit_opens_after_consecutive_failures():
+    llm = FaultyChatModel(latency=0, failure_rate=1.0)
+    graph = build_graph(llm, [], policy=RetryPolicy(max_retries=0))
+    for _ in range(Config.CIRCUIT_FAILURE_THRESHOLD):
+        with pytest.raises(InjectedFault):
+            answer(graph)
+
+    with pytest.raises(CircuitOpenError):
+        answer(graph)
+    assert llm.calls == Config.CIRCUIT_FAILURE_THRESHOLD
+    assert status_for_error(CircuitOpenError()) == 503
+
+
+def test_fallback_answers_when_primary_fails():
+    primary = FaultyChatModel(latency=0, script=['error'] * 3)
+    fallback = FakeChatModel(latency=0, response='Answer from the fallback model.')
+    assert answer(build_graph(primary, [], policy=POLICY, fallback_llm=fallback)) == fallback.response
+
+
+def test_partial_stream_is_not_retried_or_handed_to_fallback():
+    primary = FaultyChatModel(latency=0, script=['partial', 'ok'])
+    fallback = FakeChatModel(latency=0, response='Answer from the fallback model.')
+    graph = build_graph(primary, [], policy=POLICY, fallback_llm=fallback)
+
+    tokens = []
+    with pytest.raises(StreamInterrupted):
+        for mode, (chunk, metadata) in graph.stream(HELLO, stream_mode=['messages']):
+            tokens.append(chunk.content)
+    assert primary.calls == 1
+    assert ''.join(tokens) == ' '.join(primary.response.split()[:2])
+
+
+def test_streams_after_retry_without_duplicates():
+    llm = FaultyChatModel(latency=0, script=['error', 'ok'])
+    assert ''.join(streamed_tokens(build_graph(llm, [], policy=POLICY))) == llm.response
+
+
+def remaining(client, headers):
+    return client.get('/api/users/quota', headers=headers).get_json()['remaining_requests']
+
+
+def test_failed_turn_is_refunded(client, auth_headers, use_model):
+    use_model(FaultyChatModel(latency=0, script=['error'] * 3))
+    before = remaining(client, auth_headers)
+
+    response = client.post('/api/chat/send', headers=auth_headers, json={'message': 'Hello'})
+    assert response.status_code == 500
+    assert response.get_json()['success'] is False
+    assert remaining(client, auth_headers) == before
+
+    response = client.post('/api/chat/send', headers=auth_headers, json={'message': 'Hello'})
+    assert response.status_code == 200
+    assert remaining(client, auth_headers) == before - 1
+
+
+def sse_events(response):
+    events = []
+    for block in response.get_data(as_text=True).strip().split('\n\n'):
+        event, data = block.split('\n', 1)
+        events.append((event[len('event: '):], json.loads(data[len('data: '):])))
+    return events
+
+
+def test_interrupted_stream_ends_with_an_error_event(client, auth_headers, use_model):
+    llm = use_model(FaultyChatModel(latency=0, script=['partial', 'ok']))
+
+    response = client.post('/api/chat/send/stream', headers=auth_headers, json={'message': 'Hello'})
+    events = sse_events(response)
+    names = [name for name, _ in events]
+
+    assert names[0] == 'context' and names[-1] == 'error'
+    assert 'done' not in names
+    assert ''.join(data['content'] for name, data in events if name == 'token') == \
+        ' '.join(llm.response.split()[:2])
+    assert llm.calls == 1
@@ -0,0 +1,67 @@
+import gzip
+
+import orjson
+import pytest
+import zstandard
+
+from app.utils.responses import choose_encoding
+from benchmarks.fakes import FakeChatModel
+
+LONG_ANSWER = ' '.join(['A long answer that is well worth compressing.'] * 40)
+
+
+@pytest.fixture
+def history(app, client, auth_headers, use_model):
+    use_model(FakeChatModel(latency=0, response=LONG_ANSWER))
+    # mongomock can't run the embedded layout's $slice window
+    app.config['CHAT_MESSAGE_STORE'] = 'collection'
+    try:
+        response = client.post('/api/chat/send', headers=auth_headers, json={'message': 'Hello'})
+    finally:
+        app.config['CHAT_MESSAGE_STORE'] = 'embedded'
+    return f'/api/chat/conversations/{response.get_json()["context_id"]}/messages'
+
+
+@pytest.mark.parametrize('encoding, decompress', [
+    ('zstd', lambda data: zstandard.ZstdDecompressor().decompressobj().decompress(data)),
+    ('gzip', gzip.decompress),
+])
+def test_large_response_is_compressed(client, auth_headers, history, encoding, decompress):
+    response = client.get(history, headers={**auth_headers, 'Accept-Encoding': f'{encoding}, br;q=0.5'})
+    assert response.headers['Content-Encoding'] == encoding
+    assert 'Accept-Encoding' in response.headers['Vary']
+
+    body = orjson.loads(decompress(response.get_data()))
+    assert [message['content'] for message in body['messages']] == ['Hello', LONG_ANSWER]
+
+
+def test_uncompressed_without_accept_encoding(client, auth_headers, history):
+    response = client.get(history, headers=auth_headers)
+    assert 'Content-Encoding' not in response.headers
+    assert response.get_json()['messages'][1]['content'] == LONG_ANSWER
+
+
+def test_small_response_is_not_compressed(client, auth_headers):
+    response = client.get('/api/users/quota', headers={**auth_headers, 'Accept-Encoding': 'zstd, gzip'})
+    assert 'Content-Encoding' not in response.headers
+    assert response.headers['Content-Type'] == 'application/json'
+
+
+def test_stream_is_never_compressed(client, auth_headers, use_model):
+    use_model(FakeChatModel(latency=0, response=LONG_ANSWER))
+    response = client.post('/api/chat/send/stream', headers={**auth_headers, 'Accept-Encoding': 'gzip'},
+                           json={'message': 'Hello'})
+    assert 'Content-Encoding' not in response.headers
+    assert LONG_ANSWER.split()[-1] in response.get_data(as_text=True)
+
+
+@pytest.mark.parametrize('header, expected', [
+    ('gzip, deflate, br, zstd', 'zstd'),
+    ('gzip;q=1.0, zstd;q=0.5', 'gzip'),
+    ('zstd;q=0, gzip', 'gzip'),
+    ('*', 'zstd'),
+    ('identity', None),
+    ('', None),
+])
+def test_encoding_negotiation(header, expected):
+    assert choose_encoding(header) == expected
@@ -0,0 +1,55 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import threading
+import time
+
+import pytest
+
+from app.utils import search_client
+
+
+class TavilyHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        self.server.requests.append((self.headers['Authorization'], body))
+        if body['query'] == 'slow':
+            time.sleep(1)
+        payload = json.dumps({'query': body['query'], 'results': [{'title': 'Result', 'url': 'https://example.com'}]})
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.end_headers()
+        self.wfile.write(payload.encode())
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def tavily(monkeypatch):
+    server = ThreadingHTTPServer(('127.0.0.1', 0), TavilyHandler)
+    server.daemon_threads = True
+    server.requests = []
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setenv('TAVILY_API_KEY', 'test-key')
+    monkeypatch.setattr(search_client, 'TAVILY_SEARCH_URL', f'http://127.0.0.1:{server.server_address[1]}/search')
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_search_posts_the_query_with_the_tool_settings(tavily):
+    tool = search_client.build_search_tool(max_results=2, timeout=5)
+    assert tool.invoke({'query': 'flask'})['results'][0]['title'] == 'Result'
+
+    authorization, body = tavily.requests[0]
+    assert authorization == 'Bearer test-key'
+    assert body['query'] == 'flask' and body['max_results'] == 2
+    assert 'time_range' not in body
+
+
+def test_slow_search_times_out(tavily):
+    tool = search_client.build_search_tool(max_results=2, timeout=0.2)
+    started = time.monotonic()
+    result = tool.invoke({'query': 'slow'})
+    assert time.monotonic() - started < 1
+    assert 'Timeout' in type(result['error']).__name__
@@ -0,0 +1,33 @@
+from app.models.user import User
+from app.utils.user_cache import user_cache
+
+
+def profile(client, headers):
+    return client.get('/api/users/profile', headers=headers)
+
+
+def test_profile_is_served_from_the_cache_until_the_user_is_saved(client, auth_headers):
+    email = profile(client, auth_headers).get_json()['email']
+    user = User.objects.get(email=email)
+
+    # A write that bypasses save() is not seen while the entry is fresh
+    User.objects(id=user.id).update(set__first_name='Bypassed')
+    assert profile(client, auth_headers).get_json()['first_name'] == 'Test'
+
+    user.reload()
+    user.first_name = 'Renamed'
+    user.save()
+    assert profile(client, auth_headers).get_json()['first_name'] == 'Renamed'
+
+
+def test_secrets_are_never_cached(client, auth_headers):
+    email = profile(client, auth_headers).get_json()['email']
+    user = User.objects.get(email=email)
+    cached = user_cache.get(user.id)
+    assert cached['email'] == email
+    assert not {'password_hash', 'reset_password_token', 'oauth_id'} & set(cached)
+
+
+def test_deleted_user_is_not_found(client, auth_headers):
+    assert client.delete('/api/users/delete', headers=auth_headers).status_code == 200
+    assert profile(client, auth_headers).status_code == 404